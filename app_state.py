@@ -0,0 +1,85 @@
+"""
+States of the windowed game and the CPU time each one costs. Only the game in play needs to run
+every frame; the menu, the paused game, and the game over message are static screens, drawn once
+and then left until an event arrives (pygame.event.wait), so they cost next to no CPU. A CpuMeter
+splits wall clock and process CPU time between the states as the game moves through them
+"""
+import time
+
+MENU = 'menu'
+PLAYING = 'playing'
+PAUSED = 'paused'
+GAME_OVER = 'game_over'
+STATES = (MENU, PLAYING, PAUSED, GAME_OVER)
+
+
+class CpuMeter:
+    """
+    Accumulates wall clock and CPU seconds for each state, charging the time since the last
+    change of state to the state it was in
+    """
+
+    def __init__(self, clock=time.perf_counter, cpu_clock=time.process_time):
+        """
+        Initializes a meter in no state
+        :param clock: function returning the wall clock time in seconds
+        :param cpu_clock: function returning the CPU time used by the process in seconds
+        """
+        self.clock = clock
+        self.cpu_clock = cpu_clock
+        self.state = None
+        self.since = None
+        self.cpu_since = None
+        # state -> [wall seconds, CPU seconds, times entered]
+        self.totals = {}
+
+    def enter(self, state):
+        """
+        Moves to a state; entering the state the meter is already in changes nothing
+        :param state: string state, one of STATES
+        :return: None
+        """
+        if state == self.state:
+            return
+        self.charge()
+        self.state = state
+        self.totals.setdefault(state, [0.0, 0.0, 0])[2] += 1
+
+    def charge(self):
+        """
+        Adds the time since the last charge to the current state
+        :return: None
+        """
+        now = self.clock()
+        cpu = self.cpu_clock()
+        if self.state is not None:
+            total = self.totals[self.state]
+            total[0] += now - self.since
+            total[1] += cpu - self.cpu_since
+        self.since = now
+        self.cpu_since = cpu
+
+    def report(self):
+        """
+        Gets the time spent in every state entered so far, up to now
+        :return: dictionary of state -> dictionary of seconds, cpu_seconds, cpu_percent (CPU
+        seconds per wall clock second, so 100 is one core kept busy), and entered count
+        """
+        self.charge()
+        report = {}
+        for state, (seconds, cpu_seconds, entered) in self.totals.items():
+            report[state] = {'seconds': seconds, 'cpu_seconds': cpu_seconds,
+                             'cpu_percent': 100 * cpu_seconds / seconds if seconds else 0.0,
+                             'entered': entered}
+        return report
+
+    def format_report(self):
+        """
+        Gets the report as a table
+        :return: string
+        """
+        lines = [f'{"state":<10} {"seconds":>9} {"cpu s":>8} {"cpu %":>7} {"entered":>8}']
+        for state, row in self.report().items():
+            lines.append(f'{state:<10} {row["seconds"]:9.2f} {row["cpu_seconds"]:8.2f} '
+                         f'{row["cpu_percent"]:7.1f} {row["entered"]:8d}')
+        return '\n'.join(lines)
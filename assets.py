@@ -0,0 +1,91 @@
+"""
+Registry of per-image collision data. Every sprite in the game is one of a handful of images, so
+the mask, bounding rectangle, narrowphase shape, and dimensions of each image are built once and
+shared by every object drawn with it
+"""
+import pygame
+
+from narrowphase import Shape
+
+
+class Asset:
+    """
+    Collision data for one image: its mask, the tight rectangle around its opaque pixels, its
+    narrowphase shape, and its dimensions. Shared between objects, so it must be treated as read only
+    """
+
+    def __init__(self, image, bounds=None):
+        """
+        Builds the mask and bounding rectangle of an image
+        :param image: pygame Surface
+        :param bounds: (x, y, width, height) of the opaque pixels if already known, e.g. from an
+        asset bundle, or None to work them out from the mask
+        """
+        self.image = image
+        self.mask = pygame.mask.from_surface(image)
+        self.width, self.height = image.get_size()
+        if bounds is None:
+            rects = self.mask.get_bounding_rects()
+            rect = rects[0].unionall(rects[1:]) if rects else pygame.Rect(0, 0, 0, 0)
+            bounds = (rect.x, rect.y, rect.width, rect.height)
+        # Offset and size of the opaque pixels within the image, as (x, y, width, height)
+        self.bounds = tuple(bounds)
+        self.shape = Shape(self.mask, self.bounds)
+
+
+class AssetRegistry:
+    """
+    Builds an Asset the first time an image is asked for and hands out the same Asset after that,
+    keeping count of hits and misses
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty registry
+        """
+        self.assets = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, image):
+        """
+        Gets the shared Asset for an image, building it on first use
+        :param image: pygame Surface
+        :return: Asset for the image
+        """
+        asset = self.assets.get(image)
+        if asset is None:
+            self.misses += 1
+            asset = self.assets[image] = Asset(image)
+        else:
+            self.hits += 1
+        return asset
+
+    def add(self, image, bounds):
+        """
+        Registers an image whose bounds are already known, so they are not worked out again
+        :param image: pygame Surface
+        :param bounds: (x, y, width, height) of the opaque pixels
+        :return: Asset for the image
+        """
+        asset = self.assets[image] = Asset(image, bounds)
+        return asset
+
+    def stats(self):
+        """
+        Reports how often the registry was used; in the steady state only hits should increase
+        :return: dictionary of hits, misses (each a mask build), and number of assets
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'assets': len(self.assets)}
+
+    def reset_stats(self):
+        """
+        Resets hit and miss counts without dropping any built assets
+        :return: None
+        """
+        self.hits = 0
+        self.misses = 0
+
+
+# Registry shared by every object in the game
+ASSETS = AssetRegistry()
@@ -0,0 +1,326 @@
+"""
+Texture atlas and asset bundle. The build step packs every sprite in assets/ into one atlas,
+scales the background to the screen size, works out the tight bounds of every sprite, and writes
+all of it to a single versioned binary bundle of raw pixels. At startup the bundle is memory mapped
+and the sprites are sliced out of the atlas as subsurfaces: one file open and no PNG decoding or
+scaling. Without a bundle, or with one that is older than the images it was built from, of
+another version, or cut short, the images are loaded one by one from their PNGs as before
+
+Usage:
+    python atlas.py build       writes assets/sprites.bundle
+    python atlas.py measure     compares cold start time and file opens with and without it
+
+File layout (little endian):
+    magic b'SIAB', version u8, atlas width u16, atlas height u16, background width u16,
+    background height u16, entry count u16, atlas offset u32, background offset u32,
+    then per entry: name length u8, name, source size u64, source mtime ns u64,
+        rect x, y, width, height u16, bounds x, y, width, height u16,
+    then the atlas as RGBA rows and the background as RGB rows, each 16 byte aligned
+"""
+import argparse
+import mmap
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+import pygame
+
+from assets import ASSETS, Asset
+from renderer import display_format
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+BUNDLE_PATH = os.path.join(ASSET_DIR, 'sprites.bundle')
+BACKGROUND_NAME = 'background-black.png'
+
+MAGIC = b'SIAB'
+VERSION = 1
+HEADER = struct.Struct('<4sBHHHHHII')
+ENTRY = struct.Struct('<QQ4H4H')
+ALIGN = 16
+# Width of the atlas in pixels; rows of sprites are packed into it from the top down
+ATLAS_WIDTH = 512
+PADDING = 1
+
+
+def source_names(asset_dir=ASSET_DIR):
+    """
+    Lists the images that go into a bundle
+    :param asset_dir: string path of the asset directory
+    :return: sorted list of PNG file names
+    """
+    return sorted(name for name in os.listdir(asset_dir) if name.endswith('.png'))
+
+
+def load_png(asset_dir, name):
+    """
+    Loads one image from its PNG, as the game did before bundles
+    :param asset_dir: string path of the asset directory
+    :param name: string file name
+    :return: pygame Surface
+    """
+    with open(os.path.join(asset_dir, name), 'rb') as file:
+        return pygame.image.load(file, name)
+
+
+def pack(sizes, width=ATLAS_WIDTH, padding=PADDING):
+    """
+    Places rectangles in rows, tallest first
+    :param sizes: dictionary of name -> (width, height)
+    :param width: integer width of the atlas
+    :param padding: integer pixels left between neighbours
+    :return: tuple of (dictionary of name -> (x, y), integer height of the atlas)
+    """
+    positions = {}
+    x = y = row_height = 0
+    for name in sorted(sizes, key=lambda name: (-sizes[name][1], name)):
+        w, h = sizes[name]
+        if x + w > width:
+            x, y, row_height = 0, y + row_height + padding, 0
+        positions[name] = (x, y)
+        x += w + padding
+        row_height = max(row_height, h)
+    return positions, y + row_height
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def build(background_size, asset_dir=ASSET_DIR, path=BUNDLE_PATH):
+    """
+    Packs the images in the asset directory into a bundle
+    :param background_size: (width, height) the background is scaled to
+    :param asset_dir: string path of the asset directory
+    :param path: string path of the bundle to write
+    :return: None
+    """
+    images = {name: load_png(asset_dir, name) for name in source_names(asset_dir)}
+    background = pygame.transform.scale(images.pop(BACKGROUND_NAME), background_size)
+    positions, height = pack({name: image.get_size() for name, image in images.items()})
+    atlas = pygame.Surface((ATLAS_WIDTH, height), pygame.SRCALPHA, 32)
+    for name, image in images.items():
+        atlas.blit(image, positions[name])
+
+    entries = b''
+    for name in [BACKGROUND_NAME] + sorted(images):
+        stat = os.stat(os.path.join(asset_dir, name))
+        if name == BACKGROUND_NAME:
+            rect = bounds = (0, 0) + tuple(background_size)
+        else:
+            rect = positions[name] + images[name].get_size()
+            bounds = Asset(images[name]).bounds
+        encoded = name.encode()
+        entries += bytes([len(encoded)]) + encoded + ENTRY.pack(stat.st_size, stat.st_mtime_ns, *rect, *bounds)
+
+    atlas_offset = _aligned(HEADER.size + len(entries))
+    atlas_pixels = pygame.image.tobytes(atlas, 'RGBA')
+    background_offset = _aligned(atlas_offset + len(atlas_pixels))
+    background_pixels = pygame.image.tobytes(background, 'RGB')
+    # Write beside the bundle and move it into place, so an interrupted build leaves the old bundle
+    # or none, never half of one
+    partial = path + '.partial'
+    with open(partial, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, ATLAS_WIDTH, height, *background_size, len(images) + 1,
+                               atlas_offset, background_offset))
+        file.write(entries)
+        file.write(bytes(atlas_offset - file.tell()))
+        file.write(atlas_pixels)
+        file.write(bytes(background_offset - file.tell()))
+        file.write(background_pixels)
+    os.replace(partial, path)
+
+
+class Bundle:
+    """
+    Memory mapped bundle, read back into surfaces
+    """
+
+    def __init__(self, path):
+        """
+        Maps a bundle and reads its entry table. Raises ValueError, struct.error, or IndexError for a
+        file that is not a whole bundle of this version, and OSError for one that cannot be mapped
+        :param path: string path of the bundle
+        """
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.read_entries()
+        except Exception:
+            self.close()
+            raise
+
+    def read_entries(self):
+        """
+        Reads the header and entry table, checking the pixels they describe are all in the file
+        :return: None
+        """
+        (magic, version, self.atlas_width, self.atlas_height, background_width, background_height, count,
+         self.atlas_offset, self.background_offset) = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a version %d Space Invaders bundle' % VERSION)
+        self.background_size = (background_width, background_height)
+        # name -> (source size, source mtime ns, rect, bounds)
+        self.entries = {}
+        offset = HEADER.size
+        for i in range(count):
+            length = self.map[offset]
+            name = self.map[offset + 1:offset + 1 + length].decode()
+            offset += 1 + length
+            size, mtime_ns, *values = ENTRY.unpack_from(self.map, offset)
+            offset += ENTRY.size
+            self.entries[name] = (size, mtime_ns, tuple(values[:4]), tuple(values[4:]))
+        background_width, background_height = self.background_size
+        if (self.atlas_offset + self.atlas_width * self.atlas_height * 4 > len(self.map)
+                or self.background_offset + background_width * background_height * 3 > len(self.map)):
+            raise ValueError('bundle is truncated')
+
+    def close(self):
+        """
+        Unmaps the bundle; surfaces sliced out of it must no longer be in use
+        :return: None
+        """
+        self.map.close()
+
+    def is_fresh(self, asset_dir=ASSET_DIR):
+        """
+        Tells us whether the bundle holds exactly the images in the asset directory, each unchanged
+        since the bundle was built by size and modification time. An image added to or removed from
+        the directory makes the bundle stale
+        :param asset_dir: string path of the asset directory
+        :return: boolean
+        """
+        if set(source_names(asset_dir)) != set(self.entries):
+            return False
+        for name, (size, mtime_ns, rect, bounds) in self.entries.items():
+            try:
+                stat = os.stat(os.path.join(asset_dir, name))
+            except FileNotFoundError:
+                return False
+            if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+                return False
+        return True
+
+    def images(self, convert=False):
+        """
+        Slices every image out of the bundle. The atlas and background are views of the mapped
+        file, with no copy or decoding; the sprites are subsurfaces of the atlas, and their bounds
+        are handed to the asset registry so they are not worked out again
+        :param convert: boolean; if True the atlas and background are converted once to the
+        display's pixel format, the atlas before slicing, which needs a display mode to be set
+        :return: dictionary of file name -> pygame Surface
+        """
+        view = memoryview(self.map)
+        atlas_size = self.atlas_width * self.atlas_height * 4
+        atlas = pygame.image.frombuffer(view[self.atlas_offset:self.atlas_offset + atlas_size],
+                                        (self.atlas_width, self.atlas_height), 'RGBA')
+        background_size = self.background_size[0] * self.background_size[1] * 3
+        background = pygame.image.frombuffer(view[self.background_offset:self.background_offset + background_size],
+                                             self.background_size, 'RGB')
+        if convert:
+            atlas = display_format(atlas)
+            background = display_format(background)
+        images = {BACKGROUND_NAME: background}
+        for name, (size, mtime_ns, rect, bounds) in self.entries.items():
+            if name != BACKGROUND_NAME:
+                images[name] = atlas.subsurface(rect)
+                ASSETS.add(images[name], bounds)
+        return images
+
+
+def load_images(background_size, asset_dir=ASSET_DIR, path=BUNDLE_PATH):
+    """
+    Gets every image the game uses, from the bundle if there is an up to date one and from the
+    PNGs otherwise. Every image is converted to the display's pixel format when a display mode is set
+    :param background_size: (width, height) the background is scaled to
+    :param asset_dir: string path of the asset directory
+    :param path: string path of the bundle, or None to load from the PNGs
+    :return: dictionary of file name -> pygame Surface, the background already scaled
+    """
+    convert = pygame.display.get_init() and pygame.display.get_surface() is not None
+    if path is not None and os.path.exists(path):
+        # A bundle of another version, a truncated one, or one built from other images is passed
+        # over for the PNGs
+        try:
+            bundle = Bundle(path)
+        except (ValueError, struct.error, IndexError, OSError):
+            bundle = None
+        if bundle is not None:
+            if bundle.background_size == tuple(background_size) and bundle.is_fresh(asset_dir):
+                try:
+                    return bundle.images(convert)
+                except (ValueError, struct.error, IndexError, OSError):
+                    pass
+            bundle.close()
+    images = {}
+    for name in source_names(asset_dir):
+        image = load_png(asset_dir, name)
+        if name == BACKGROUND_NAME:
+            image = pygame.transform.scale(image, background_size)
+        images[name] = display_format(image) if convert else image
+    return images
+
+
+def _cold_start(use_bundle):
+    """
+    Times loading every image in this process and counts the files opened while doing so
+    :param use_bundle: boolean; if False the bundle is ignored
+    :return: None, prints seconds and opens
+    """
+    opens = []
+    sys.addaudithook(lambda event, args: opens.append(args) if event == 'open' else None)
+    start = time.perf_counter()
+    images = load_images((775, 600), path=BUNDLE_PATH if use_bundle else None)
+    for name, image in images.items():
+        if name != BACKGROUND_NAME:
+            ASSETS.get(image)
+    seconds = time.perf_counter() - start
+    print(seconds, len(opens))
+
+
+def measure(runs=10):
+    """
+    Starts fresh interpreters to time cold loading of every image, with and without the bundle
+    :param runs: integer number of interpreters per mode
+    :return: dictionary of mode -> (median milliseconds loading, median milliseconds for the
+    whole process, file opens while loading)
+    """
+    times = {'png': [], 'bundle': []}
+    process_times = {'png': [], 'bundle': []}
+    opens = {}
+    # Alternate the modes so both see the same machine load
+    for i in range(runs):
+        for mode in times:
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '_cold_start', mode],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            process_times[mode].append((time.perf_counter() - start) * 1000)
+            times[mode].append(float(output[-2]) * 1000)
+            opens[mode] = int(output[-1])
+    results = {mode: (statistics.median(times[mode]), statistics.median(process_times[mode]), opens[mode])
+               for mode in times}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('build', help='pack assets/ into ' + os.path.relpath(BUNDLE_PATH))
+    measure_parser = commands.add_parser('measure', help='compare loading with and without the bundle')
+    measure_parser.add_argument('--runs', type=int, default=10)
+    cold_start_parser = commands.add_parser('_cold_start')
+    cold_start_parser.add_argument('mode', choices=('png', 'bundle'))
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.command == 'build':
+        import main
+
+        build((main.WIDTH, main.HEIGHT))
+        print(f'Wrote {BUNDLE_PATH} ({os.path.getsize(BUNDLE_PATH)} bytes)')
+    elif args.command == 'measure':
+        for mode, (milliseconds, process_milliseconds, opens) in measure(args.runs).items():
+            print(f'{mode:<8} load {milliseconds:8.2f} ms  process {process_milliseconds:8.2f} ms  {opens} file opens')
+    else:
+        _cold_start(args.mode == 'bundle')
@@ -0,0 +1,516 @@
+"""
+Batched environment running many games in lockstep. The state of N games is held in NumPy
+arrays with one row per game, and every game is advanced one frame at a time by step with
+vectorized operations, following the rules of Game.step: movement bounds, cool downs, damage,
+upgrade and hazard durations, and level progression. Rectangle tests run in batch over the live
+entities and only the few pairs whose rectangles overlap get the pixel perfect narrowphase test.
+Requires NumPy
+
+Actions are key masks with one bit per key, in the order of replay.KEYS:
+LEFT = 1, RIGHT = 2, UP = 4, DOWN = 8, SPACE = 16
+
+Random numbers come from one NumPy generator, so a batch does not replay the same games as Game
+with the same seed. Every game keeps at most item_slots upgrades and item_slots hazards; past
+that the oldest are written over
+"""
+import numpy as np
+
+import main
+from assets import ASSETS
+from narrowphase import overlap
+
+LEFT, RIGHT, UP, DOWN, SPACE = 1, 2, 4, 8, 16
+
+# Enemy colors in the order Game draws them from
+COLORS = ('red', 'blue', 'green')
+HEALTH_UPGRADE, FLAME_THROWER_UPGRADE = 0, 1
+FREEZE_HAZARD, BULLET_STORM_HAZARD = 0, 1
+
+# Frames each timed effect lasts, as in Game
+FLAME_THROWER_FRAMES = main.EFFECT_DURATIONS['flame_thrower']
+FREEZE_FRAMES = main.EFFECT_DURATIONS['frozen']
+BULLET_STORM_FRAMES = main.EFFECT_DURATIONS['bullet_storm_activated']
+GAME_OVER_FRAMES = main.GAME_OVER_FRAMES
+
+# Arrays of each kind of entity, all with one row per game and one column per slot
+ENEMY_ARRAYS = ('enemy_alive', 'enemy_x', 'enemy_y', 'enemy_color', 'enemy_cool_down')
+PLAYER_LASER_ARRAYS = ('player_laser_alive', 'player_laser_x', 'player_laser_y')
+ENEMY_LASER_ARRAYS = ('enemy_laser_alive', 'enemy_laser_x', 'enemy_laser_y', 'enemy_laser_owner',
+                      'enemy_laser_color')
+UPGRADE_ARRAYS = ('upgrade_alive', 'upgrade_x', 'upgrade_y', 'upgrade_type')
+HAZARD_ARRAYS = ('hazard_alive', 'hazard_x', 'hazard_y', 'hazard_type')
+
+
+def _bounds(images):
+    """
+    Gets the opaque bounds of some images as arrays
+    :param images: sequence of pygame Surfaces
+    :return: tuple of integer arrays (x offset, y offset, width, height), one entry per image
+    """
+    bounds = np.array([ASSETS.get(image).bounds for image in images], dtype=np.int32)
+    return bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]
+
+
+def _overlap(left1, top1, width1, height1, left2, top2, width2, height2):
+    """
+    Tells us which rectangles overlap, for arrays of rectangles
+    :return: boolean array
+    """
+    return (left1 < left2 + width2) & (left2 < left1 + width1) & (top1 < top2 + height2) & (top2 < top1 + height1)
+
+
+def _shapes_hit(shape1, shapes2, x1, y1, x2, y2, kinds):
+    """
+    Pixel perfect test of pairs whose rectangles overlap
+    :param shape1: narrowphase Shape of every first object
+    :param shapes2: list of narrowphase Shapes of the second objects, indexed by kind
+    :param x1: integer array of first object x-coordinates, one per pair
+    :param kinds: integer array of the kind of the second object of each pair
+    :return: boolean array of which pairs collide
+    """
+    hits = np.zeros(len(x1), dtype=bool)
+    for index, (left1, top1, left2, top2, kind) in enumerate(zip(x1.tolist(), y1.tolist(), x2.tolist(),
+                                                                    y2.tolist(), kinds.tolist())):
+        hits[index] = overlap(shape1, shapes2[kind], left2 - left1, top2 - top1)
+    return hits
+
+
+class BatchEnv:
+    """
+    N games advanced together. Entity arrays start small and double in width whenever some game
+    needs more slots, so the work per frame follows the number of live entities
+    """
+
+    def __init__(self, n, seed=None, item_slots=64):
+        """
+        Initializes n new games at level 0
+        :param n: integer number of games
+        :param seed: integer seed of the batch's random numbers, or None for a random one
+        :param item_slots: integer capacity per game for upgrades, and again for hazards
+        """
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+
+        # Velocities and the first wave are Game's defaults so both follow the same rules
+        self.player_velocity = main.PLAYER_VELOCITY
+        self.enemy_velocity = main.ENEMY_VELOCITY
+        self.laser_velocity = main.LASER_VELOCITY
+        self.upgrade_velocity = main.UPGRADE_VELOCITY
+        self.hazard_velocity = main.HAZARD_VELOCITY
+        self.initial_wave_amount = main.WAVE_AMOUNT
+        self.wave_increment = main.WAVE_INCREMENT
+        self.enemy_fire_odds = main.ENEMY_FIRE_ODDS
+        self.storm_fire_odds = main.STORM_FIRE_ODDS
+        self.cool_down_period = main.Ship.COOL_DOWN
+        self.width, self.height = main.WIDTH, main.HEIGHT
+
+        # Images with their shared narrowphase shapes and bounds
+        color_table = {'red': (main.RED_SPACESHIP, main.RED_LASER), 'blue': (main.BLUE_SPACESHIP, main.BLUE_LASER),
+                       'green': (main.GREEN_SPACESHIP, main.GREEN_LASER)}
+        enemy_images = [color_table[color][0] for color in COLORS]
+        enemy_laser_images = [color_table[color][1] for color in COLORS]
+        upgrade_images = [main.HEALTH, main.FLAME_THROWER]
+        hazard_images = [main.FREEZE_HAZARD, main.BULLET_STORM]
+        player = ASSETS.get(main.YELLOW_SPACESHIP)
+        self.player_shape = player.shape
+        self.player_size = player.width, player.height
+        self.player_bounds = player.bounds
+        self.player_laser_shape = ASSETS.get(main.YELLOW_LASER).shape
+        self.player_laser_bounds = ASSETS.get(main.YELLOW_LASER).bounds
+        self.enemy_shapes = [ASSETS.get(image).shape for image in enemy_images]
+        self.enemy_laser_shapes = [ASSETS.get(image).shape for image in enemy_laser_images]
+        self.upgrade_shapes = [ASSETS.get(image).shape for image in upgrade_images]
+        self.hazard_shapes = [ASSETS.get(image).shape for image in hazard_images]
+        self.enemy_height = np.array([image.get_height() for image in enemy_images], dtype=np.int32)
+        self.enemy_bounds = _bounds(enemy_images)
+        self.enemy_laser_bounds = _bounds(enemy_laser_images)
+        self.upgrade_bounds = _bounds(upgrade_images)
+        self.hazard_bounds = _bounds(hazard_images)
+
+        dtypes = {'alive': bool, 'color': np.int8, 'type': np.int8}
+        for names, width in ((ENEMY_ARRAYS, 16), (PLAYER_LASER_ARRAYS, 32), (ENEMY_LASER_ARRAYS, 32),
+                             (UPGRADE_ARRAYS, item_slots), (HAZARD_ARRAYS, item_slots)):
+            for name in names:
+                setattr(self, name, np.zeros((n, width), dtype=dtypes.get(name.rsplit('_', 1)[-1], np.int32)))
+        # Slot the next upgrade and hazard of each game is written to
+        self.item_next = np.zeros(n, dtype=np.int32)
+
+        self.player_x = np.zeros(n, dtype=np.int32)
+        self.player_y = np.zeros(n, dtype=np.int32)
+        self.player_health = np.zeros(n, dtype=np.int32)
+        self.player_cool_down = np.zeros(n, dtype=np.int32)
+        self.lives = np.zeros(n, dtype=np.int32)
+        self.level = np.zeros(n, dtype=np.int32)
+        self.wave_amount = np.zeros(n, dtype=np.int32)
+        self.flame_thrower = np.zeros(n, dtype=bool)
+        self.frozen = np.zeros(n, dtype=bool)
+        self.bullet_storm = np.zeros(n, dtype=bool)
+        # Frame each effect runs until; stacked pickups push it out, as with Game's effect timers
+        self.flame_thrower_until = np.zeros(n, dtype=np.int64)
+        self.frozen_until = np.zeros(n, dtype=np.int64)
+        self.bullet_storm_until = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.game_over_count = np.zeros(n, dtype=np.int32)
+        self.done = np.zeros(n, dtype=bool)
+        self.frame = np.zeros(n, dtype=np.int64)
+
+        self.reset()
+
+    def reset(self, games=None):
+        """
+        Starts new games in place of the chosen ones
+        :param games: boolean array choosing games to reset, or None for every game
+        :return: None
+        """
+        if games is None:
+            games = np.ones(self.n, dtype=bool)
+        for name in ('enemy_alive', 'player_laser_alive', 'enemy_laser_alive', 'upgrade_alive', 'hazard_alive',
+                     'flame_thrower', 'frozen', 'bullet_storm', 'game_over', 'done'):
+            getattr(self, name)[games] = False
+        for name in ('player_cool_down', 'level', 'game_over_count', 'frame', 'item_next', 'flame_thrower_until',
+                     'frozen_until', 'bullet_storm_until'):
+            getattr(self, name)[games] = 0
+        self.player_x[games] = 275
+        self.player_y[games] = 490
+        self.player_health[games] = 100
+        self.lives[games] = 3
+        self.wave_amount[games] = self.initial_wave_amount
+
+    def grow(self, names, width):
+        """
+        Widens the arrays of one kind of entity, keeping their contents
+        :param names: tuple of array attribute names, e.g. ENEMY_ARRAYS
+        :param width: integer number of slots needed
+        :return: None
+        """
+        current = getattr(self, names[0]).shape[1]
+        if width <= current:
+            return
+        while current < width:
+            current *= 2
+        for name in names:
+            array = getattr(self, name)
+            grown = np.zeros((self.n, current), dtype=array.dtype)
+            grown[:, :array.shape[1]] = array
+            setattr(self, name, grown)
+
+    def allocate(self, names, games):
+        """
+        Finds free slots for new entities, widening the arrays if some game has run out
+        :param names: tuple of array attribute names, e.g. ENEMY_ARRAYS
+        :param games: sorted integer array of the game of each new entity
+        :return: integer array of the slot of each new entity
+        """
+        counts = np.bincount(games, minlength=self.n)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        ranks = np.arange(len(games)) - starts[games]
+        self.grow(names, int((getattr(self, names[0]).sum(axis=1) + counts).max()))
+        free_games, free_slots = np.nonzero(~getattr(self, names[0]))
+        free_starts = np.concatenate(([0], np.cumsum(np.bincount(free_games, minlength=self.n))[:-1]))
+        return free_slots[free_starts[games] + ranks]
+
+    def step(self, actions):
+        """
+        Advances every game that is not done by one frame
+        :param actions: integer array of one key mask per game
+        :return: boolean array of which games are done
+        """
+        actions = np.asarray(actions)
+        active = ~self.done
+        self.frame[active] += 1
+
+        # Reset health if player loses life, then check if player has lost the game
+        lost_life = active & (self.player_health < 0) & ~self.game_over
+        self.lives[lost_life] -= 1
+        self.player_health[lost_life & (self.lives > 0)] = 100
+        lost = active & (self.lives <= 0)
+        self.game_over |= lost
+        self.game_over_count[lost] += 1
+        self.player_health[active & self.game_over] = -1
+        self.done |= active & self.game_over & (self.game_over_count > GAME_OVER_FRAMES)
+
+        # Games still being played this frame
+        playing = active & ~self.game_over
+        if playing.any():
+            self.spawn_level(playing)
+            self.move_player(playing, actions)
+            self.move_player_lasers(playing)
+            self.move_enemies(playing)
+            self.move_upgrades(playing)
+            self.move_hazards(playing)
+        return self.done
+
+    def spawn_level(self, playing):
+        """
+        Starts the next level in every game that has destroyed its whole wave
+        :param playing: boolean array of games being played this frame
+        :return: None
+        """
+        new_level = playing & ~self.enemy_alive.any(axis=1)
+        if not new_level.any():
+            return
+        rng = self.rng
+        self.level[new_level] += 1
+        self.wave_amount[new_level] += self.wave_increment
+        games = np.flatnonzero(new_level)
+        self.grow(ENEMY_ARRAYS, int(self.wave_amount[games].max()))
+        shape = (len(games), self.enemy_alive.shape[1])
+        self.enemy_alive[games] = np.arange(shape[1]) < self.wave_amount[games][:, None]
+        self.enemy_x[games] = rng.integers(25, self.width - 50, shape)
+        self.enemy_y[games] = rng.integers(-1500, -100, shape)
+        self.enemy_color[games] = rng.integers(0, len(COLORS), shape)
+        self.enemy_cool_down[games] = 0
+
+        # One of each upgrade and each hazard per level, written over the oldest slots when full
+        item_slots = self.upgrade_alive.shape[1]
+        for kind in (0, 1):
+            slot = self.item_next[games] % item_slots
+            self.upgrade_alive[games, slot] = True
+            self.upgrade_x[games, slot] = rng.integers(25, self.width - 50, len(games))
+            self.upgrade_y[games, slot] = rng.integers(-1800, -900, len(games))
+            self.upgrade_type[games, slot] = kind
+            self.hazard_alive[games, slot] = True
+            self.hazard_x[games, slot] = rng.integers(25, self.width - 50, len(games))
+            self.hazard_y[games, slot] = rng.integers(-1000, -100, len(games))
+            self.hazard_type[games, slot] = kind
+            self.item_next[games] += 1
+
+    def move_player(self, playing, actions):
+        """
+        Moves and fires every player's ship according to its action
+        :param playing: boolean array of games being played this frame
+        :param actions: integer array of one key mask per game
+        :return: None
+        """
+        velocity = self.player_velocity
+        width, height = self.player_size
+        x, y = self.player_x, self.player_y
+        can_move = playing & ~self.frozen
+        x[can_move & (actions & LEFT > 0) & (x - velocity > 0 - (width / 2) - 4)] -= velocity
+        x[can_move & (actions & RIGHT > 0) & (x + velocity < self.width - (width / 2))] += velocity
+        y[can_move & (actions & UP > 0) & (y - velocity > 0)] -= velocity
+        y[can_move & (actions & DOWN > 0) & (y + velocity < self.height - height - 20)] += velocity
+
+        # Shoot laser; the flame thrower leaves the cool down at 0 for continuous fire
+        shoot = playing & (actions & SPACE > 0) & (self.player_cool_down == 0)
+        games = np.flatnonzero(shoot)
+        if len(games):
+            slots = self.allocate(PLAYER_LASER_ARRAYS, games)
+            self.player_laser_alive[games, slots] = True
+            self.player_laser_x[games, slots] = x[games]
+            self.player_laser_y[games, slots] = y[games]
+        self.player_cool_down[shoot & ~self.flame_thrower] = 1
+
+    def cool_down(self, counts, playing):
+        """
+        Counts cool down periods along, as Ship.cool_down does
+        :param counts: integer array of cool down counts, with one row per game
+        :param playing: boolean array of games being played this frame
+        :return: None
+        """
+        playing = playing.reshape((-1,) + (1,) * (counts.ndim - 1))
+        expired = playing & (counts >= self.cool_down_period)
+        counting = playing & (counts > 0) & ~expired
+        counts[expired] = 0
+        counts[counting] += 1
+
+    def kill_enemies(self, games, slots):
+        """
+        Removes enemies along with their lasers
+        :param games: integer array of the game of each enemy
+        :param slots: integer array of the slot of each enemy
+        :return: None
+        """
+        if not len(games):
+            return
+        self.enemy_alive[games, slots] = False
+        laser_games, laser_slots = np.nonzero(self.enemy_laser_alive)
+        orphaned = ~self.enemy_alive[laser_games, self.enemy_laser_owner[laser_games, laser_slots]]
+        self.enemy_laser_alive[laser_games[orphaned], laser_slots[orphaned]] = False
+
+    def move_player_lasers(self, playing):
+        """
+        Moves player lasers, culls the ones off screen, and destroys the enemies they hit
+        :param playing: boolean array of games being played this frame
+        :return: None
+        """
+        self.cool_down(self.player_cool_down, playing)
+        games, slots = np.nonzero(self.player_laser_alive & playing[:, None])
+        y = self.player_laser_y[games, slots] - self.laser_velocity
+        self.player_laser_y[games, slots] = y
+        off_screen = (y > self.height) | (y < 0)
+        self.player_laser_alive[games[off_screen], slots[off_screen]] = False
+        games, slots, y = games[~off_screen], slots[~off_screen], y[~off_screen]
+        if not len(games):
+            return
+        x = self.player_laser_x[games, slots]
+
+        # Rectangle test of every laser against every enemy slot of its game
+        bx, by, bw, bh = self.player_laser_bounds
+        color = self.enemy_color[games]
+        ex, ey, ew, eh = (bound[color] for bound in self.enemy_bounds)
+        enemy_x = self.enemy_x[games]
+        enemy_y = self.enemy_y[games]
+        overlap = self.enemy_alive[games] & _overlap((x + bx)[:, None], (y + by)[:, None], bw, bh,
+                                                     enemy_x + ex, enemy_y + ey, ew, eh)
+        lasers, enemies = np.nonzero(overlap)
+        if not len(lasers):
+            return
+        hits = _shapes_hit(self.player_laser_shape, self.enemy_shapes, x[lasers], y[lasers], enemy_x[lasers, enemies],
+                          enemy_y[lasers, enemies], color[lasers, enemies])
+        lasers, enemies = lasers[hits], enemies[hits]
+        self.player_laser_alive[games[lasers], slots[lasers]] = False
+        self.kill_enemies(games[lasers], enemies)
+
+    def move_enemies(self, playing):
+        """
+        Moves enemies and their lasers, damages players hit by enemy lasers, lets enemies fire,
+        and handles enemies hitting players or slipping past the bottom of the screen
+        :param playing: boolean array of games being played this frame
+        :return: None
+        """
+        games, slots = np.nonzero(self.enemy_alive & playing[:, None])
+        self.enemy_y[games, slots] += self.enemy_velocity
+        self.cool_down(self.enemy_cool_down, playing)
+        self.move_enemy_lasers(playing)
+
+        # Fire, extremely fast during bullet storm and ~once every 3 seconds otherwise
+        chance = np.where(self.bullet_storm[games], 1 / self.storm_fire_odds, 1 / self.enemy_fire_odds)
+        firing = (self.rng.random(len(games)) < chance) & (self.enemy_cool_down[games, slots] == 0)
+        fire_games, fire_slots = games[firing], slots[firing]
+        if len(fire_games):
+            lasers = self.allocate(ENEMY_LASER_ARRAYS, fire_games)
+            self.enemy_laser_alive[fire_games, lasers] = True
+            self.enemy_laser_x[fire_games, lasers] = self.enemy_x[fire_games, fire_slots] - 20
+            self.enemy_laser_y[fire_games, lasers] = self.enemy_y[fire_games, fire_slots]
+            self.enemy_laser_owner[fire_games, lasers] = fire_slots
+            self.enemy_laser_color[fire_games, lasers] = self.enemy_color[fire_games, fire_slots]
+            self.enemy_cool_down[fire_games, fire_slots] = 1
+
+        # Collision between player and enemy
+        color = self.enemy_color[games, slots]
+        x = self.enemy_x[games, slots]
+        y = self.enemy_y[games, slots]
+        ex, ey, ew, eh = (bound[color] for bound in self.enemy_bounds)
+        px, py, pw, ph = self.player_bounds
+        player_x, player_y = self.player_x[games], self.player_y[games]
+        crashed = _overlap(player_x + px, player_y + py, pw, ph, x + ex, y + ey, ew, eh)
+        if crashed.any():
+            crashed[crashed] = _shapes_hit(self.player_shape, self.enemy_shapes, player_x[crashed], player_y[crashed],
+                                          x[crashed], y[crashed], color[crashed])
+            np.subtract.at(self.player_health, games[crashed], 10)
+
+        # Enemies past the bottom of the screen cost a life, unless they hit the player
+        past = ~crashed & (y + self.enemy_height[color] >= self.height)
+        if past.any():
+            np.subtract.at(self.lives, games[past], 1)
+            self.player_health[games[past]] = 100
+        gone = crashed | past
+        self.kill_enemies(games[gone], slots[gone])
+
+    def move_enemy_lasers(self, playing):
+        """
+        Moves enemy lasers, culls the ones off screen, and damages players they hit
+        :param playing: boolean array of games being played this frame
+        :return: None
+        """
+        games, slots = np.nonzero(self.enemy_laser_alive & playing[:, None])
+        y = self.enemy_laser_y[games, slots] + self.laser_velocity
+        self.enemy_laser_y[games, slots] = y
+        off_screen = (y > self.height) | (y < 0)
+        self.enemy_laser_alive[games[off_screen], slots[off_screen]] = False
+        games, slots, y = games[~off_screen], slots[~off_screen], y[~off_screen]
+
+        x = self.enemy_laser_x[games, slots]
+        color = self.enemy_laser_color[games, slots]
+        lx, ly, lw, lh = (bound[color] for bound in self.enemy_laser_bounds)
+        px, py, pw, ph = self.player_bounds
+        player_x, player_y = self.player_x[games], self.player_y[games]
+        hit = _overlap(x + lx, y + ly, lw, lh, player_x + px, player_y + py, pw, ph)
+        if not hit.any():
+            return
+        # Test from the player's side so one Mask serves every laser color
+        hit[hit] = _shapes_hit(self.player_shape, self.enemy_laser_shapes, player_x[hit], player_y[hit], x[hit], y[hit],
+                              color[hit])
+        np.subtract.at(self.player_health, games[hit], 10)
+        self.enemy_laser_alive[games[hit], slots[hit]] = False
+
+    def touching(self, names, shapes, bounds, velocity, playing):
+        """
+        Moves upgrades or hazards, drops the ones that have fallen past the bottom of the screen
+        as Game does, and finds the ones each player is touching
+        :param names: UPGRADE_ARRAYS or HAZARD_ARRAYS
+        :param shapes: list of narrowphase Shapes, indexed by type
+        :param bounds: tuple of bounds arrays, indexed by type
+        :param velocity: integer distance moved down per frame
+        :param playing: boolean array of games being played this frame
+        :return: (N, slots) boolean array
+        """
+        alive, x, y, kinds = (getattr(self, name) for name in names)
+        games, slots = np.nonzero(alive & playing[:, None])
+        y[games, slots] += velocity
+        off_screen = y[games, slots] > self.height
+        alive[games[off_screen], slots[off_screen]] = False
+        games, slots = games[~off_screen], slots[~off_screen]
+        kind = kinds[games, slots]
+        item_x, item_y = x[games, slots], y[games, slots]
+        bx, by, bw, bh = (bound[kind] for bound in bounds)
+        px, py, pw, ph = self.player_bounds
+        player_x, player_y = self.player_x[games], self.player_y[games]
+        hit = _overlap(player_x + px, player_y + py, pw, ph, item_x + bx, item_y + by, bw, bh)
+        if hit.any():
+            hit[hit] = _shapes_hit(self.player_shape, shapes, player_x[hit], player_y[hit], item_x[hit], item_y[hit],
+                                  kind[hit])
+        touching = np.zeros_like(alive)
+        touching[games[hit], slots[hit]] = True
+        return touching
+
+    def move_upgrades(self, playing):
+        """
+        Moves upgrades and applies the ones players pick up, each used up when picked up
+        :param playing: boolean array of games being played this frame
+        :return: None
+        """
+        touching = self.touching(UPGRADE_ARRAYS, self.upgrade_shapes, self.upgrade_bounds, self.upgrade_velocity,
+                                 playing)
+        self.upgrade_alive &= ~touching
+
+        # Heart increases health by 50 (up to 100)
+        heart_counts = (touching & (self.upgrade_type == HEALTH_UPGRADE)).sum(axis=1)
+        for count in range(int(heart_counts.max())):
+            healed = heart_counts > count
+            self.player_health[healed] = np.where(self.player_health[healed] < 50, self.player_health[healed] + 50,
+                                                  100)
+
+        # Flame thrower for 5 seconds
+        self.run_effect(self.flame_thrower_until, touching & (self.upgrade_type == FLAME_THROWER_UPGRADE),
+                        FLAME_THROWER_FRAMES)
+        self.flame_thrower = self.flame_thrower_until > self.frame
+
+    def move_hazards(self, playing):
+        """
+        Moves hazards and applies the ones players run into, each used up when hit: freeze for 3
+        seconds and bullet storm for 4 seconds
+        :param playing: boolean array of games being played this frame
+        :return: None
+        """
+        touching = self.touching(HAZARD_ARRAYS, self.hazard_shapes, self.hazard_bounds, self.hazard_velocity,
+                                 playing)
+        self.hazard_alive &= ~touching
+        self.run_effect(self.frozen_until, touching & (self.hazard_type == FREEZE_HAZARD), FREEZE_FRAMES)
+        self.run_effect(self.bullet_storm_until, touching & (self.hazard_type == BULLET_STORM_HAZARD),
+                        BULLET_STORM_FRAMES)
+        self.frozen = self.frozen_until > self.frame
+        self.bullet_storm = self.bullet_storm_until > self.frame
+
+    def run_effect(self, until, pickups, duration):
+        """
+        Starts an effect in every game that picked it up. Like Game's effect timers, an effect
+        picked up again while running lasts until the latest pickup's time is up
+        :param until: integer array of the frame the effect runs until in each game
+        :param pickups: (N, slots) boolean array of the items picked up this frame
+        :param duration: integer frames each pickup lasts
+        :return: None
+        """
+        games = np.flatnonzero(pickups.any(axis=1))
+        until[games] = np.maximum(until[games], self.frame[games] + duration)
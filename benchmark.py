@@ -0,0 +1,275 @@
+"""
+Deterministic headless benchmarks. Each scenario is seeded and scripted, so two runs of the same
+code simulate exactly the same frames; the scenarios that start at a later level put each wave into
+play whole rather than through the spawn queue. Reports frames per second, median and 99th percentile
+frame time, and peak traced memory, along with the time a fresh interpreter takes to import main.
+Results are written as JSON, and compare mode exits with an
+error when a run has regressed past a threshold against a baseline
+
+Usage:
+    python benchmark.py run [--output results.json] [--frames N] [--scenario NAME ...]
+    python benchmark.py compare baseline.json results.json [--threshold 0.10]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import main
+from headless import percentile, sweeping_fire
+
+# Version of the results file layout
+RESULTS_VERSION = 1
+
+SEED = 1234
+
+# Spawn queue margin that takes in everything spawned at once, being beyond the highest spawn
+# position (1800 pixels above the screen)
+WHOLE_WAVE_MARGIN = 2000
+
+
+def idle(frame, game):
+    """
+    Holds no keys
+    :param frame: integer frame number
+    :param game: Game being played
+    :return: InputState for the frame
+    """
+    return main.NO_INPUT
+
+
+def start_at_level(game, level):
+    """
+    Sets a game up so its next wave is the given level's, with lives that never run out and every
+    enemy of the wave in play from the frame it spawns
+    :param game: new Game
+    :param level: integer level to start at
+    :return: None
+    """
+    game.level = level - 1
+    game.wave_amount = 5 * level
+    game.lives = float('inf')
+    # Put every wave into play the frame it spawns, so the scenario carries the load of the whole
+    # wave rather than the first of it trickling in from above the screen
+    game.spawn_queue.margin = WHOLE_WAVE_MARGIN
+
+
+def level_1_idle(game):
+    """
+    First level with nobody at the controls
+    :param game: new Game
+    :return: (game, input source, function run before every frame or None)
+    """
+    return game, idle, None
+
+
+def level_50(game):
+    """
+    Level 50 wave of 255 enemies while the player sweeps and fires
+    :param game: new Game
+    :return: (game, input source, function run before every frame or None)
+    """
+    # 255 enemies
+    start_at_level(game, 50)
+    return game, sweeping_fire, None
+
+
+def bullet_storm(game):
+    """
+    Level 20 with the bullet storm hazard held on for the whole run
+    :param game: new Game
+    :return: (game, input source, function run before every frame or None)
+    """
+    start_at_level(game, 20)
+
+    def every_frame(game):
+        if not game.hazard_effects['bullet_storm_activated']:
+            game.set_bullet_storm(True)
+    return game, sweeping_fire, every_frame
+
+
+def flame_thrower(game):
+    """
+    Level 20 with the flame thrower upgrade held on and fired for the whole run
+    :param game: new Game
+    :return: (game, input source, function run before every frame or None)
+    """
+    start_at_level(game, 20)
+
+    def every_frame(game):
+        game.upgrade_effects['flame_thrower'] = True
+        game.player.set_flame_thrower(True)
+    return game, sweeping_fire, every_frame
+
+
+# Scenario name -> function setting up a new game and returning (game, input source, function run
+# before every frame or None)
+SCENARIOS = {
+    'level_1_idle': level_1_idle,
+    'level_50': level_50,
+    'bullet_storm': bullet_storm,
+    'flame_thrower': flame_thrower,
+}
+
+
+def play(scenario, frames, frame_times=None):
+    """
+    Plays a scenario from a fixed seed
+    :param scenario: function from SCENARIOS
+    :param frames: integer number of frames to play
+    :param frame_times: list to append the seconds taken by each frame to, or None
+    :return: None
+    """
+    # Start every run from the same state: same seed and empty entity pools
+    for pool in (main.LASER_POOL, main.ENEMY_POOL, main.UPGRADE_POOL, main.HAZARD_POOL):
+        pool.free.clear()
+    gc.collect()
+    game, input_source, every_frame = scenario(main.Game(seed=SEED))
+    clock = time.perf_counter
+    for frame in range(frames):
+        if every_frame is not None:
+            every_frame(game)
+        keys = input_source(frame, game)
+        start = clock()
+        game.step(keys)
+        if frame_times is not None:
+            frame_times.append(clock() - start)
+
+
+def run_scenario(name, frames):
+    """
+    Times a scenario, then plays it again under tracemalloc for its peak memory
+    :param name: string key of SCENARIOS
+    :param frames: integer number of frames to play
+    :return: dictionary of measurements
+    """
+    scenario = SCENARIOS[name]
+    frame_times = []
+    play(scenario, frames, frame_times)
+    total = sum(frame_times)
+
+    tracemalloc.start()
+    play(scenario, frames)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'frames': frames,
+        'fps': frames / total if total else float('inf'),
+        'p50_ms': percentile(frame_times, 0.50) * 1000,
+        'p99_ms': percentile(frame_times, 0.99) * 1000,
+        'peak_kib': peak / 1024,
+    }
+
+
+def import_time(runs=5):
+    """
+    Times importing main in fresh interpreters, pygame included
+    :param runs: integer number of interpreters to start
+    :return: median milliseconds
+    """
+    code = 'import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)'
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for i in range(runs):
+        output = subprocess.run([sys.executable, '-c', code], cwd=directory, capture_output=True, text=True,
+                                check=True).stdout.split()
+        times.append(float(output[-1]) * 1000)
+    return statistics.median(times)
+
+
+def run(names, frames):
+    """
+    Runs the given scenarios
+    :param names: list of keys of SCENARIOS
+    :param frames: integer number of frames per scenario
+    :return: results dictionary ready to be written as JSON
+    """
+    results = {'version': RESULTS_VERSION, 'python': platform.python_version(),
+               'pygame': pygame.version.ver, 'seed': SEED, 'import_ms': import_time(), 'scenarios': {}}
+    print(f"{'import main':<16} {results['import_ms']:10.1f} ms")
+    for name in names:
+        results['scenarios'][name] = run_scenario(name, frames)
+        print(format_result(name, results['scenarios'][name]))
+    return results
+
+
+def format_result(name, result):
+    """
+    Formats one scenario's measurements as a line
+    :param name: string scenario name
+    :param result: dictionary of measurements
+    :return: string
+    """
+    return (f"{name:<16} {result['fps']:10.1f} fps  p50 {result['p50_ms']:8.3f} ms  "
+            f"p99 {result['p99_ms']:8.3f} ms  peak {result['peak_kib']:9.1f} KiB")
+
+
+def compare(baseline, current, threshold):
+    """
+    Finds every measurement that got worse than the baseline by more than the threshold.
+    Lower fps is worse; higher frame times, memory and import time are worse
+    :param baseline: results dictionary of the baseline run
+    :param current: results dictionary of the run being checked
+    :param threshold: float fraction a measurement may get worse by, e.g. 0.10 for 10%
+    :return: list of strings describing each regression
+    """
+    regressions = []
+    if 'import_ms' in baseline and 'import_ms' in current:
+        if current['import_ms'] > baseline['import_ms'] * (1 + threshold):
+            regressions.append(f"import_ms {baseline['import_ms']:.3f} -> {current['import_ms']:.3f}")
+    for name, result in current['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        if result['fps'] < base['fps'] * (1 - threshold):
+            regressions.append(f"{name}: fps {base['fps']:.1f} -> {result['fps']:.1f}")
+        for key in ('p50_ms', 'p99_ms', 'peak_kib'):
+            if result[key] > base[key] * (1 + threshold):
+                regressions.append(f'{name}: {key} {base[key]:.3f} -> {result[key]:.3f}')
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run scenarios and write results')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+    run_parser.add_argument('--frames', type=int, default=2000)
+    run_parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                            help='scenario to run; may be repeated, defaults to all')
+    compare_parser = commands.add_parser('compare', help='fail if results regressed against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='fraction a measurement may get worse by (default 0.10)')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    if args.command == 'run':
+        results = run(args.scenario or list(SCENARIOS), args.frames)
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    else:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        with open(args.current) as file:
+            current = json.load(file)
+        regressions = compare(baseline, current, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
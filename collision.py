@@ -0,0 +1,177 @@
+"""
+Broadphase collision detection. A uniform grid (spatial hash) buckets objects by the cells their
+bounding rectangles cover so that only pairs whose rectangles actually overlap are handed to the
+pixel perfect mask test in collide
+"""
+
+# Width and height in pixels of a grid cell, about the size of an enemy ship
+CELL_SIZE = 64
+
+
+class CollisionCounter:
+    """
+    Running totals of collision tests, read by the profiler
+    """
+
+    def __init__(self):
+        """
+        Initializes both totals to 0
+        """
+        # Pairs of objects tested, and the subset that reached the pixel perfect mask test
+        self.pair_tests = 0
+        self.mask_tests = 0
+
+
+COUNTER = CollisionCounter()
+
+
+def bounding_rect(object):
+    """
+    Gets the rectangle around the opaque pixels of any game object with x & y-coordinates and
+    a shared Asset
+    :param object: ship, laser, upgrade, or hazard
+    :return: tuple of (x, y, width, height)
+    """
+    offset_x, offset_y, width, height = object.asset.bounds
+    return object.x + offset_x, object.y + offset_y, width, height
+
+
+def rects_overlap(rect1, rect2):
+    """
+    Tells us if two (x, y, width, height) rectangles overlap
+    :param rect1: first rectangle
+    :param rect2: second rectangle
+    :return: boolean of True if the rectangles overlap and False otherwise
+    """
+    x1, y1, w1, h1 = rect1
+    x2, y2, w2, h2 = rect2
+    return x1 < x2 + w2 and x2 < x1 + w1 and y1 < y2 + h2 and y2 < y1 + h1
+
+
+class SpatialHash:
+    """
+    Uniform grid that maps cells to the objects whose bounding rectangles cover them. Objects can
+    be inserted, removed, and updated incrementally as they move, and queried by rectangle
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        """
+        Initializes an empty grid
+        :param cell_size: integer width and height of a cell in pixels
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+        # id(object) -> (object, tuple of the cells it was inserted into)
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, object):
+        return id(object) in self.entries
+
+    def cells_for(self, rect):
+        """
+        Gets the keys of every cell a rectangle covers
+        :param rect: tuple of (x, y, width, height)
+        :return: tuple of (column, row) cell keys
+        """
+        x, y, width, height = rect
+        size = self.cell_size
+        left = int(x // size)
+        right = int((x + width - 1) // size)
+        top = int(y // size)
+        bottom = int((y + height - 1) // size)
+        return tuple((column, row) for column in range(left, right + 1) for row in range(top, bottom + 1))
+
+    def insert(self, object):
+        """
+        Adds an object to every cell its bounding rectangle covers
+        :param object: object with x & y-coordinates and an Asset
+        :return: None
+        """
+        keys = self.cells_for(bounding_rect(object))
+        self.entries[id(object)] = (object, keys)
+        cells = self.cells
+        for key in keys:
+            if key in cells:
+                cells[key].append(object)
+            else:
+                cells[key] = [object]
+
+    def remove(self, object):
+        """
+        Removes an object from the grid if it is in it
+        :param object: object previously inserted
+        :return: None
+        """
+        entry = self.entries.pop(id(object), None)
+        if entry is None:
+            return
+        cells = self.cells
+        for key in entry[1]:
+            bucket = cells[key]
+            bucket.remove(object)
+            if not bucket:
+                del cells[key]
+
+    def update(self, object):
+        """
+        Moves an object into the cells matching its current position, doing nothing if it is
+        still covering the same cells
+        :param object: object previously inserted
+        :return: None
+        """
+        entry = self.entries.get(id(object))
+        if entry is None:
+            self.insert(object)
+        elif entry[1] != self.cells_for(bounding_rect(object)):
+            self.remove(object)
+            self.insert(object)
+
+    def clear(self):
+        """
+        Removes every object from the grid
+        :return: None
+        """
+        self.cells.clear()
+        self.entries.clear()
+
+    def rebuild(self, objects):
+        """
+        Clears the grid and inserts every object passed in
+        :param objects: iterable of objects with x & y-coordinates and an Asset
+        :return: None
+        """
+        self.clear()
+        for object in objects:
+            self.insert(object)
+
+    def query(self, rect):
+        """
+        Gets every object whose bounding rectangle overlaps the given rectangle, in the order
+        they were found and without duplicates
+        :param rect: tuple of (x, y, width, height)
+        :return: list of candidate objects
+        """
+        cells = self.cells
+        found = []
+        seen = set()
+        for key in self.cells_for(rect):
+            bucket = cells.get(key)
+            if bucket is None:
+                continue
+            for object in bucket:
+                if id(object) not in seen:
+                    seen.add(id(object))
+                    if rects_overlap(rect, bounding_rect(object)):
+                        found.append(object)
+        return found
+
+    def candidates(self, object):
+        """
+        Gets every object in the grid whose bounding rectangle overlaps the given object's
+        :param object: object with x & y-coordinates and an Asset
+        :return: list of candidate objects
+        """
+        return [other for other in self.query(bounding_rect(object)) if other is not object]
@@ -0,0 +1,124 @@
+"""
+Scheduler for timed effects such as the flame thrower, freeze and bullet storm. Every running
+effect is a timer on a timer wheel: a ring of buckets, one per tick, with each timer kept in the
+bucket of the tick it expires on. Advancing a tick only looks at that tick's bucket, so the cost
+per tick follows the number of timers expiring rather than the number running.
+
+Effects stack. Starting an effect that is already running adds another timer, and the effect lasts
+until its last timer expires. Its start callback fires when the first timer starts and its expire
+callback when the last one ends. Different effects overlap freely
+"""
+
+# Buckets in the wheel; timers longer than this go round more than once
+WHEEL_SIZE = 512
+
+
+class Timer:
+    """
+    One running instance of an effect
+    """
+    __slots__ = ('name', 'expires', 'ended')
+
+    def __init__(self, name, expires):
+        self.name = name
+        self.expires = expires
+        self.ended = False
+
+
+class EffectScheduler:
+    """
+    Timer wheel of running effects, advanced once per simulation tick
+    """
+
+    def __init__(self, wheel_size=WHEEL_SIZE):
+        """
+        Initializes a scheduler at tick 0 with no effects
+        :param wheel_size: integer number of buckets in the wheel
+        """
+        self.tick = 0
+        self.wheel = [[] for i in range(wheel_size)]
+        # Effect name -> (start callback, expire callback)
+        self.callbacks = {}
+        # Effect name -> number of timers running
+        self.stacks = {}
+
+    def register(self, name, on_start=None, on_expire=None):
+        """
+        Sets the functions called when an effect starts and when it ends
+        :param name: string name of the effect
+        :param on_start: function of no arguments called when the effect goes from off to on, or None
+        :param on_expire: function of no arguments called when the effect goes from on to off, or None
+        :return: None
+        """
+        self.callbacks[name] = (on_start, on_expire)
+        self.stacks.setdefault(name, 0)
+
+    def start(self, name, duration):
+        """
+        Runs an effect for a number of ticks. Timers of one effect overlap rather than add up: the
+        effect stays on until the last of its timers expires
+        :param name: string name of a registered effect
+        :param duration: integer number of ticks, at least 1
+        :return: Timer, which can be cancelled
+        """
+        timer = Timer(name, self.tick + max(1, duration))
+        self.wheel[timer.expires % len(self.wheel)].append(timer)
+        self.stacks[name] += 1
+        if self.stacks[name] == 1:
+            on_start = self.callbacks[name][0]
+            if on_start is not None:
+                on_start()
+        return timer
+
+    def cancel(self, timer):
+        """
+        Ends one instance of an effect early
+        :param timer: Timer from start
+        :return: None
+        """
+        if not timer.ended and timer.expires > self.tick:
+            self.wheel[timer.expires % len(self.wheel)].remove(timer)
+            self._end(timer)
+
+    def advance(self):
+        """
+        Moves on one tick, ending every timer that expires on it
+        :return: None
+        """
+        self.tick += 1
+        bucket = self.wheel[self.tick % len(self.wheel)]
+        if not bucket:
+            return
+        expiring = [timer for timer in bucket if timer.expires == self.tick]
+        if len(expiring) < len(bucket):
+            bucket[:] = [timer for timer in bucket if timer.expires != self.tick]
+        else:
+            bucket.clear()
+        for timer in expiring:
+            self._end(timer)
+
+    def _end(self, timer):
+        timer.ended = True
+        self.stacks[timer.name] -= 1
+        if self.stacks[timer.name] == 0:
+            on_expire = self.callbacks[timer.name][1]
+            if on_expire is not None:
+                on_expire()
+
+    def is_active(self, name):
+        """
+        Tells us if an effect is running
+        :param name: string name of a registered effect
+        :return: boolean
+        """
+        return self.stacks.get(name, 0) > 0
+
+    def remaining(self, name):
+        """
+        Gets how long an effect has left to run
+        :param name: string name of a registered effect
+        :return: integer ticks until its last timer expires, 0 if it is not running
+        """
+        if not self.is_active(name):
+            return 0
+        return max(timer.expires for bucket in self.wheel for timer in bucket if timer.name == name) - self.tick
@@ -0,0 +1,101 @@
+"""
+Container for game entities with deferred removal. Killing an entity only marks it, which is
+O(1) and safe while the container is being iterated; marked entities are skipped by iteration
+and dropped all at once by a single compaction pass at the end of the frame
+"""
+
+
+class EntityList:
+    """
+    Ordered collection of entities that supports O(1) kill marks during iteration. An entity is
+    its own handle: it stays valid, and is_alive answers for it, until the next compaction
+    """
+
+    def __init__(self, items=()):
+        """
+        Initializes the list with the given entities, all alive
+        :param items: iterable of entities
+        """
+        self.items = list(items)
+        # id() of every entity killed since the last compaction
+        self.dead = set()
+
+    def __len__(self):
+        """
+        :return: integer number of live entities
+        """
+        return len(self.items) - len(self.dead)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        """
+        Iterates over live entities. Entities killed or added during iteration are handled
+        correctly: killed ones are skipped and added ones are visited
+        """
+        dead = self.dead
+        for entity in self.items:
+            if id(entity) not in dead:
+                yield entity
+
+    def append(self, entity):
+        """
+        Adds a live entity to the end of the list
+        :param entity: entity to add
+        :return: None
+        """
+        self.items.append(entity)
+
+    def kill(self, entity):
+        """
+        Marks an entity for removal at the next compaction
+        :param entity: live entity in this list
+        :return: None
+        """
+        self.dead.add(id(entity))
+
+    def is_alive(self, entity):
+        """
+        Tells us if an entity added to this list has not been killed since
+        :param entity: entity added to this list
+        :return: boolean of True if the entity is alive and False otherwise
+        """
+        return id(entity) not in self.dead
+
+    def compact(self):
+        """
+        Drops every killed entity in one pass, keeping the rest in order
+        :return: list of the entities dropped
+        """
+        dead = self.dead
+        if not dead:
+            return []
+        removed = []
+        alive = []
+        for entity in self.items:
+            if id(entity) in dead:
+                removed.append(entity)
+            else:
+                alive.append(entity)
+        self.items = alive
+        dead.clear()
+        return removed
+
+    def clear(self):
+        """
+        Empties the list in place, keeping its storage for reuse
+        :return: None
+        """
+        self.items.clear()
+        self.dead.clear()
+
+    def drain(self):
+        """
+        Empties the list
+        :return: list of every entity that was in the list, alive or killed
+        """
+        items = self.items
+        self.items = []
+        self.dead.clear()
+        return items
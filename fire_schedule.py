@@ -0,0 +1,98 @@
+"""
+Event driven enemy fire. Each enemy used to roll a die every frame and fire on a 1 in odds chance,
+which is a geometric distribution of frames between shots. Here the frame of each enemy's next shot
+is drawn once from that distribution and kept in a heap, so the random stream and the per enemy
+work are only touched on the frames a shot actually happens. The distribution has no memory, so
+when the odds change (bullet storm starting or ending) every enemy's next shot can simply be drawn
+again from the new odds without changing the statistics
+"""
+import heapq
+import math
+
+
+def frames_until_shot(rng, odds):
+    """
+    Draws the number of frames until a shot, as if rolling a 1 in odds chance every frame
+    :param rng: random.Random to draw from
+    :param odds: integer; each frame fires with a 1 in odds chance, never if odds is 1 or less
+    :return: integer frames, at least 1, or None if the shot never happens
+    """
+    if odds <= 1:
+        return None
+    # Inverse of the geometric distribution's CDF; 1 - random() is in (0, 1]
+    return int(math.log(1.0 - rng.random()) / math.log(1.0 - 1.0 / odds)) + 1
+
+
+class FireSchedule:
+    """
+    Heap of (shot frame, schedule order, enemy) entries, one live entry per enemy
+    """
+
+    def __init__(self, rng):
+        """
+        Initializes an empty schedule
+        :param rng: random.Random the shot times are drawn from
+        """
+        self.rng = rng
+        self.heap = []
+        self.scheduled = 0
+        # enemy -> its live heap entry; entries no longer in here are stale and skipped
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def schedule(self, enemy, frame, odds):
+        """
+        Draws an enemy's next shot, replacing any it already had
+        :param enemy: Enemy to schedule
+        :param frame: integer frame after which the enemy may fire
+        :param odds: integer; the enemy fires with a 1 in odds chance per frame
+        :return: None
+        """
+        frames = frames_until_shot(self.rng, odds)
+        if frames is None:
+            self.entries.pop(enemy, None)
+            return
+        entry = (frame + frames, self.scheduled, enemy)
+        self.scheduled += 1
+        self.entries[enemy] = entry
+        heapq.heappush(self.heap, entry)
+
+    def remove(self, enemy):
+        """
+        Cancels an enemy's next shot
+        :param enemy: Enemy to cancel
+        :return: None
+        """
+        self.entries.pop(enemy, None)
+
+    def redraw(self, frame, odds):
+        """
+        Draws every enemy's next shot again from new odds
+        :param frame: integer frame after which the enemies may fire
+        :param odds: integer new 1 in odds chance per frame
+        :return: None
+        """
+        enemies = [entry[2] for entry in sorted(self.entries.values())]
+        self.heap = []
+        self.entries = {}
+        for enemy in enemies:
+            self.schedule(enemy, frame, odds)
+
+    def pop_due(self, frame):
+        """
+        Takes every enemy due to fire by a frame; they are no longer scheduled until scheduled again
+        :param frame: integer current frame
+        :return: list of enemies in the order their shots were due
+        """
+        due = []
+        heap = self.heap
+        entries = self.entries
+        while heap and heap[0][0] <= frame:
+            entry = heapq.heappop(heap)
+            enemy = entry[2]
+            if entries.get(enemy) is entry:
+                del entries[enemy]
+                due.append(enemy)
+        return due
@@ -0,0 +1,29 @@
+"""
+Helpers shared by the headless tools (benchmark.py, memory_report.py, sweep.py, netplay.py): the
+scripted bot that plays their games, and the percentile their timings are reported at
+"""
+import pygame
+
+import main
+
+
+def sweeping_fire(frame, game):
+    """
+    Keeps firing while sweeping left and right across the screen
+    :param frame: integer frame number
+    :param game: Game being played
+    :return: InputState for the frame
+    """
+    direction = pygame.K_LEFT if (frame // 120) % 2 else pygame.K_RIGHT
+    return main.InputState([pygame.K_SPACE, direction])
+
+
+def percentile(values, fraction):
+    """
+    Gets a percentile of some values by the nearest rank method
+    :param values: non-empty list of numbers
+    :param fraction: float between 0 and 1
+    :return: the value at that percentile
+    """
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
@@ -0,0 +1,123 @@
+"""
+Heads up display text. Fonts are looked up once per process and rendered text surfaces are kept
+in a bounded least recently used cache, so text is only rendered again when what it says changes
+"""
+from collections import OrderedDict
+
+import pygame
+
+from renderer import display_format
+
+WHITE = (255, 255, 255)
+
+# Fonts already looked up, keyed by (name, size)
+_fonts = {}
+
+
+def get_font(name, size):
+    """
+    Gets a system font, looking it up only the first time it is asked for
+    :param name: string name of the font
+    :param size: integer point size
+    :return: pygame Font
+    """
+    font = _fonts.get((name, size))
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = _fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+
+class TextCache:
+    """
+    Least recently used cache of rendered text surfaces keyed by (font, text, color)
+    """
+
+    def __init__(self, capacity=64):
+        """
+        Initializes an empty cache
+        :param capacity: integer maximum number of surfaces kept
+        """
+        self.capacity = capacity
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color=WHITE):
+        """
+        Gets the antialiased surface for some text, rendering it only if it is not cached
+        :param font: pygame Font
+        :param text: string to render
+        :param color: (r, g, b) tuple
+        :return: pygame Surface in the display's pixel format, shared and not to be drawn onto
+        """
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.surfaces[key] = display_format(font.render(text, 1, color))
+        if len(self.surfaces) > self.capacity:
+            self.surfaces.popitem(last=False)
+        return surface
+
+
+# Cache shared by every screen in the game
+TEXT_CACHE = TextCache()
+
+
+class Hud:
+    """
+    Level and lives counters along the top of the screen, and the paused and game over messages
+    """
+
+    def __init__(self, width, height, cache=TEXT_CACHE):
+        """
+        Initializes the HUD for a screen of the given size
+        :param width: integer width of the screen
+        :param height: integer height of the screen
+        :param cache: TextCache to render text through
+        """
+        self.width = width
+        self.height = height
+        self.cache = cache
+        self.font = get_font('comicsans', 30)
+        self.game_over_font = get_font('comicsans', 80)
+
+    def sprites(self, level, lives):
+        """
+        Gets the level and lives counters as sprites for a batched blit
+        :param level: integer current level
+        :param lives: integer lives remaining
+        :return: list of (image, (x, y)) pairs
+        """
+        level_text = self.cache.render(self.font, f'Level: {level}')
+        lives_text = self.cache.render(self.font, f'Lives: {lives}')
+        return [(lives_text, (10, 10)), (level_text, (self.width - level_text.get_width() - 10, 10))]
+
+    def game_over_sprites(self):
+        """
+        Gets the game over message as sprites for a batched blit
+        :return: list of (image, (x, y)) pairs
+        """
+        return [self.centered(self.cache.render(self.game_over_font, 'GAME OVER'))]
+
+    def paused_sprites(self):
+        """
+        Gets the paused message and how to resume as sprites for a batched blit
+        :return: list of (image, (x, y)) pairs
+        """
+        title, (x, y) = self.centered(self.cache.render(self.game_over_font, 'PAUSED'))
+        hint = self.cache.render(self.font, 'Press P to resume')
+        return [(title, (x, y)), (hint, (self.width / 2 - hint.get_width() / 2, y + title.get_height()))]
+
+    def centered(self, surface):
+        """
+        Positions a surface in the middle of the screen
+        :param surface: pygame Surface
+        :return: (image, (x, y)) pair
+        """
+        return surface, (self.width / 2 - surface.get_width() / 2, self.height / 2 - surface.get_height() / 2)
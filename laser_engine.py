@@ -0,0 +1,334 @@
+"""
+Struct-of-arrays laser system. Every laser in the game lives in one set of contiguous NumPy
+arrays (x, y, velocity, owner, image id) that are moved, culled, and collision tested against
+ships in batch. Player lasers are sorted by row and x once a frame, so each ship only looks at the
+lasers in the rows and columns it covers, and a laser made of one rectangle is tested exactly
+against a ship made of a few rectangles in NumPy too; only images left to their masks are tested
+one pair at a time in Python. The cost of a frame still grows with the number of lasers, but
+slowly: a sort, a few passes over the arrays, and work for the pairs that are actually close.
+Requires NumPy
+"""
+import numpy as np
+
+from assets import ASSETS
+from collision import COUNTER
+from narrowphase import MAX_RECTS, overlap
+
+# Owner id of the player's lasers; every enemy gets its own positive owner id
+PLAYER_OWNER = 0
+# Pixels of height in each row of player lasers a target searches through
+ROW_HEIGHT = 32
+
+
+class LaserEngine:
+    """
+    Holds every live laser as a row across parallel arrays. Rows past count are unused capacity
+    and live rows are kept packed at the front so every operation is a slice
+    """
+
+    def __init__(self, height, speed, capacity=1024):
+        """
+        Initializes an empty engine
+        :param height: integer height of the screen; lasers above 0 or below height are culled
+        :param speed: integer pixels per frame a laser travels; player lasers travel up and
+        enemy lasers travel down
+        :param capacity: number of lasers to allocate room for up front, doubled when full
+        """
+        self.height = height
+        self.speed = speed
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.velocity = np.zeros(capacity, dtype=np.int32)
+        self.owner = np.zeros(capacity, dtype=np.int32)
+        self.image_id = np.zeros(capacity, dtype=np.int32)
+
+        # Images lasers are drawn with, their shared Assets, and the opaque bounds of each image
+        # as rows of (x offset, y offset, width, height)
+        self.images = []
+        self.image_ids = {}
+        self.assets = []
+        self.bounds = np.zeros((0, 4), dtype=np.int32)
+        # Whether each image is exactly its opaque bounds, so hits can be worked out in NumPy
+        self.single_rect = np.zeros(0, dtype=bool)
+        # Widest and tallest opaque bounds of any image, for the lasers that can reach a ship
+        self.max_width = 0
+        self.max_height = 0
+
+        self.next_owner = PLAYER_OWNER + 1
+
+    def __len__(self):
+        return self.count
+
+    def new_owner(self):
+        """
+        Hands out an owner id for a newly spawned enemy
+        :return: positive integer owner id
+        """
+        owner = self.next_owner
+        self.next_owner += 1
+        return owner
+
+    def get_image_id(self, image):
+        """
+        Gets the id of a laser image, registering it on first use
+        :param image: pygame Surface of the laser
+        :return: integer image id
+        """
+        image_id = self.image_ids.get(image)
+        if image_id is None:
+            image_id = self.image_ids[image] = len(self.images)
+            asset = ASSETS.get(image)
+            self.images.append(image)
+            self.assets.append(asset)
+            self.bounds = np.vstack([self.bounds, np.array(asset.bounds, dtype=np.int32)])
+            self.single_rect = np.append(self.single_rect, asset.shape.kind == 'rect')
+            self.max_width = max(self.max_width, asset.bounds[2])
+            self.max_height = max(self.max_height, asset.bounds[3])
+        return image_id
+
+    def grow(self):
+        """
+        Doubles the capacity of every array
+        :return: None
+        """
+        capacity = len(self.x) * 2
+        for name in ('x', 'y', 'velocity', 'owner', 'image_id'):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+
+    def spawn(self, x, y, owner, image):
+        """
+        Adds a laser travelling up if the player owns it and down otherwise
+        :param x: integer representing x-coordinate
+        :param y: integer representing y-coordinate
+        :param owner: owner id, PLAYER_OWNER or an id from new_owner
+        :param image: pygame Surface of the laser
+        :return: None
+        """
+        if self.count == len(self.x):
+            self.grow()
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.velocity[i] = -self.speed if owner == PLAYER_OWNER else self.speed
+        self.owner[i] = owner
+        self.image_id[i] = self.get_image_id(image)
+        self.count += 1
+
+    def keep(self, keep):
+        """
+        Packs the lasers flagged to keep at the front of the arrays, dropping the rest
+        :param keep: boolean array with one entry per live laser
+        :return: None
+        """
+        count = int(np.count_nonzero(keep))
+        if count == self.count:
+            return
+        for array in (self.x, self.y, self.velocity, self.owner, self.image_id):
+            array[:count] = array[:self.count][keep]
+        self.count = count
+
+    def move(self):
+        """
+        Moves every laser by its velocity and culls the ones that have left the screen
+        :return: None
+        """
+        n = self.count
+        y = self.y[:n]
+        y += self.velocity[:n]
+        self.keep((y >= 0) & (y <= self.height))
+
+    def remove(self, indices):
+        """
+        Removes lasers by index
+        :param indices: sequence of indices of live lasers
+        :return: None
+        """
+        if len(indices) == 0:
+            return
+        keep = np.ones(self.count, dtype=bool)
+        keep[np.asarray(indices, dtype=np.intp)] = False
+        self.keep(keep)
+
+    def remove_owners(self, owners):
+        """
+        Removes every laser belonging to the given owners, as when their ship is destroyed
+        :param owners: sequence of owner ids
+        :return: None
+        """
+        if len(owners) == 0 or self.count == 0:
+            return
+        self.keep(~np.isin(self.owner[:self.count], np.asarray(owners, dtype=np.int32)))
+
+    def rects(self):
+        """
+        Gets the opaque bounding rectangle of every live laser
+        :return: tuple of arrays (left, top, right, bottom)
+        """
+        n = self.count
+        bounds = self.bounds[self.image_id[:n]]
+        left = self.x[:n] + bounds[:, 0]
+        top = self.y[:n] + bounds[:, 1]
+        return left, top, left + bounds[:, 2], top + bounds[:, 3]
+
+    def mask_hit(self, i, target):
+        """
+        Pixel perfect test between one laser and a target whose rectangles overlap
+        :param i: index of a live laser
+        :param target: ship with x & y-coordinates and an Asset
+        :return: boolean of True if they overlap and False otherwise
+        """
+        COUNTER.mask_tests += 1
+        shape = self.assets[self.image_id[i]].shape
+        return overlap(shape, target.asset.shape, int(target.x - self.x[i]), int(target.y - self.y[i]))
+
+    def resolve(self, lasers, targets, target_indices):
+        """
+        Exact test of laser and target pairs whose rectangles overlap. A laser that is a single
+        rectangle against a target made of rectangles is resolved in NumPy, against every
+        rectangle of the target at once; any other pair goes to mask_hit
+        :param lasers: array of laser indices, one per pair
+        :param targets: list of ships with x & y-coordinates and an Asset
+        :param target_indices: array of indices into targets, one per pair
+        :return: boolean array, True for each pair that hits
+        """
+        pairs = len(lasers)
+        hit = np.zeros(pairs, dtype=bool)
+        if pairs == 0:
+            return hit
+        # Rectangles of every target relative to its position, padded to MAX_RECTS; a target
+        # left to its mask has no valid rectangles
+        rects = np.zeros((len(targets), MAX_RECTS, 4), dtype=np.int32)
+        valid = np.zeros((len(targets), MAX_RECTS), dtype=bool)
+        for j, target in enumerate(targets):
+            shape_rects = target.asset.shape.rects
+            if shape_rects is not None:
+                rects[j, :len(shape_rects)] = shape_rects
+                valid[j, :len(shape_rects)] = True
+        target_x = np.array([target.x for target in targets])
+        target_y = np.array([target.y for target in targets])
+
+        image_ids = self.image_id[lasers]
+        exact = self.single_rect[image_ids] & valid[target_indices, 0]
+        bounds = self.bounds[image_ids]
+        left = self.x[lasers] + bounds[:, 0]
+        top = self.y[lasers] + bounds[:, 1]
+        pair_rects = rects[target_indices]
+        pair_x = target_x[target_indices, None]
+        pair_y = target_y[target_indices, None]
+        right = (left + bounds[:, 2])[:, None]
+        bottom = (top + bounds[:, 3])[:, None]
+        hit[:] = (valid[target_indices]
+                  & (left[:, None] < pair_x + pair_rects[:, :, 2]) & (pair_x + pair_rects[:, :, 0] < right)
+                  & (top[:, None] < pair_y + pair_rects[:, :, 3]) & (pair_y + pair_rects[:, :, 1] < bottom)
+                  ).any(axis=1) & exact
+        for k in np.flatnonzero(~exact).tolist():
+            hit[k] = self.mask_hit(int(lasers[k]), targets[int(target_indices[k])])
+        return hit
+
+    def hits_on(self, target):
+        """
+        Finds every enemy laser hitting a target, testing all rectangles at once and exactly only
+        the lasers whose rectangle overlaps the target's
+        :param target: ship with x & y-coordinates and an Asset
+        :return: list of laser indices
+        """
+        if self.count == 0:
+            return []
+        offset_x, offset_y, width, height = target.asset.bounds
+        target_left = target.x + offset_x
+        target_top = target.y + offset_y
+        left, top, right, bottom = self.rects()
+        COUNTER.pair_tests += self.count
+        candidates = np.flatnonzero((self.owner[:self.count] != PLAYER_OWNER)
+                                    & (left < target_left + width) & (target_left < right)
+                                    & (top < target_top + height) & (target_top < bottom))
+        hit = self.resolve(candidates, [target], np.zeros(len(candidates), dtype=np.intp))
+        return candidates[hit].tolist()
+
+    def player_hits(self, targets):
+        """
+        Finds the player lasers that hit a target and the targets they hit; one laser can hit
+        several targets. Player lasers are sorted by ROW_HEIGHT row of their tops and then by their
+        lefts, so the lasers of one row within a span of x are a contiguous run found by binary
+        search; each target takes the runs of the rows and columns that can reach it, and only
+        those lasers have their rectangles tested
+        :param targets: iterable of ships with x & y-coordinates and an Asset
+        :return: (list of laser indices in increasing order, list of targets hit, in the order of
+        the first laser to hit each)
+        """
+        targets = list(targets)
+        if self.count == 0 or not targets:
+            return [], []
+        player_lasers = np.flatnonzero(self.owner[:self.count] == PLAYER_OWNER)
+        if len(player_lasers) == 0:
+            return [], []
+        left, top, right, bottom = (side[player_lasers].astype(np.int64) for side in self.rects())
+        min_left = int(left.min())
+        min_top = int(top.min())
+        span = int(left.max()) - min_left + 1
+        keys = (top - min_top) // ROW_HEIGHT * span + (left - min_left)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+
+        target_bounds = np.array([target.asset.bounds for target in targets], dtype=np.int64)
+        target_left = np.array([target.x for target in targets], dtype=np.int64) + target_bounds[:, 0]
+        target_top = np.array([target.y for target in targets], dtype=np.int64) + target_bounds[:, 1]
+        target_right = target_left + target_bounds[:, 2]
+        target_bottom = target_top + target_bounds[:, 3]
+        # A laser can reach a target if its left is after target_left - max_width and before
+        # target_right, and its top after target_top - max_height and before target_bottom
+        low = np.clip(target_left - self.max_width + 1 - min_left, 0, span)
+        high = np.clip(target_right - min_left, 0, span)
+        first_row = (target_top - self.max_height + 1 - min_top) // ROW_HEIGHT
+        last_row = (target_bottom - 1 - min_top) // ROW_HEIGHT
+        row_count = int((last_row - first_row).max()) + 1
+        rows = first_row[:, None] + np.arange(row_count)
+        starts = np.searchsorted(sorted_keys, (rows * span + low[:, None]).ravel())
+        ends = np.searchsorted(sorted_keys, (rows * span + high[:, None]).ravel())
+        lengths = np.where((rows <= last_row[:, None]).ravel(), np.maximum(ends - starts, 0), 0)
+        total = int(lengths.sum())
+        if total == 0:
+            return [], []
+        # Every (sorted laser, target) pair in the runs, without a Python loop
+        target_indices = np.repeat(np.arange(len(targets)).repeat(row_count), lengths)
+        first = np.cumsum(lengths) - lengths
+        ranks = np.arange(total) - np.repeat(first, lengths) + np.repeat(starts, lengths)
+        candidates = order[ranks]
+        COUNTER.pair_tests += total
+        close = ((left[candidates] < target_right[target_indices])
+                 & (target_left[target_indices] < right[candidates])
+                 & (top[candidates] < target_bottom[target_indices])
+                 & (target_top[target_indices] < bottom[candidates]))
+        candidates = candidates[close]
+        target_indices = target_indices[close]
+        lasers = player_lasers[candidates]
+        hit = self.resolve(lasers, targets, target_indices)
+        lasers = lasers[hit]
+        target_indices = target_indices[hit]
+        # Targets in order of their first hit, taking hits by laser and then by target
+        pair_order = np.lexsort((target_indices, lasers))
+        hit_targets, first_hits = np.unique(target_indices[pair_order], return_index=True)
+        hit_targets = hit_targets[np.argsort(first_hits)]
+        return np.unique(lasers).tolist(), [targets[j] for j in hit_targets.tolist()]
+
+    def sprites(self):
+        """
+        Gets every laser as a sprite for a batched blit
+        :return: list of (image, (x, y)) pairs
+        """
+        n = self.count
+        images = self.images
+        return [(images[image_id], (x, y)) for image_id, x, y
+                in zip(self.image_id[:n].tolist(), self.x[:n].tolist(), self.y[:n].tolist())]
+
+    def draw(self, screen):
+        """
+        Draws every laser to screen in one batched blit
+        :param screen: display screen to draw onto
+        :return: None
+        """
+        screen.blits(self.sprites(), doreturn=False)
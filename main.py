@@ -1,38 +1,87 @@
 import pygame
-import os
 import random
-import time
+import warnings
+
+from app_state import GAME_OVER, MENU, PAUSED, PLAYING, CpuMeter
+from assets import ASSETS
+from atlas import BACKGROUND_NAME, load_images
+from collision import SpatialHash
+from effects import EffectScheduler
+from entity_manager import EntityList
+from fire_schedule import FireSchedule
+from hud import TEXT_CACHE, Hud, get_font
+from narrowphase import collide
+from pool import Pool
+from profiler import NULL_PROFILER, FrameProfiler
+from renderer import Renderer, cull
+from replay import InputRecorder, numbered_path
+from spawn_queue import SpawnQueue
+from timestep import MAX_FRAME_SKIP, FixedTimestep, Interpolator
 
-pygame.font.init()
-
-# Initialize screen
 WIDTH, HEIGHT = 775, 600
-SCREEN = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption('Space Invaders')
 
-# Load our images
-BACKGROUND = pygame.transform.scale(pygame.image.load(os.path.join('assets', 'background-black.png')), (WIDTH, HEIGHT))
+# Asset file behind each image constant. Importing this module does no I/O: the screen, images and
+# fonts are set up the first time something uses them
+IMAGE_FILES = {
+    'BACKGROUND': BACKGROUND_NAME,
+    # Lasers
+    'BLUE_LASER': 'pixel_laser_blue.png',
+    'GREEN_LASER': 'pixel_laser_green.png',
+    'RED_LASER': 'pixel_laser_red.png',
+    'YELLOW_LASER': 'pixel_laser_yellow.png',
+    # Spaceship Images
+    'BLUE_SPACESHIP': 'pixel_ship_blue_small.png',
+    'GREEN_SPACESHIP': 'pixel_ship_green_small.png',
+    'RED_SPACESHIP': 'pixel_ship_green_small.png',
+    # Player ship
+    'YELLOW_SPACESHIP': 'pixel_ship_yellow.png',
+    # Upgrade Images
+    'HEALTH': 'health.png',
+    'FLAME_THROWER': 'flame_thrower.png',
+    # Hazard Images
+    'FREEZE_HAZARD': 'snowflake.png',
+    'BULLET_STORM': 'bullet_storm.png',
+}
+
+_screen = None
+_images = None
+
+
+def get_screen():
+    """
+    Gets the game window, opening it the first time it is asked for
+    :return: pygame Surface of the display
+    """
+    global _screen
+    if _screen is None:
+        _screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption('Space Invaders')
+    return _screen
 
-# Lasers
-BLUE_LASER = pygame.image.load(os.path.join('assets', 'pixel_laser_blue.png')).convert_alpha()
-GREEN_LASER = pygame.image.load(os.path.join('assets', 'pixel_laser_green.png')).convert_alpha()
-RED_LASER = pygame.image.load(os.path.join('assets', 'pixel_laser_red.png')).convert_alpha()
-YELLOW_LASER = pygame.image.load(os.path.join('assets', 'pixel_laser_yellow.png')).convert_alpha()
 
-# Spaceship Images
-BLUE_SPACESHIP = pygame.image.load(os.path.join('assets', 'pixel_ship_blue_small.png')).convert_alpha()
-GREEN_SPACESHIP = pygame.image.load(os.path.join('assets', 'pixel_ship_green_small.png')).convert_alpha()
-RED_SPACESHIP = pygame.image.load(os.path.join('assets', 'pixel_ship_green_small.png')).convert_alpha()
-# Player ship
-YELLOW_SPACESHIP = pygame.image.load(os.path.join('assets', 'pixel_ship_yellow.png')).convert_alpha()
+def images():
+    """
+    Gets every image the game uses, loading them the first time they are asked for, from the asset
+    bundle if one has been built (python atlas.py build). Open the screen first for the sprites to
+    be converted to its pixel format
+    :return: dictionary of image constant name, e.g. 'BLUE_LASER', -> pygame Surface
+    """
+    global _images
+    if _images is None:
+        loaded = load_images((WIDTH, HEIGHT))
+        _images = {name: loaded[file] for name, file in IMAGE_FILES.items()}
+    return _images
 
-# Upgrade Images
-HEALTH = pygame.image.load(os.path.join('assets', 'health.png')).convert_alpha()
-FLAME_THROWER = pygame.image.load(os.path.join('assets', 'flame_thrower.png')).convert_alpha()
 
-# Hazard Images
-FREEZE_HAZARD = pygame.image.load(os.path.join('assets', 'snowflake.png')).convert_alpha()
-BULLET_STORM = pygame.image.load(os.path.join('assets', 'bullet_storm.png')).convert_alpha()
+def __getattr__(name):
+    """
+    Looks up SCREEN and the image constants (main.BLUE_LASER, ...) on first use
+    """
+    if name == 'SCREEN':
+        return get_screen()
+    if name in IMAGE_FILES:
+        return images()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class Ship:
@@ -40,36 +89,65 @@ class Ship:
     Abstract class that represents a ship in the game (player or enemy) and includes a several
     methods: draw, get_width, get_height, cool_down, shoot, move_lasers, and set_flame_thrower
     """
+    __slots__ = ('x', 'y', 'health', 'ship_img', 'laser_img', 'lasers', 'cool_down_count', 'flame_thrower',
+                 'laser_engine', 'laser_owner')
+
     # cool down period of a half a second
     COOL_DOWN = 30
 
     def __init__(self, x, y, health=100):
         """
         Initializes ship with specified x & y-coordinates and health. Initializes ship image
-        to None, laser image to None, an empty list for lasers, a cool down period to 0, and
-        flame_thrower to False
+        to None, laser image to None, an empty EntityList for lasers, a cool down period to 0, and
+        flame_thrower to False. Lasers go into the list unless a LaserEngine is attached
         :param x: integer representing x-coordiante
         :param y: integer representing y-coordinate
         :param health: integer representing ship health
         """
+        self.lasers = EntityList()
+        Ship.reset(self, x, y, health)
+
+    def reset(self, x, y, health=100):
+        """
+        Puts the ship back in the state __init__ leaves a new one in, emptying its laser list in
+        place rather than allocating a new one
+        :param x: integer representing x-coordiante
+        :param y: integer representing y-coordinate
+        :param health: integer representing ship health
+        :return: None
+        """
         self.x = x
         self.y = y
         self.health = health
         self.ship_img = None
         self.laser_img = None
-        self.lasers = []
+        self.lasers.clear()
         self.cool_down_count = 0
         self.flame_thrower = False
+        self.laser_engine = None
+        self.laser_owner = 0
 
     def draw(self, screen):
         """
-        Draws ships to screen, draws lasers to screen
+        Draws ships to screen, draws lasers to screen, skipping any that are off screen
         :param screen: display screen to draw onto
         :return: None
         """
-        screen.blit(self.ship_img, (self.x, self.y))
+        screen.blits(cull(self.sprites(), *screen.get_size()), doreturn=False)
+
+    def sprites(self, position=None):
+        """
+        Gets the ship and its lasers as sprites for a batched blit
+        :param position: function from an object to the (x, y) to draw it at, or None to draw
+        everything where it is
+        :return: list of (image, (x, y)) pairs, ship first
+        """
+        if position is not None:
+            return [(self.ship_img, position(self))] + [(laser.image, position(laser)) for laser in self.lasers]
+        sprites = [(self.ship_img, (self.x, self.y))]
         for laser in self.lasers:
-            laser.draw(screen)
+            sprites.append((laser.image, (laser.x, laser.y)))
+        return sprites
 
     def get_width(self):
         """
@@ -102,14 +180,26 @@ class Ship:
         :return: None
         """
         if self.cool_down_count == 0:
-            laser = Laser(self.x, self.y, self.laser_img)
-            self.lasers.append(laser)
+            self.fire_laser(self.x, self.y)
             # If flame thrower is equipped, allow for continuous lasers
             if self.flame_thrower:
                 self.cool_down_count = 0
             else:
                 self.cool_down_count = 1
 
+    def fire_laser(self, x, y):
+        """
+        Creates a laser at the given position, either as a Laser in the ship's list or as a row
+        in the attached LaserEngine
+        :param x: integer representing x-coordinate
+        :param y: integer representing y-coordinate
+        :return: None
+        """
+        if self.laser_engine is None:
+            self.lasers.append(LASER_POOL.acquire(x, y, self.laser_img))
+        else:
+            self.laser_engine.spawn(x, y, self.laser_owner, self.laser_img)
+
     def set_flame_thrower(self, boolean):
         """
         Allows flame_thrower upgrade to be enacted by setting the flame_thrower attribute
@@ -124,44 +214,60 @@ class Ship:
         else:
             self.flame_thrower = False
 
-    def move_lasers(self, velocity, object):
+    def move_lasers(self, velocity, object, partner=None):
         """
         Moves enemy lasers downwards a the specified velocity
         :param velocity: Integer representing how fast laser should travel downwards
         :param object: Used to check if enemy laser has a collision with the player's ship
-        :return: None
+        :param partner: second player's ship in co-op, checked the same way, or None
+        :return: list of (x, y) positions of the lasers that hit
         """
         # Call cool down to see if new laser can be shot
         self.cool_down()
+        hits = []
         # Move all enemy lasers, delete them if they're off screen, reduce player health if collision occurs
         for laser in self.lasers:
             laser.move(velocity)
             if laser.is_off_screen(HEIGHT):
-                self.lasers.remove(laser)
-            elif laser.collision(object):
-                object.health -= 10
-                self.lasers.remove(laser)
+                self.lasers.kill(laser)
+                continue
+            if laser.collision(object):
+                target = object
+            elif partner is not None and laser.collision(partner):
+                target = partner
+            else:
+                continue
+            target.health -= 10
+            self.lasers.kill(laser)
+            hits.append(opaque_centre(laser.x, laser.y, laser.asset))
+        # Drop dead lasers in one pass and recycle them
+        LASER_POOL.release_all(self.lasers.compact())
+        return hits
 
 
 class Player(Ship):
     """
     Represents player's ship which includes methods to draw, move lasers, and a health bar
     """
+    __slots__ = ('max_health', 'asset', 'mask')
 
     def __init__(self, x, y, health=100):
         """
         Initializes ship with specified x & y-coordinates and health. Initializes ship image
         to YELLOW_SPACESHIP, laser image to YELLOW_LASER, max health to specified parameter
-        or default of 100 if no parameter passed in, and mask for collision purposes
+        or default of 100 if no parameter passed in, and shared mask for collision purposes
         :param x: integer representing x-coordiante
         :param y: integer representing y-coordinate
         :param health: integer representing ship health
         """
         super().__init__(x, y, health)
-        self.ship_img = YELLOW_SPACESHIP
-        self.laser_img = YELLOW_LASER
+        image = images()
+        self.ship_img = image['YELLOW_SPACESHIP']
+        self.laser_img = image['YELLOW_LASER']
         self.max_health = health
-        self.mask = pygame.mask.from_surface(self.ship_img)  # Create mask for collision
+        # Shared mask and bounding rectangle for collision
+        self.asset = ASSETS.get(self.ship_img)
+        self.mask = self.asset.mask
 
     def draw(self, screen):
         """
@@ -172,26 +278,39 @@ class Player(Ship):
         super().draw(screen)
         self.health_bar(screen)
 
-    def move_lasers(self, velocity, objects):
+    def move_lasers(self, velocity, objects, broadphase=None):
         """
         Move player lasers
         :param velocity: integer that determines how fast lasers move across the screen
-        :param objects: objects to remove once they are hit by a laser
-        :return: None
+        :param objects: EntityList of objects to kill once they are hit by a laser
+        :param broadphase: SpatialHash already holding objects, kept up to date as objects are
+        removed; a temporary one is built if none is passed in
+        :return: list of objects destroyed by lasers
         """
         # Call cool down to see if new laser can be shot
         self.cool_down()
-        # Move all enemy lasers, delete them if they're off screen, reduce player health if collision occurs
+        destroyed = []
+        if not self.lasers:
+            return destroyed
+        if broadphase is None:
+            broadphase = SpatialHash()
+            broadphase.rebuild(objects)
+        # Move all player lasers, delete them if they're off screen, destroy any object a laser hits.
+        # Only objects whose bounding rectangle overlaps the laser's are given to the mask test
         for laser in self.lasers:
             laser.move(velocity)
             if laser.is_off_screen(HEIGHT):
-                self.lasers.remove(laser)
-            else:
-                for object in objects:
-                    if laser.collision(object):
-                        objects.remove(object)
-                        if laser in self.lasers:
-                            self.lasers.remove(laser)
+                self.lasers.kill(laser)
+                continue
+            for object in broadphase.candidates(laser):
+                if laser.collision(object):
+                    objects.kill(object)
+                    broadphase.remove(object)
+                    destroyed.append(object)
+                    self.lasers.kill(laser)
+        # Drop dead lasers in one pass and recycle them
+        LASER_POOL.release_all(self.lasers.compact())
+        return destroyed
 
     def health_bar(self, screen):
         """
@@ -199,38 +318,68 @@ class Player(Ship):
         :param screen: display screen to draw health bar onto
         :return None
         """
-        pygame.draw.rect(screen, (255, 0, 0),
-                         (self.x, self.y + self.ship_img.get_height() + 10, self.ship_img.get_width(), 10))
-        pygame.draw.rect(screen, (0, 255, 0), (
-            self.x, self.y + self.ship_img.get_height() + 10,
-            self.ship_img.get_width() * (self.health / self.max_health),
-            10))
+        for color, rect in self.health_bar_fills():
+            pygame.draw.rect(screen, color, rect)
+
+    def health_bar_fills(self, position=None):
+        """
+        Gets the rectangles making up the health bar
+        :param position: function from the player to the (x, y) it is drawn at, or None
+        :return: list of (color, (x, y, width, height)) pairs, red background first
+        """
+        x, y = (self.x, self.y) if position is None else position(self)
+        return [((255, 0, 0), (x, y + self.ship_img.get_height() + 10, self.ship_img.get_width(), 10)),
+                ((0, 255, 0), (x, y + self.ship_img.get_height() + 10,
+                               max(0, self.ship_img.get_width() * (self.health / self.max_health)), 10))]
 
 
 class Enemy(Ship):
     """
     Represents player's ship which includes methods to move enemy and shoot
     """
+    __slots__ = ('asset', 'mask')
 
     def __init__(self, x, y, color, health=100):
         """
         Initializes enemy ship with specified x & y-coordinates and health. Initializes ship image
         based on ship color and laser image based on ship color, health to specified parameter or
-        default of 100 if no parameter passed in, and mask for collision purposes
+        default of 100 if no parameter passed in, and shared mask for collision purposes
         :param x: integer representing x-coordiante
         :param y: integer representing y-coordinate
         :param color:
         :param health: integer representing ship health
         """
+        super().__init__(x, y, health)
+        self.set_color(color)
+
+    def reset(self, x, y, color, health=100):
+        """
+        Puts a pooled enemy back in the state __init__ leaves a new one in
+        :param x: integer representing x-coordiante
+        :param y: integer representing y-coordinate
+        :param color: string color of the ship, 'red', 'blue', or 'green'
+        :param health: integer representing ship health
+        :return: None
+        """
+        super().reset(x, y, health)
+        self.set_color(color)
+
+    def set_color(self, color):
+        """
+        Sets the ship and laser images, and the shared mask, of a color of enemy
+        :param color: string color of the ship, 'red', 'blue', or 'green'
+        :return: None
+        """
         # Create hash table to determine which color enemy ship to use
+        image = images()
         color_table = {
-            'blue': (BLUE_SPACESHIP, BLUE_LASER),
-            'green': (GREEN_SPACESHIP, GREEN_LASER),
-            'red': (RED_SPACESHIP, RED_LASER)
+            'blue': (image['BLUE_SPACESHIP'], image['BLUE_LASER']),
+            'green': (image['GREEN_SPACESHIP'], image['GREEN_LASER']),
+            'red': (image['RED_SPACESHIP'], image['RED_LASER'])
         }
-        super().__init__(x, y, health)
         self.ship_img, self.laser_img = color_table[color]
-        self.mask = pygame.mask.from_surface(self.ship_img)
+        self.asset = ASSETS.get(self.ship_img)
+        self.mask = self.asset.mask
 
     def move_enemy(self, velocity):
         """
@@ -242,8 +391,7 @@ class Enemy(Ship):
 
     def shoot(self):
         if self.cool_down_count == 0:
-            laser = Laser(self.x - 20, self.y, self.laser_img)
-            self.lasers.append(laser)
+            self.fire_laser(self.x - 20, self.y)
             # self.cool_down_count = 0  #This will make the lasers be able to continuously shoot
             self.cool_down_count = 1
 
@@ -253,19 +401,31 @@ class Laser:
     Represent laser to be shot from ship (player or enemy) with methods of draw, move,
     is_off_screen, and collision
     """
+    __slots__ = ('x', 'y', 'image', 'asset', 'mask')
 
     def __init__(self, x, y, image):
         """
         Initializes laser with specified x & y-coordinates and initializes ship image
-        to specified image, and mask for collision purposes
+        to specified image, and shared mask for collision purposes
         :param x: integer representing x-coordiante
         :param y: integer representing y-coordinate
         :param image: laser image
         """
+        self.reset(x, y, image)
+
+    def reset(self, x, y, image):
+        """
+        Puts a pooled laser back in the state __init__ leaves a new one in
+        :param x: integer representing x-coordiante
+        :param y: integer representing y-coordinate
+        :param image: laser image
+        :return: None
+        """
         self.x = x
         self.y = y
         self.image = image
-        self.mask = pygame.mask.from_surface((self.image))
+        self.asset = ASSETS.get(self.image)
+        self.mask = self.asset.mask
 
     def draw(self, screen):
         """
@@ -303,15 +463,27 @@ class Upgrades:
     """
      Class for upgrades that can occur in game
     """
+    __slots__ = ('x', 'y', 'type', 'image', 'asset', 'mask')
 
     def __init__(self, x, y, type):
-        hazard_image = {'health': HEALTH, 'flame_thrower': FLAME_THROWER}
+        self.reset(x, y, type)
+
+    def reset(self, x, y, type):
+        """
+        Puts a pooled upgrade back in the state __init__ leaves a new one in
+        :param x: integer representing x-coordiante
+        :param y: integer representing y-coordinate
+        :param type: string type of upgrade, 'health' or 'flame_thrower'
+        :return: None
+        """
+        image = images()
+        hazard_image = {'health': image['HEALTH'], 'flame_thrower': image['FLAME_THROWER']}
         self.x = x
         self.y = y
         self.type = type
         self.image = hazard_image[type]
-        self.mask = pygame.mask.from_surface(self.image)
-        self.upgrade_counter = 0
+        self.asset = ASSETS.get(self.image)
+        self.mask = self.asset.mask
 
     def draw(self, screen):
         screen.blit(self.image, (self.x, self.y))
@@ -323,12 +495,6 @@ class Upgrades:
         """
         self.y += velocity
 
-    def update_upgrade_counter(self):
-        self.upgrade_counter += 1
-
-    def get_upgrade_counter(self):
-        return self.upgrade_counter
-
     def get_upgrade_type(self):
         return self.type
 
@@ -345,15 +511,27 @@ class Hazards:
     """
     Class for hazards that can occur in game
     """
+    __slots__ = ('x', 'y', 'type', 'image', 'asset', 'mask')
 
     def __init__(self, x, y, type):
-        hazard_image = {'freeze': FREEZE_HAZARD, 'bullet_storm': BULLET_STORM}
+        self.reset(x, y, type)
+
+    def reset(self, x, y, type):
+        """
+        Puts a pooled hazard back in the state __init__ leaves a new one in
+        :param x: integer representing x-coordiante
+        :param y: integer representing y-coordinate
+        :param type: string type of hazard, 'freeze' or 'bullet_storm'
+        :return: None
+        """
+        image = images()
+        hazard_image = {'freeze': image['FREEZE_HAZARD'], 'bullet_storm': image['BULLET_STORM']}
         self.x = x
         self.y = y
         self.type = type
         self.image = hazard_image[type]
-        self.mask = pygame.mask.from_surface(self.image)
-        self.hazard_counter = 0
+        self.asset = ASSETS.get(self.image)
+        self.mask = self.asset.mask
 
     def draw(self, screen):
         screen.blit(self.image, (self.x, self.y))
@@ -365,12 +543,6 @@ class Hazards:
         """
         self.y += velocity
 
-    def update_hazard_counter(self):
-        self.hazard_counter += 1
-
-    def get_hazard_counter(self):
-        return self.hazard_counter
-
     def get_hazard_type(self):
         return self.type
 
@@ -383,293 +555,854 @@ class Hazards:
         return self.y > height
 
 
-def collide(object1, object2):
-    offset_x = object2.x - object1.x
-    offset_y = object2.y - object1.y
-    return object1.mask.overlap(object2.mask, (offset_x, offset_y)) != None
-
-
-# Game loop
-def main(player_velocity=None):
+def opaque_centre(x, y, asset):
     """
-    Runs game loop including displaying to screen, checking for events, allowing movement
-    of player, enemies, and lasers, checking for collisions
-    :return:
+    Finds the centre of the opaque pixels of an image drawn at a position
+    :param x: x-coordinate the image is drawn at
+    :param y: y-coordinate the image is drawn at
+    :param asset: Asset of the image
+    :return: (x, y) tuple
+    """
+    left, top, width, height = asset.bounds
+    return x + left + width / 2, y + top + height / 2
+
+
+# Pools that recycle entities instead of allocating new ones
+LASER_POOL = Pool(Laser)
+ENEMY_POOL = Pool(Enemy)
+UPGRADE_POOL = Pool(Upgrades)
+HAZARD_POOL = Pool(Hazards)
+
+
+# Frames per second the game logic is tuned for; every speed and timer is expressed per frame
+FPS = 60
+
+# Effect of each hazard, and how many frames each timed effect lasts
+HAZARD_EFFECTS = {'freeze': 'frozen', 'bullet_storm': 'bullet_storm_activated'}
+EFFECT_DURATIONS = {'flame_thrower': 5 * FPS, 'frozen': 3 * FPS, 'bullet_storm_activated': 4 * FPS}
+# Frames the game over message shows for before going back to the menu
+GAME_OVER_FRAMES = 3 * FPS
+
+# Most particles alive at once when the game is played in a window
+PARTICLE_BUDGET = 4096
+# Particle bursts as (particles, color, fastest speed in pixels per frame, longest life in frames)
+EXPLOSION = (40, (255, 170, 60), 3.0, 40)
+HIT = (10, (255, 80, 80), 2.0, 20)
+
+# Speeds in pixels per frame every Game starts with
+PLAYER_VELOCITY = 8
+ENEMY_VELOCITY = 1
+LASER_VELOCITY = 4
+UPGRADE_VELOCITY = 2
+HAZARD_VELOCITY = 1
+# Enemies in the first wave, and how many more each wave after it brings
+WAVE_AMOUNT = 5
+WAVE_INCREMENT = 5
+# Each enemy fires with a 1 in ENEMY_FIRE_ODDS chance per frame, ~once every 3 seconds, or a 1 in
+# STORM_FIRE_ODDS chance during bullet storm
+ENEMY_FIRE_ODDS = 3 * FPS
+STORM_FIRE_ODDS = 3
+
+
+class InputState:
+    """
+    Synthetic stand-in for pygame.key.get_pressed() so the game can be driven without a
+    keyboard or a window. Indexing with a pygame key constant returns True if that key is held
     """
-    running = True
-    FPS = 60
-    game_font = pygame.font.SysFont('comicsans', 30)
-    game_over_font = pygame.font.SysFont('comicsans', 80)
-
-    # Create player ship
-    player = Player(275, 490)
-
-    # Set velocities for player, enemies, and lasers
-    player_velocity = 8
-
-    # Set level and lives
-    level = 0
-    lives = 3
-
-    # Set enemies, wave length and enemy velocity
-    enemies = []
-    wave_amount = 5
-    enemy_velocity = 1
 
-    # Set laser velocity
-    laser_velocity = 4
+    def __init__(self, pressed=()):
+        """
+        Initializes input state with the set of keys that are held down
+        :param pressed: iterable of pygame key constants (e.g. pygame.K_LEFT)
+        """
+        self.pressed = frozenset(pressed)
 
-    clock = pygame.time.Clock()
+    def __getitem__(self, key):
+        return key in self.pressed
 
-    # Define lost variable
-    game_over = False
-    game_over_count = 0
 
-    # Create array for upgrades, hash table for upgrade effects, initialize upgrade speed, and upgrade types
-    upgrades = []
-    upgrade_types = ['health', 'flame_thrower']
-    upgrade_effects = {'health': False, 'flame_thrower': False}
-    upgrade_velocity = 2
+# Input state with no keys held down
+NO_INPUT = InputState()
 
-    # Create array for hazards, hash table for hazard effects, initialize hazard speed, and hazards types
-    hazards = []
-    hazard_types = ['freeze', 'bullet_storm']
-    hazard_effects = {'frozen': False, 'bullet_storm_activated': False}
-    hazard_velocity = 1
 
-    # Initialize new level to True
-    new_level = True
+class Game:
+    """
+    Simulation core of the game: holds the player, enemies, upgrades, hazards, level and lives,
+    and advances all of them by one frame at a time with step. Nothing here draws to the screen
+    or waits on a clock, so it can be stepped as fast as the CPU allows
+    """
 
-    def redisplay_window():
+    def __init__(self, vectorized_lasers=False, seed=None, particle_budget=0, players=1):
         """
-        Displays background, player ship, enemies, and lasers on screen
-        :return:
+        Initializes a new game at level 0 with 3 lives and the default velocities
+        :param vectorized_lasers: boolean; if True every laser lives in a NumPy LaserEngine
+        instead of per ship lists of Laser objects
+        :param seed: integer seed of the game's random number streams, or None for a random one;
+        two games with the same seed and the same input play out identically
+        :param particle_budget: integer most particles alive at once in a NumPy ParticleSystem
+        showing explosions and hits, or 0 for no particles; without NumPy the game warns and runs
+        with none
+        :param players: integer 1, or 2 for co-op, where both ships share the lives, the level,
+        and the upgrade and hazard effects
         """
-        # Display background
-        SCREEN.blit(BACKGROUND, (0, 0))
-        # Display text
-        level_text = game_font.render(f'Level: {level}', 1, (255, 255, 255))
-        lives_text = game_font.render(f'Lives: {lives}', 1, (255, 255, 255))
-        SCREEN.blit(lives_text, (10, 10))
-        SCREEN.blit(level_text, (WIDTH - level_text.get_width() - 10, 10))
-
-        # Draw upgrades to screen
-        for upgrade in upgrades:
-            if upgrade.get_upgrade_type() == 'health':
-                if not upgrade_effects['health']:
-                    upgrade.draw(SCREEN)
-            if upgrade.get_upgrade_type() == 'flame_thrower':
-                if not upgrade_effects['flame_thrower']:
-                    upgrade.draw(SCREEN)
-
-        # Draw hazards to screen
-        for hazard in hazards:
-            if hazard.get_hazard_type() == 'freeze':
-                if not hazard_effects['frozen']:
-                    hazard.draw(SCREEN)
-            if hazard.get_hazard_type() == 'bullet_storm':
-                if not hazard_effects['bullet_storm_activated']:
-                    hazard.draw(SCREEN)
-
-        # Draw enemies to screen
-        for enemy in enemies:
-            enemy.draw(SCREEN)
-
-        # Draw ships to screen
-        player.draw(SCREEN)
-
-        # Display Game Over text
-        if game_over:
-            game_over_text = game_over_font.render('GAME OVER', 1, (255, 255, 255))
-            SCREEN.blit(game_over_text,
-                        (WIDTH / 2 - game_over_text.get_width() / 2, HEIGHT / 2 - game_over_text.get_height() / 2))
-
-        pygame.display.update()
-
-    while running:
-        # Set frames per second
-        clock.tick(FPS)
+        self.running = True
+
+        # Separate random streams for spawning and for enemy fire, both derived from one seed
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed
+        self.spawn_rng = random.Random(f'{seed}/spawn')
+        self.fire_rng = random.Random(f'{seed}/fire')
+        self.frame = 0
+
+        # Create player ship, and in co-op a second one beside it; player is always the first
+        self.player = Player(275, 490)
+        self.players = [self.player]
+        if players == 2:
+            self.players.append(Player(425, 490))
+
+        # Set velocities for player, enemies, and lasers
+        self.player_velocity = PLAYER_VELOCITY
+
+        # Set level and lives
+        self.level = 0
+        self.lives = 3
+
+        # Set enemies, wave length and enemy velocity. The enemy grid is the broadphase for every
+        # collision against an enemy and is kept in step with the enemies list
+        self.enemies = EntityList()
+        self.enemy_grid = SpatialHash()
+        self.wave_amount = WAVE_AMOUNT
+        self.wave_increment = WAVE_INCREMENT
+        self.enemy_velocity = ENEMY_VELOCITY
+
+        # Each enemy fires with a 1 in enemy_fire_odds chance per frame, ~once every 3 seconds, or
+        # a 1 in storm_fire_odds chance during bullet storm. Rather than rolling every frame, each
+        # enemy's next shot is drawn ahead of time and kept on the fire schedule
+        self.enemy_fire_odds = ENEMY_FIRE_ODDS
+        self.storm_fire_odds = STORM_FIRE_ODDS
+        self.fire_schedule = FireSchedule(self.fire_rng)
+
+        # Set laser velocity
+        self.laser_velocity = LASER_VELOCITY
+
+        # Define lost variable
+        self.game_over = False
+        self.game_over_count = 0
+
+        # Create array for upgrades, hash table for upgrade effects, initialize upgrade speed, and upgrade types
+        self.upgrades = EntityList()
+        self.upgrade_types = ['health', 'flame_thrower']
+        self.upgrade_effects = {'health': False, 'flame_thrower': False}
+        self.upgrade_velocity = UPGRADE_VELOCITY
+
+        # Create array for hazards, hash table for hazard effects, initialize hazard speed, and hazards types
+        self.hazards = EntityList()
+        self.hazard_types = ['freeze', 'bullet_storm']
+        self.hazard_effects = {'frozen': False, 'bullet_storm_activated': False}
+        self.hazard_velocity = HAZARD_VELOCITY
+
+        # Timed effects run on a scheduler whose callbacks switch the effect flags on and off
+        self.effects = EffectScheduler()
+        self.effects.register('flame_thrower', lambda: self.set_flame_thrower(True),
+                              lambda: self.set_flame_thrower(False))
+        self.effects.register('frozen', lambda: self.hazard_effects.__setitem__('frozen', True),
+                              lambda: self.hazard_effects.__setitem__('frozen', False))
+        self.effects.register('bullet_storm_activated', lambda: self.set_bullet_storm(True),
+                              lambda: self.set_bullet_storm(False))
+
+        # Initialize new level to True
+        self.new_level = True
+
+        # Spawned enemies, upgrades, and hazards still too far above the screen to be in play
+        self.spawn_queue = SpawnQueue()
+
+        # Swapped for a FrameProfiler to time each phase of every frame
+        self.profiler = NULL_PROFILER
+
+        self.laser_engine = None
+        if vectorized_lasers:
+            from laser_engine import LaserEngine, PLAYER_OWNER
+            self.laser_engine = LaserEngine(HEIGHT, self.laser_velocity)
+            for player in self.players:
+                player.laser_engine = self.laser_engine
+                player.laser_owner = PLAYER_OWNER
+
+        # Explosions and hits are only drawn, so they never change how the game plays out
+        self.particles = None
+        if particle_budget:
+            try:
+                from particles import ParticleSystem
+            except ImportError:
+                warnings.warn('NumPy is not installed, so explosions and hits show no particles', RuntimeWarning,
+                              stacklevel=2)
+            else:
+                self.particles = ParticleSystem(particle_budget, seed=seed)
 
-        # Draw to screen
-        redisplay_window()
+    def step(self, keys, partner_keys=NO_INPUT):
+        """
+        Advances the game by a single frame
+        :param keys: pressed key state, either from pygame.key.get_pressed() or an InputState
+        :param partner_keys: pressed key state of the second player in co-op
+        :return: None
+        """
+        self.frame += 1
+        players = self.players
 
         # Reset health if player loses life
-        if player.health < 0 and not game_over:
-            lives -= 1
-            if lives > 0:
-                player.health = 100
+        for player in players:
+            if player.health < 0 and not self.game_over:
+                self.lives -= 1
+                if self.lives > 0:
+                    player.health = 100
         # Check if player has lost the game
-        if lives <= 0:
-            game_over = True
-            game_over_count += 1
-
-        # If player has lost, pause screen with game over message before going back to menu
-        if game_over:
-            player.health = -1
-            if game_over_count > FPS * 3:
-                running = False
-            else:
-                continue  # Don't let enemies or player move
-
+        if self.lives <= 0:
+            self.game_over = True
+            self.game_over_count += 1
+
+        # If player has lost, pause with game over message before going back to menu
+        if self.game_over:
+            for player in players:
+                player.health = -1
+            if self.game_over_count > GAME_OVER_FRAMES:
+                self.running = False
+            return  # Don't let enemies or player move
+
+        profiler = self.profiler
+        with profiler.phase('spawn'):
+            self.spawn_level()
+        with profiler.phase('input'):
+            self.move_player(keys)
+            if len(players) > 1:
+                self.move_player(partner_keys, players[1])
+        with profiler.phase('player_lasers'):
+            # With a laser engine the ships' lists stay empty and this only counts down the cool down
+            for player in players:
+                for enemy in player.move_lasers(-self.laser_velocity, self.enemies, self.enemy_grid):
+                    self.burst(enemy, EXPLOSION)
+            if self.laser_engine is not None:
+                self.move_engine_lasers()
+        with profiler.phase('enemies'):
+            self.move_enemies()
+        with profiler.phase('upgrades'):
+            self.move_upgrades()
+        with profiler.phase('hazards'):
+            self.move_hazards()
+        with profiler.phase('effects'):
+            self.effects.advance()
+        with profiler.phase('compact'):
+            self.compact()
+        if self.particles is not None:
+            with profiler.phase('particles'):
+                self.particles.update()
+
+    def spawn_level(self):
+        """
+        Starts the next level once every enemy is destroyed, spawning a bigger wave along with
+        a new set of upgrades and hazards. Everything spawned waits in the spawn queue until it
+        nears the top of the screen
+        :return: None
+        """
+        rng = self.spawn_rng
+        queue = self.spawn_queue
         # If we have destroyed every enemy in level, go to next level
-        if len(enemies) == 0:
-            new_level = True
-            level += 1
-            wave_amount += 5
+        if len(self.enemies) == 0 and not queue.pending('enemy'):
+            self.new_level = True
+            self.level += 1
+            self.wave_amount += self.wave_increment
             # Spawn random color enemies
-            for i in range(wave_amount):
-                i = Enemy(random.randrange(25, WIDTH - 50), random.randrange(-1500, -100),
-                          random.choice(['red', 'blue', 'green']))
-                i.draw(SCREEN)
-                enemies.append(i)
-
-        # Initialize upgrades
-        if new_level:
-            type_counter = 0
-            for i in range(len(upgrade_types)):
-                i = Upgrades(random.randrange(25, WIDTH - 50), random.randrange(-1800, -900),
-                             upgrade_types[type_counter])
-                i.draw(SCREEN)
-                upgrades.append(i)
-                type_counter += 1
+            for i in range(self.wave_amount):
+                enemy = ENEMY_POOL.acquire(rng.randrange(25, WIDTH - 50), rng.randrange(-1500, -100),
+                                           rng.choice(['red', 'blue', 'green']))
+                queue.push('enemy', enemy, self.frame, self.enemy_velocity, enemy.get_height())
+
+        if self.new_level:
+            # Initialize upgrades
+            for upgrade_type in self.upgrade_types:
+                upgrade = UPGRADE_POOL.acquire(rng.randrange(25, WIDTH - 50), rng.randrange(-1800, -900),
+                                               upgrade_type)
+                queue.push('upgrade', upgrade, self.frame, self.upgrade_velocity, upgrade.image.get_height())
 
             # Initialize hazards
-            type_counter = 0
-            for i in range(len(hazard_types)):
-                i = Hazards(random.randrange(25, WIDTH - 50), random.randrange(-1000, -100), hazard_types[type_counter])
-                i.draw(SCREEN)
-                hazards.append(i)
-                type_counter += 1
-        new_level = False
+            for hazard_type in self.hazard_types:
+                hazard = HAZARD_POOL.acquire(rng.randrange(25, WIDTH - 50), rng.randrange(-1000, -100), hazard_type)
+                queue.push('hazard', hazard, self.frame, self.hazard_velocity, hazard.image.get_height())
+        self.new_level = False
+
+        # Bring in everything that has reached the top of the screen
+        for kind, entity in queue.pop_due(self.frame):
+            if kind == 'enemy':
+                self.add_enemy(entity)
+            elif kind == 'upgrade':
+                self.upgrades.append(entity)
+            else:
+                self.hazards.append(entity)
 
-        # Check for game events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit()
-        # Determine which keys are being pressed
-        keys = pygame.key.get_pressed()
-        # Allow player to move any direction as long as ship does not go off screen
+    def add_enemy(self, enemy):
+        """
+        Adds an enemy to the game, the enemy grid, and the laser engine if there is one
+        :param enemy: Enemy to add
+        :return: None
+        """
+        if self.laser_engine is not None:
+            enemy.laser_engine = self.laser_engine
+            enemy.laser_owner = self.laser_engine.new_owner()
+        self.enemies.append(enemy)
+        self.enemy_grid.insert(enemy)
+        # It may fire from this frame on
+        self.fire_schedule.schedule(enemy, self.frame - 1, self.fire_odds())
+
+    def kill_enemy(self, enemy):
+        """
+        Kills an enemy along with its lasers. It stays in the enemies list, skipped by iteration,
+        until the end of the frame
+        :param enemy: Enemy to kill
+        :return: None
+        """
+        self.enemies.kill(enemy)
+        self.enemy_grid.remove(enemy)
+        if self.laser_engine is not None:
+            self.laser_engine.remove_owners([enemy.laser_owner])
+
+    def entities(self):
+        """
+        Iterates over every live object with a position: the players, enemies, their lasers,
+        upgrades, and hazards. Lasers held by the laser engine are not objects and not included
+        :return: generator of objects with x and y
+        """
+        for player in self.players:
+            yield player
+            yield from player.lasers
+        for enemy in self.enemies:
+            yield enemy
+            yield from enemy.lasers
+        yield from self.upgrades
+        yield from self.hazards
+
+    def compact(self):
+        """
+        Drops every enemy, upgrade, and hazard killed this frame in one pass per list and hands
+        them back to their pools
+        :return: None
+        """
+        for enemy in self.enemies.compact():
+            self.fire_schedule.remove(enemy)
+            LASER_POOL.release_all(enemy.lasers.drain())
+            ENEMY_POOL.release(enemy)
+        UPGRADE_POOL.release_all(self.upgrades.compact())
+        HAZARD_POOL.release_all(self.hazards.compact())
+
+    def move_engine_lasers(self):
+        """
+        Moves every laser in the laser engine at once, destroying enemies hit by player lasers
+        and damaging the player for every enemy laser that hits
+        :return: None
+        """
+        engine = self.laser_engine
+        engine.move()
+
+        # Player lasers against enemies; one laser can destroy several enemies
+        hits, destroyed = engine.player_hits(self.enemies)
+        if hits:
+            engine.remove(hits)
+            engine.remove_owners([enemy.laser_owner for enemy in destroyed])
+            for enemy in destroyed:
+                self.enemies.kill(enemy)
+                self.enemy_grid.remove(enemy)
+                self.burst(enemy, EXPLOSION)
+
+        # Enemy lasers against the players
+        for player in self.players:
+            hits = engine.hits_on(player)
+            if hits:
+                player.health -= 10 * len(hits)
+                if self.particles is not None:
+                    for i in hits:
+                        asset = engine.assets[engine.image_id.item(i)]
+                        self.burst_at(*opaque_centre(engine.x.item(i), engine.y.item(i), asset), HIT)
+                engine.remove(hits)
+
+    def move_player(self, keys, player=None):
+        """
+        Moves and fires the player's ship according to the pressed keys
+        :param keys: pressed key state, either from pygame.key.get_pressed() or an InputState
+        :param player: Player to move, or None for the first
+        :return: None
+        """
+        if player is None:
+            player = self.player
+        player_velocity = self.player_velocity
+        frozen = self.hazard_effects['frozen']
+        # Allow player to move any direction as long as ship does not go off screen, unless the
+        # frozen hazard has been enabled
         if keys[pygame.K_LEFT] and (player.x - player_velocity > 0 - (player.get_width() / 2) - 4):
-            player.x -= player_velocity
-            # Check for frozen hazard and disallow movement if this hazard has been enabled
-            if hazard_effects['frozen']:
-                player.x += player_velocity
-        if keys[pygame.K_RIGHT] and (player.x + player_velocity < WIDTH - (player.get_width() / 2)):
-            player.x += player_velocity
-            if hazard_effects['frozen']:
+            if not frozen:
                 player.x -= player_velocity
+        if keys[pygame.K_RIGHT] and (player.x + player_velocity < WIDTH - (player.get_width() / 2)):
+            if not frozen:
+                player.x += player_velocity
         if keys[pygame.K_UP] and (player.y - player_velocity > 0):
-            player.y -= player_velocity
-            if hazard_effects['frozen']:
-                player.y += player_velocity
-        if keys[pygame.K_DOWN] and (player.y + player_velocity < HEIGHT - player.get_height() - 20):
-            player.y += player_velocity
-            if hazard_effects['frozen']:
+            if not frozen:
                 player.y -= player_velocity
+        if keys[pygame.K_DOWN] and (player.y + player_velocity < HEIGHT - player.get_height() - 20):
+            if not frozen:
+                player.y += player_velocity
         # Shoot Laser
         if keys[pygame.K_SPACE]:
             player.shoot()
-        player.move_lasers(-laser_velocity, enemies)
-
-        # Create, move, and destroy enemies
-        for enemy in enemies[:]:
-            enemy.move_enemy(enemy_velocity)
-            enemy.move_lasers(laser_velocity, player)
-            # If bullet_storm hazard is activated, have enemies shoot extremely fast
-            if hazard_effects['bullet_storm_activated']:
-                if random.randrange(0, 3) == 1:
-                    enemy.shoot()
-            # If bullet_storm is not activated, have enemies shoot ~once every 3 seconds
-            # if not hazard_effects['bullet_storm_activated']:
-            else:
-                if random.randrange(0, 3 * FPS) == 1:
-                    enemy.shoot()
-
-            # Collision between player and enemy
-            if collide(player, enemy):
-                player.health -= 10
-                enemies.remove(enemy)
-            # Check if enemy is off screen only if it hasn't collided with player
-            elif enemy.y + enemy.get_height() >= HEIGHT:
-                lives -= 1
-                player.health = 100
-                enemies.remove(enemy)
-
-        # Move and enact upgrades
+
+    def fire_odds(self):
+        """
+        Gets the current odds of an enemy firing on a frame
+        :return: integer; each enemy fires with a 1 in this chance per frame
+        """
+        if self.hazard_effects['bullet_storm_activated']:
+            return self.storm_fire_odds
+        return self.enemy_fire_odds
+
+    def set_bullet_storm(self, on):
+        """
+        Turns bullet storm on or off, drawing every enemy's next shot again at the new fire odds
+        :param on: boolean
+        :return: None
+        """
+        self.hazard_effects['bullet_storm_activated'] = on
+        self.fire_schedule.redraw(self.frame, self.fire_odds())
+
+    def move_enemies(self):
+        """
+        Moves enemies and their lasers, lets them fire, and handles enemies hitting a player
+        or slipping past the bottom of the screen
+        :return: None
+        """
+        players = self.players
+        partner = players[1] if len(players) > 1 else None
+        enemies = self.enemies
+        enemy_grid = self.enemy_grid
+        for enemy in enemies:
+            enemy.move_enemy(self.enemy_velocity)
+            enemy_grid.update(enemy)
+            for x, y in enemy.move_lasers(self.laser_velocity, self.player, partner):
+                self.burst_at(x, y, HIT)
+
+        # Fire from the enemies whose shot is due, and draw when each fires next
+        fire_schedule = self.fire_schedule
+        odds = self.fire_odds()
+        for enemy in fire_schedule.pop_due(self.frame):
+            if enemies.is_alive(enemy):
+                enemy.shoot()
+                fire_schedule.schedule(enemy, self.frame, odds)
+
+        # Collision between player and enemy, only testing enemies near the player
+        for player in players:
+            for enemy in enemy_grid.candidates(player):
+                if collide(player, enemy):
+                    player.health -= 10
+                    self.kill_enemy(enemy)
+                    self.burst(enemy, EXPLOSION)
+
+        # Check if enemy is off screen only if it hasn't collided with player
+        for enemy in enemies:
+            if enemy.y + enemy.get_height() >= HEIGHT:
+                self.lives -= 1
+                for player in players:
+                    player.health = 100
+                self.kill_enemy(enemy)
+
+    def move_upgrades(self):
+        """
+        Moves upgrades and applies the ones the player picks up. Every upgrade is used up when
+        picked up; the flame thrower runs on the effect scheduler
+        :return: None
+        """
+        upgrades = self.upgrades
+        # Move and enact upgrades, dropping the ones that have fallen past the bottom of the screen
         for upgrade in upgrades:
-            upgrade.move(upgrade_velocity)
-            if collide(player, upgrade):
+            upgrade.move(self.upgrade_velocity)
+            if upgrade.is_off_screen(HEIGHT):
+                upgrades.kill(upgrade)
+                continue
+            player = self.touching(upgrade)
+            if player is not None:
                 # if player hits heart, increase health by 50 (up to 100)
                 if upgrade.get_upgrade_type() == 'health':
                     if player.health < 50:
                         player.health += 50
                     else:
                         player.health = 100
-                    upgrades.remove(upgrade)
-                # if player hits flame thrower, set flame thrower effect to True
-                if upgrade.get_upgrade_type() == 'flame_thrower':
-                    upgrade_effects['flame_thrower'] = True
-                    player.set_flame_thrower(True)
+                # if player hits flame thrower, turn on flame thrower for 5 seconds
+                else:
+                    self.effects.start('flame_thrower', EFFECT_DURATIONS['flame_thrower'])
+                upgrades.kill(upgrade)
 
-        # Make sure relevant upgrades are only in affect for specified amount of time
-        for upgrade in upgrades:
-            if upgrade.get_upgrade_type() == 'flame_thrower':
-                if upgrade_effects['flame_thrower'] == True:
-                    upgrade.update_upgrade_counter()
-                # Allow player to use flamethrower for 5 seconds
-                if upgrade.get_upgrade_counter() >= 5 * FPS:
-                    player.set_flame_thrower(False)
-                    upgrade_effects['flame_thrower'] = False
-                    upgrades.remove(upgrade)
-
-        # Move and enact hazards
-        for hazard in hazards:
-            hazard.move(hazard_velocity)
-            if collide(player, hazard):
-                if hazard.get_hazard_type() == 'freeze':
-                    hazard_effects['frozen'] = True
-                if hazard.get_hazard_type() == 'bullet_storm':
-                    hazard_effects['bullet_storm_activated'] = True
-
-        # Make sure relevant hazards are only in affect for a specified amount of time
+    def move_hazards(self):
+        """
+        Moves hazards and applies the ones the player runs into. Every hazard is used up when hit
+        and its effect runs on the effect scheduler
+        :return: None
+        """
+        hazards = self.hazards
+        # Move and enact hazards: freeze the player for 3 seconds, or bring bullet storm from
+        # enemies for 4 seconds
         for hazard in hazards:
-            if hazard.get_hazard_type() == 'freeze':
-                if hazard_effects['frozen'] == True:
-                    hazard.update_hazard_counter()
-                # Freeze player for 3 seconds
-                if hazard.get_hazard_counter() >= 3 * FPS:
-                    hazard_effects['frozen'] = False
-                    hazards.remove(hazard)
-            elif hazard.get_hazard_type() == 'bullet_storm':
-                if hazard_effects['bullet_storm_activated'] == True:
-                    hazard.update_hazard_counter()
-                # Bring bullet storm from enemies for 4 seconds
-                if hazard.get_hazard_counter() >= 4 * FPS:
-                    hazard_effects['bullet_storm_activated'] = False
-                    hazards.remove(hazard)
-
-        # # remove hazard if it has gone off screen
-        # for hazard in hazards:
-        #     if hazard.is_off_screen(HEIGHT):
-        #         hazards.remove(hazard)
-
-
-def main_menu():
-    """
-    Shows main menu upon starting game and after losing
-    """
-    menu_font = pygame.font.SysFont('comicsans', 60)
-    running = True
-    while running:
-        SCREEN.blit(BACKGROUND, (0, 0))
-        menu_text = menu_font.render("Press Any Key to Begin", 1, (255, 255, 255))
-        SCREEN.blit(menu_text, (WIDTH / 2 - menu_text.get_width() / 2, HEIGHT / 2 - menu_text.get_height() / 2))
-        pygame.display.update()
-        for event in pygame.event.get():
+            hazard.move(self.hazard_velocity)
+            if hazard.is_off_screen(HEIGHT):
+                hazards.kill(hazard)
+            elif self.touching(hazard) is not None:
+                effect = HAZARD_EFFECTS[hazard.get_hazard_type()]
+                self.effects.start(effect, EFFECT_DURATIONS[effect])
+                hazards.kill(hazard)
+
+    def touching(self, obj):
+        """
+        Finds the player an object touches
+        :param obj: upgrade or hazard
+        :return: the first Player the object collides with, or None
+        """
+        for player in self.players:
+            if collide(player, obj):
+                return player
+        return None
+
+    def burst(self, ship, effect):
+        """
+        Bursts particles from the centre of a ship
+        :param ship: Player or Enemy
+        :param effect: (particles, color, speed, lifetime) tuple, e.g. EXPLOSION
+        :return: None
+        """
+        if self.particles is not None:
+            self.burst_at(*opaque_centre(ship.x, ship.y, ship.asset), effect)
+
+    def burst_at(self, x, y, effect):
+        """
+        Bursts particles from a point
+        :param x: x-coordinate of the centre of the burst
+        :param y: y-coordinate of the centre of the burst
+        :param effect: (particles, color, speed, lifetime) tuple, e.g. HIT
+        :return: None
+        """
+        if self.particles is not None:
+            count, color, speed, lifetime = effect
+            self.particles.burst(x, y, count, color, speed, lifetime)
+
+    def set_flame_thrower(self, on):
+        """
+        Turns the flame thrower upgrade on or off
+        :param on: boolean
+        :return: None
+        """
+        self.upgrade_effects['flame_thrower'] = on
+        for player in self.players:
+            player.set_flame_thrower(on)
+
+
+def run_headless(frames=None, input_source=None, game=None):
+    """
+    Steps a game with no display and no frame cap, as fast as the CPU allows
+    :param frames: maximum number of frames to simulate, or None to run until game over
+    :param input_source: function taking (frame, game) and returning the key state for that
+    frame; defaults to no keys held
+    :param game: Game to step, or None to start a new one
+    :return: the Game after the last simulated frame
+    """
+    if game is None:
+        game = Game()
+    while game.running and (frames is None or game.frame < frames):
+        game.profiler.begin_frame(game.frame)
+        if input_source is None:
+            keys = NO_INPUT
+        else:
+            keys = input_source(game.frame, game)
+        game.step(keys)
+        game.profiler.end_frame(game)
+    return game
+
+
+def add_game_layers(renderer, game, hud, position=None):
+    """
+    Queues everything in a game, HUD included, as layers of a renderer's next frame
+    :param renderer: Renderer to draw with
+    :param game: Game to draw
+    :param hud: Hud drawing the level, lives, and game over text
+    :param position: function from an object to the (x, y) to draw it at, or None to draw
+    everything where it is
+    :return: None
+    """
+    if position is None:
+        position = _position
+
+    # Display text, which is only rendered again when the level or lives change
+    renderer.add_layer(hud.sprites(game.level, game.lives))
+
+    # Draw upgrades and hazards to screen
+    renderer.add_layer([(upgrade.image, position(upgrade)) for upgrade in game.upgrades])
+    renderer.add_layer([(hazard.image, position(hazard)) for hazard in game.hazards])
+
+    # Draw enemies and their lasers to screen
+    enemy_sprites = []
+    for enemy in game.enemies:
+        enemy_sprites.extend(enemy.sprites(position))
+    renderer.add_layer(enemy_sprites)
+
+    # Draw lasers held by the laser engine, if the game uses one
+    if game.laser_engine is not None:
+        renderer.add_layer(game.laser_engine.sprites())
+
+    # Draw ships to screen
+    for player in game.players:
+        renderer.add_layer(player.sprites(position), player.health_bar_fills(position))
+
+    # Draw explosions and hits over the ships
+    if game.particles is not None:
+        renderer.add_layer(game.particles.sprites())
+
+    # Display Game Over text
+    if game.game_over:
+        renderer.add_layer(hud.game_over_sprites())
+
+
+def _position(obj):
+    return obj.x, obj.y
+
+
+# Window events after which the player is no longer looking at the game, and back again
+FOCUS_LOST_EVENTS = (pygame.WINDOWFOCUSLOST, pygame.WINDOWMINIMIZED)
+FOCUS_GAINED_EVENTS = (pygame.WINDOWFOCUSGAINED, pygame.WINDOWRESTORED)
+# Window events after which a static screen has to be drawn again
+EXPOSE_EVENTS = (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE)
+
+
+# Game loop
+def main(record_path=None, max_frame_skip=MAX_FRAME_SKIP, render_fps=FPS, particle_budget=PARTICLE_BUDGET,
+         meter=None):
+    """
+    Runs game loop including displaying to screen, checking for events, and stepping the
+    game simulation. The simulation runs at a fixed FPS ticks per second of real time, with the
+    keyboard state read once per rendered frame; when rendering falls behind, up to
+    max_frame_skip ticks run per rendered frame, and positions are drawn interpolated between
+    ticks. F3 turns on profiling and toggles its overlay, F4 exports the profile to
+    profile_trace.json and profile_frames.csv. P, or the window losing focus, pauses the game.
+    Paused and game over screens are drawn once and then wait on events instead of running frames
+    :param record_path: string path to save a recording of the game's input to, or None
+    :param max_frame_skip: integer most simulation ticks run for one rendered frame
+    :param render_fps: integer cap on rendered frames per second, or 0 for no cap
+    :param particle_budget: integer most particles alive at once, or 0 for no particles
+    :param meter: CpuMeter to charge the time in play, paused, and on the game over screen to, or
+    None
+    :return:
+    """
+    # Open the screen before the first Game loads the images, so they are converted for it
+    screen = get_screen()
+    game = Game(particle_budget=particle_budget)
+    recorder = InputRecorder(game.seed) if record_path else None
+    hud = Hud(WIDTH, HEIGHT)
+    overlay_font = get_font('consolas', 16)
+    clock = pygame.time.Clock()
+    renderer = Renderer(screen, images()['BACKGROUND'])
+    timestep = FixedTimestep(FPS, max_frame_skip)
+    interpolator = Interpolator()
+    position = interpolator.position
+    if meter is None:
+        meter = CpuMeter()
+
+    def quit_game():
+        """
+        Saves the recording, if there is one, and exits
+        :return: None
+        """
+        if recorder is not None:
+            recorder.save(record_path)
+        quit()
+
+    def redisplay_window(message=()):
+        """
+        Displays background, player ship, enemies, and lasers on screen, only redrawing and
+        updating the parts of the screen that changed
+        :param message: sprites drawn over everything else, e.g. the paused message
+        :return:
+        """
+        add_game_layers(renderer, game, hud, position)
+        renderer.add_layer(message)
+
+        # Display profiler overlay
+        if game.profiler.show_overlay:
+            renderer.add_layer(game.profiler.overlay_sprites(overlay_font))
+
+        renderer.present()
+        game.profiler.count('skipped_blits', renderer.skipped_blits)
+
+    def pause(until_focus):
+        """
+        Shows the paused message and blocks on events until P is pressed or, if the window losing
+        focus paused the game, until it gets focus back
+        :param until_focus: boolean; if True getting focus back resumes the game too
+        :return: None
+        """
+        meter.enter(PAUSED)
+        redisplay_window(hud.paused_sprites())
+        while True:
+            event = pygame.event.wait()
             if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN:
-                main()
+                quit_game()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                break
+            elif until_focus and event.type in FOCUS_GAINED_EVENTS:
+                break
+            elif event.type in EXPOSE_EVENTS:
+                renderer.invalidate()
+                redisplay_window(hud.paused_sprites())
+        # The time spent paused is not made up for
+        timestep.reset()
+        meter.enter(PLAYING)
+
+    def show_game_over():
+        """
+        Shows the game over message for what is left of GAME_OVER_FRAMES, blocking on events
+        rather than drawing frames, and ends the game
+        :return: None
+        """
+        meter.enter(GAME_OVER)
+        redisplay_window()
+        deadline = pygame.time.get_ticks() + 1000 * (GAME_OVER_FRAMES - game.game_over_count) // FPS
+        remaining = deadline - pygame.time.get_ticks()
+        while remaining > 0:
+            event = pygame.event.wait(remaining)
+            if event.type == pygame.QUIT:
+                quit_game()
+            elif event.type in EXPOSE_EVENTS:
+                renderer.invalidate()
+                redisplay_window()
+            remaining = deadline - pygame.time.get_ticks()
+        game.running = False
+
+    meter.enter(PLAYING)
+    while game.running:
+        # Cap the render rate; the simulation keeps its own pace through the timestep
+        clock.tick(render_fps)
 
+        profiler = game.profiler
+        profiler.begin_frame(game.frame)
+
+        # Draw to screen
+        with profiler.phase('render'):
+            redisplay_window()
+
+        # Check for game events
+        paused_by_focus = None
+        with profiler.phase('events'):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    quit_game()
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    if not profiler.enabled:
+                        game.profiler = FrameProfiler()
+                    game.profiler.show_overlay = not game.profiler.show_overlay
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F4 and profiler.enabled:
+                    profiler.export_chrome_trace('profile_trace.json')
+                    profiler.export_csv('profile_frames.csv')
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                    paused_by_focus = False
+                if event.type in FOCUS_LOST_EVENTS:
+                    paused_by_focus = True
+
+        # Determine which keys are being pressed and advance the game by the ticks that are due,
+        # remembering positions before the last one to interpolate from
+        keys = pygame.key.get_pressed()
+        ticks = timestep.advance()
+        for tick in range(ticks):
+            if tick == ticks - 1:
+                interpolator.capture(game.entities())
+            if recorder is not None:
+                recorder.record(keys)
+            game.step(keys)
+            if not game.running:
+                break
+        interpolator.alpha = timestep.alpha
+        profiler.end_frame(game)
+
+        # Static screens wait on events rather than running frames
+        if game.game_over:
+            show_game_over()
+        elif paused_by_focus is not None:
+            pause(paused_by_focus)
+
+    if recorder is not None:
+        recorder.save(record_path)
+
+
+def main_menu(record_path=None, max_frame_skip=MAX_FRAME_SKIP, render_fps=FPS, particle_budget=PARTICLE_BUDGET,
+              meter=None):
+    """
+    Shows main menu upon starting game and after losing. The menu is drawn once and then blocks
+    on events, so it uses no CPU while it waits
+    :param record_path: string path to save recordings of the games' input to, or None; every
+    game gets a file of its own, numbered from 1 before the extension (game-1.sirp, game-2.sirp, ...)
+    :param max_frame_skip: integer most simulation ticks run for one rendered frame
+    :param render_fps: integer cap on rendered frames per second, or 0 for no cap
+    :param particle_budget: integer most particles alive at once, or 0 for no particles
+    :param meter: CpuMeter to charge the time in each state to, or None
+    :return: CpuMeter with the time spent in each state
+    """
+    screen = get_screen()
+    background = images()['BACKGROUND']
+    menu_font = get_font('comicsans', 60)
+    if meter is None:
+        meter = CpuMeter()
+
+    def draw_menu():
+        screen.blit(background, (0, 0))
+        menu_text = TEXT_CACHE.render(menu_font, "Press Any Key to Begin")
+        screen.blit(menu_text, (WIDTH / 2 - menu_text.get_width() / 2, HEIGHT / 2 - menu_text.get_height() / 2))
+        pygame.display.update()
 
-main_menu()
+    draw_menu()
+    meter.enter(MENU)
+    games = 0
+    running = True
+    while running:
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            running = False
+        elif event.type == pygame.KEYDOWN:
+            games += 1
+            game_path = numbered_path(record_path, games) if record_path else None
+            main(game_path, max_frame_skip, render_fps, particle_budget, meter)
+            meter.enter(MENU)
+            draw_menu()
+        elif event.type in EXPOSE_EVENTS:
+            draw_menu()
+    return meter
+
+
+def run(argv=None):
+    """
+    Entry point of the game: parses the command line and shows the main menu
+    :param argv: list of command line arguments, or None for sys.argv[1:]
+    :return: None
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Space Invaders')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record the input of each game for replay.py to a file of its own, numbered '
+                             'from 1 before the extension of PATH (game.sirp gives game-1.sirp, game-2.sirp, ...)')
+    parser.add_argument('--max-frame-skip', type=int, default=MAX_FRAME_SKIP,
+                        help='most simulation ticks run per rendered frame when rendering falls behind')
+    parser.add_argument('--render-fps', type=int, default=FPS, help='cap on rendered frames per second, 0 for none')
+    parser.add_argument('--particle-budget', type=int, default=PARTICLE_BUDGET,
+                        help='most explosion and hit particles alive at once, 0 for none; none without NumPy')
+    parser.add_argument('--cpu-report', action='store_true',
+                        help='print the wall clock and CPU time spent in each state (menu, playing, paused, '
+                             'game over) on quitting')
+    args = parser.parse_args(argv)
+    meter = CpuMeter()
+    try:
+        main_menu(args.record, args.max_frame_skip, args.render_fps, args.particle_budget, meter)
+    finally:
+        if args.cpu_report:
+            print(meter.format_report())
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,179 @@
+"""
+Reports peak traced memory, allocations, pool reuse, and frame time jitter for every level of a
+headless game played by a simple bot that never runs out of lives. Allocations are counted three
+ways: entities the pools had to create, memory blocks allocated during the level that are still
+alive at its end (tracemalloc, by line), and generation 0 garbage collections, each of which runs
+once about 700 more container objects have been allocated than freed. The pooling comparison plays
+the same seeded game with the pools on and with them off, and compares frame times from a late
+level on
+
+Usage:
+    python memory_report.py [levels]
+    python memory_report.py --compare-pooling [--from-level 20] [--runs 2] [levels]
+"""
+import argparse
+import gc
+import os
+import statistics
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import main
+from headless import percentile, sweeping_fire
+
+SEED = 1234
+POOLS = (main.LASER_POOL, main.ENEMY_POOL, main.UPGRADE_POOL, main.HAZARD_POOL)
+
+
+def pool_totals():
+    """
+    Sums the stats of every entity pool
+    :return: dictionary of objects created and acquisitions served by reuse
+    """
+    return {'created': sum(pool.created for pool in POOLS), 'reused': sum(pool.reused for pool in POOLS)}
+
+
+def gen0_collections():
+    """
+    :return: integer generation 0 garbage collections so far
+    """
+    return gc.get_stats()[0]['collections']
+
+
+def report(levels=20, trace=True, seed=SEED, level_frame_times=None):
+    """
+    Plays until the given level is finished, measuring each level on its own
+    :param levels: integer number of levels to play
+    :param trace: boolean; if True memory is traced with tracemalloc, which slows every frame
+    :param seed: integer seed of the game
+    :param level_frame_times: dictionary to put each level's list of frame seconds in, or None
+    :return: list with a dictionary of measurements per level
+    """
+    game = main.Game(seed=seed)
+    # Never run out of lives so late levels are reached
+    game.lives = float('inf')
+    rows = []
+    if trace:
+        tracemalloc.start()
+    while game.level <= levels:
+        level = game.level
+        if trace:
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        pools_before = pool_totals()
+        collections_before = gen0_collections()
+        frame_times = []
+        while game.level == level:
+            start = time.perf_counter()
+            game.step(sweeping_fire(game.frame, game))
+            frame_times.append(time.perf_counter() - start)
+        pools_after = pool_totals()
+        if level_frame_times is not None:
+            level_frame_times[level] = frame_times
+        row = {
+            'level': level,
+            'frames': len(frame_times),
+            'mean_ms': statistics.fmean(frame_times) * 1000,
+            'p99_ms': percentile(frame_times, 0.99) * 1000,
+            'jitter_ms': statistics.pstdev(frame_times) * 1000,
+            'created': pools_after['created'] - pools_before['created'],
+            'reused': pools_after['reused'] - pools_before['reused'],
+            'gc0': gen0_collections() - collections_before,
+        }
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            stats = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+            row['peak_kib'] = peak / 1024
+            # Blocks allocated by each line during the level and still alive at its end
+            row['new_blocks'] = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+            row['live_blocks'] = sum(stat.count for stat in stats)
+        rows.append(row)
+    if trace:
+        tracemalloc.stop()
+    return rows[1:]  # level 0 only lasts the frame that spawns level 1
+
+
+def compare_pooling(levels=24, from_level=20, runs=2, seed=SEED):
+    """
+    Plays the same seeded game with the entity pools reusing objects and with every acquire
+    allocating, alternating between the two, and measures the frames from a level on
+    :param levels: integer number of levels to play
+    :param from_level: integer first level whose frames are measured
+    :param runs: integer games played each way; the best of them is kept
+    :param seed: integer seed of the games
+    :return: dictionary of 'pooled' and 'unpooled' -> dictionary of frames, mean_ms, p99_ms,
+    jitter_ms, allocated entities, and gen0 collections
+    """
+    results = {}
+    for run in range(runs):
+        for mode in ('pooled', 'unpooled'):
+            for pool in POOLS:
+                pool.reuse = mode == 'pooled'
+                pool.free.clear()
+            gc.collect()
+            level_frame_times = {}
+            rows = [row for row in report(levels, trace=False, seed=seed, level_frame_times=level_frame_times)
+                    if row['level'] >= from_level]
+            frame_times = [seconds for row in rows for seconds in level_frame_times[row['level']]]
+            result = {
+                'frames': len(frame_times),
+                'mean_ms': statistics.fmean(frame_times) * 1000,
+                'p99_ms': percentile(frame_times, 0.99) * 1000,
+                'jitter_ms': statistics.pstdev(frame_times) * 1000,
+                'created': sum(row['created'] for row in rows),
+                'gc0': sum(row['gc0'] for row in rows),
+            }
+            best = results.get(mode)
+            if best is None or result['p99_ms'] < best['p99_ms']:
+                results[mode] = result
+    for pool in POOLS:
+        pool.reuse = True
+    return results
+
+
+def print_report(rows):
+    """
+    Prints one line per level
+    :param rows: list of dictionaries from report
+    :return: None
+    """
+    for row in rows:
+        line = (f"level {row['level']:3d}  frames {row['frames']:6d}  mean {row['mean_ms']:7.3f} ms  "
+                f"p99 {row['p99_ms']:7.3f} ms  jitter {row['jitter_ms']:7.3f} ms  created {row['created']:6d}  "
+                f"reused {row['reused']:6d}  gc0 {row['gc0']:4d}")
+        if 'peak_kib' in row:
+            line += (f"  peak {row['peak_kib']:9.1f} KiB  new blocks {row['new_blocks']:7d}  "
+                     f"live blocks {row['live_blocks']:7d}")
+        print(line)
+
+
+def print_comparison(results, from_level):
+    """
+    Prints the pooled and unpooled measurements side by side
+    :param results: dictionary from compare_pooling
+    :param from_level: integer first level measured
+    :return: None
+    """
+    print(f'levels {from_level}+')
+    for mode, result in results.items():
+        print(f"{mode:<9} frames {result['frames']:6d}  mean {result['mean_ms']:7.3f} ms  "
+              f"p99 {result['p99_ms']:7.3f} ms  jitter {result['jitter_ms']:7.3f} ms  "
+              f"created {result['created']:6d}  gc0 {result['gc0']:5d}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('levels', type=int, nargs='?', default=None,
+                        help='levels to play (default 20, or from-level + 4 when comparing pooling)')
+    parser.add_argument('--compare-pooling', action='store_true',
+                        help='compare frame times with the entity pools on and off instead')
+    parser.add_argument('--from-level', type=int, default=20, help='first level the pooling comparison measures')
+    parser.add_argument('--runs', type=int, default=2, help='games played each way when comparing pooling')
+    args = parser.parse_args()
+    if args.compare_pooling:
+        levels = args.levels if args.levels is not None else args.from_level + 4
+        print_comparison(compare_pooling(levels, args.from_level, args.runs), args.from_level)
+    else:
+        print_report(report(args.levels if args.levels is not None else 20))
@@ -0,0 +1,257 @@
+"""
+Narrowphase collision shapes. Each image's opaque pixels are described once, as exactly as the
+mask but in the cheapest form they allow: a single tight rectangle (lasers), a few rectangles made
+of rows whose opaque pixels run in the same spans (blocky ships), or, for anything more ragged,
+only the mask. collide then picks the cheapest exact test for a pair of images: once their tight
+rectangles overlap, two single rectangles always hit, a handful of rectangle pairs are compared
+directly, and everything else goes to mask.overlap. Every test gives exactly the mask's answer
+
+Usage: python narrowphase.py [--placements N]    benchmarks every pair of sprites in assets/
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+import pygame
+
+from collision import COUNTER, bounding_rect, rects_overlap
+
+# Most rectangles a shape is built from before it is left to its mask
+MAX_RECTS = 4
+# Most rectangle pairs compared in Python before mask.overlap, which runs in C, is cheaper
+MAX_RECT_PAIRS = 4
+
+# Run of set bits in a row of mask_rows
+_RUN = re.compile(b'\xff+')
+
+
+def mask_rows(mask):
+    """
+    Gets the bits of a mask as one byte per bit, 255 where set and 0 elsewhere
+    :param mask: pygame Mask
+    :return: (bytes of every row one after the other, integer width of a row)
+    """
+    surface = mask.to_surface(setcolor=(255, 255, 255, 255), unsetcolor=(0, 0, 0, 0))
+    return pygame.image.tobytes(surface, 'RGBA')[3::4], mask.get_size()[0]
+
+
+def row_spans(rows, width, row, left, right):
+    """
+    Finds the runs of set bits in one row of a mask
+    :param rows: bytes of the mask from mask_rows
+    :param width: integer width of a row
+    :param row: integer row
+    :param left: integer first column to look at
+    :param right: integer column after the last one to look at
+    :return: tuple of (start, end) column pairs, end exclusive
+    """
+    start = row * width
+    return tuple((match.start() - start, match.end() - start)
+                 for match in _RUN.finditer(rows, start + left, start + right))
+
+
+class Shape:
+    """
+    Exact collision representation of one image: a tuple of (left, top, right, bottom) rectangles
+    covering its opaque pixels exactly, or None with only the mask to go on
+    """
+    __slots__ = ('mask', 'rects')
+
+    def __init__(self, mask, bounds, max_rects=MAX_RECTS):
+        """
+        Splits an image's opaque pixels into bands of rows with identical spans
+        :param mask: pygame Mask of the image
+        :param bounds: (x, y, width, height) of the opaque pixels
+        :param max_rects: integer most rectangles before giving up on rectangles
+        """
+        self.mask = mask
+        x, y, width, height = bounds
+        # Rows with the same spans as the row above extend the rectangles started there
+        rows, row_width = mask_rows(mask)
+        rects = []
+        band = []
+        previous = None
+        for row in range(y, y + height):
+            spans = row_spans(rows, row_width, row, x, x + width)
+            if spans != previous:
+                rects.extend(band)
+                band = [[left, row, right, row + 1] for left, right in spans]
+                previous = spans
+                if len(rects) + len(band) > max_rects:
+                    rects = None
+                    break
+            else:
+                for rect in band:
+                    rect[3] = row + 1
+        if rects is not None:
+            rects.extend(band)
+            rects = tuple(tuple(rect) for rect in rects)
+        self.rects = rects
+
+    @property
+    def kind(self):
+        """
+        :return: string 'rect' for one rectangle, 'spans' for several, 'mask' for a mask
+        """
+        if self.rects is None:
+            return 'mask'
+        return 'rect' if len(self.rects) == 1 else 'spans'
+
+
+def overlap(shape1, shape2, dx, dy):
+    """
+    Exact test between two images whose tight rectangles are already known to overlap
+    :param shape1: Shape of the first image
+    :param shape2: Shape of the second image
+    :param dx: integer x-coordinate of the second image minus that of the first
+    :param dy: integer y-coordinate of the second image minus that of the first
+    :return: boolean of True if they have an opaque pixel in common and False otherwise
+    """
+    rects1 = shape1.rects
+    rects2 = shape2.rects
+    if rects1 is None or rects2 is None or len(rects1) * len(rects2) > MAX_RECT_PAIRS:
+        return shape1.mask.overlap(shape2.mask, (dx, dy)) is not None
+    if len(rects1) == 1 and len(rects2) == 1:
+        # A single rectangle is the tight rectangle itself
+        return True
+    for left1, top1, right1, bottom1 in rects1:
+        for left2, top2, right2, bottom2 in rects2:
+            if left1 < right2 + dx and left2 + dx < right1 and top1 < bottom2 + dy and top2 + dy < bottom1:
+                return True
+    return False
+
+
+def collide(object1, object2):
+    """
+    Pixel perfect collision test between two objects, skipping the exact test when their tight
+    rectangles do not overlap
+    :param object1: ship, laser, upgrade, or hazard
+    :param object2: ship, laser, upgrade, or hazard
+    :return: boolean of True if the objects overlap and False otherwise
+    """
+    COUNTER.pair_tests += 1
+    asset1 = object1.asset
+    asset2 = object2.asset
+    x1 = object1.x
+    y1 = object1.y
+    x2 = object2.x
+    y2 = object2.y
+    left1, top1, width1, height1 = asset1.bounds
+    left2, top2, width2, height2 = asset2.bounds
+    left1 += x1
+    top1 += y1
+    left2 += x2
+    top2 += y2
+    if not (left1 < left2 + width2 and left2 < left1 + width1 and top1 < top2 + height2 and top2 < top1 + height1):
+        return False
+    COUNTER.mask_tests += 1
+    return overlap(asset1.shape, asset2.shape, x2 - x1, y2 - y1)
+
+
+def mask_collide(object1, object2):
+    """
+    The collision test collide replaced: tight rectangles, then always the masks. Kept as the
+    baseline of the benchmark
+    :param object1: ship, laser, upgrade, or hazard
+    :param object2: ship, laser, upgrade, or hazard
+    :return: boolean of True if the objects overlap and False otherwise
+    """
+    COUNTER.pair_tests += 1
+    if not rects_overlap(bounding_rect(object1), bounding_rect(object2)):
+        return False
+    COUNTER.mask_tests += 1
+    return object1.mask.overlap(object2.mask, (object2.x - object1.x, object2.y - object1.y)) != None
+
+
+class _Sprite:
+    """
+    Placed image standing in for a game object in the benchmark
+    """
+    __slots__ = ('x', 'y', 'asset', 'mask')
+
+    def __init__(self, x, y, asset):
+        self.x = x
+        self.y = y
+        self.asset = asset
+        self.mask = asset.mask
+
+
+def placements(asset1, asset2, count, rng):
+    """
+    Places two images so that their tight rectangles overlap, the only case that reaches the
+    exact test
+    :param asset1: Asset of the first image, placed at (0, 0)
+    :param asset2: Asset of the second image
+    :param count: integer number of placements
+    :param rng: random.Random to place with
+    :return: list of (x, y) positions of the second image
+    """
+    bx1, by1, bw1, bh1 = asset1.bounds
+    bx2, by2, bw2, bh2 = asset2.bounds
+    return [(rng.randrange(bx1 - bx2 - bw2 + 1, bx1 + bw1 - bx2),
+             rng.randrange(by1 - by2 - bh2 + 1, by1 + bh1 - by2)) for i in range(count)]
+
+
+def benchmark(assets, count=2000, seed=0):
+    """
+    Times mask_collide against collide for every ordered pair of images, over the same
+    placements, and checks that both give the same answers
+    :param assets: dictionary of name -> Asset
+    :param count: integer number of placements per pair
+    :param seed: integer seed of the placements
+    :return: list of (name1, name2, kind1, kind2, mask_collide pairs per second, collide pairs
+    per second)
+    """
+    rng = random.Random(seed)
+    clock = time.perf_counter
+    results = []
+    for name1, asset1 in assets.items():
+        for name2, asset2 in assets.items():
+            first = _Sprite(0, 0, asset1)
+            pairs = [(first, _Sprite(x, y, asset2)) for x, y in placements(asset1, asset2, count, rng)]
+
+            start = clock()
+            expected = [mask_collide(object1, object2) for object1, object2 in pairs]
+            mask_seconds = clock() - start
+
+            start = clock()
+            actual = [collide(object1, object2) for object1, object2 in pairs]
+            shape_seconds = clock() - start
+
+            if actual != expected:
+                raise AssertionError(f'collide disagrees with the mask test for {name1} and {name2}')
+            results.append((name1, name2, asset1.shape.kind, asset2.shape.kind,
+                            count / mask_seconds, count / shape_seconds))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--placements', type=int, default=2000, help='placements tested per pair')
+    args = parser.parse_args(sys.argv[1:])
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import atlas
+    from assets import Asset
+
+    pygame.display.set_mode((1, 1))
+    images = atlas.load_images((1, 1), path=None)
+    del images[atlas.BACKGROUND_NAME]
+    assets = {os.path.splitext(name)[0]: Asset(image) for name, image in images.items()}
+    results = benchmark(assets, args.placements)
+    totals = {}
+    print(f'{"pair":<50} {"shapes":<12} {"mask pairs/s":>13} {"collide pairs/s":>16} {"speedup":>8}')
+    for name1, name2, kind1, kind2, mask_rate, shape_rate in results:
+        print(f'{name1 + " x " + name2:<50} {kind1 + "/" + kind2:<12} {mask_rate:13,.0f} {shape_rate:16,.0f} '
+              f'{shape_rate / mask_rate:7.2f}x')
+        total = totals.setdefault(f'{kind1}/{kind2}', [0, 0.0, 0.0])
+        total[0] += 1
+        total[1] += 1 / mask_rate
+        total[2] += 1 / shape_rate
+    print()
+    for kinds, (pairs, mask_seconds, shape_seconds) in sorted(totals.items()):
+        print(f'{"all " + kinds + " pairs":<63} {pairs / mask_seconds:13,.0f} {pairs / shape_seconds:16,.0f} '
+              f'{mask_seconds / shape_seconds:7.2f}x')
@@ -0,0 +1,758 @@
+"""
+Two player network play over UDP, head-to-head or co-op. The server is authoritative: it runs
+every game with the rules main() plays by, at FPS ticks per second, from the key masks the clients
+send, and sends each client a snapshot of its view every tick, delta encoded against the last
+snapshot that client acknowledged (snapshot.py). Head-to-head gives each player a game of their
+own from the same seed, showing the other's ship, level, and lives; co-op puts both ships in one
+game. The server keeps the bandwidth of every client, the time each tick takes, and the round trip
+from sending a snapshot to its acknowledgement. The load test plays any number of sessions with
+scripted bots from one process, against a server it starts or one already running
+
+Usage:
+    python netplay.py server [--port N] [--report-every SECONDS] [--snapshot-every TICKS]
+    python netplay.py client [--host HOST] [--port N] [--mode versus|coop]
+    python netplay.py loadtest [--sessions N] [--seconds N] [--mode versus|coop] [--connect]
+                               [--snapshot-every TICKS]
+"""
+import argparse
+import collections
+import multiprocessing
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+import pygame
+
+import main
+import snapshot
+from headless import percentile, sweeping_fire
+from replay import key_mask, mask_keys
+
+DEFAULT_PORT = 5645
+MODES = ('versus', 'coop')
+
+# Message types, the first byte of every datagram
+JOIN = b'J'      # client: mode u8
+WELCOME = b'W'   # server: session u32, seat u8, mode u8, seed u32
+INPUT = b'I'     # client: key mask u8, last snapshot tick received u32
+SNAPSHOT = b'S'  # server: snapshot.encode
+END = b'E'       # server: the session is over
+LEAVE = b'L'     # client: leaving the session
+
+_WELCOME = struct.Struct('<IBBI')
+_INPUT = struct.Struct('<BI')
+
+# Snapshots kept per client to delta encode against, in ticks
+HISTORY = 64
+# Seconds without a datagram after which a client is dropped
+TIMEOUT = 5.0
+# Seconds between JOIN datagrams while waiting to be welcomed
+JOIN_RETRY = 0.5
+# Largest datagram read
+MAX_DATAGRAM = 65535
+
+# Images that can be sent, numbered by their place in this list
+IMAGE_NAMES = sorted(name for name in main.IMAGE_FILES if name != 'BACKGROUND')
+
+
+class Seat:
+    """
+    A client taking part in a session, as the server sees it
+    """
+
+    def __init__(self, address, session, index):
+        """
+        :param address: (host, port) the client sends from
+        :param session: Session the client is in
+        :param index: integer seat in the session, 0 or 1
+        """
+        self.address = address
+        self.session = session
+        self.index = index
+        self.keys = main.NO_INPUT
+        self.last_heard = time.perf_counter()
+        # Tick of the last snapshot the client acknowledged, and the snapshots it may acknowledge
+        # next as tick -> (State, seconds sent at)
+        self.acked = 0
+        self.history = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.snapshots = 0
+        self.full_snapshots = 0
+        self.round_trips = collections.deque(maxlen=1000)
+
+
+class Session:
+    """
+    Two seats and the games they play: one each head-to-head, one between them in co-op
+    """
+
+    def __init__(self, session_id, mode, seed):
+        """
+        :param session_id: integer id of the session
+        :param mode: string 'versus' or 'coop'
+        :param seed: integer seed of the games
+        """
+        self.id = session_id
+        self.mode = mode
+        self.seed = seed
+        self.seats = [None, None]
+        self.games = []
+        self.slot_tables = []
+
+    def start(self):
+        """
+        Starts the games once both seats are taken
+        :return: None
+        """
+        if self.mode == 'coop':
+            self.games = [main.Game(seed=self.seed, players=2)]
+        else:
+            self.games = [main.Game(seed=self.seed), main.Game(seed=self.seed)]
+        self.slot_tables = [snapshot.SlotTable() for game in self.games]
+
+    @property
+    def started(self):
+        return bool(self.games)
+
+    @property
+    def over(self):
+        return self.started and not any(game.running for game in self.games)
+
+    def step(self):
+        """
+        Advances the session's games by one tick with the keys each seat holds
+        :return: None
+        """
+        if self.mode == 'coop':
+            game = self.games[0]
+            if game.running:
+                game.step(self.seats[0].keys, self.seats[1].keys)
+        else:
+            for game, seat in zip(self.games, self.seats):
+                if game.running:
+                    game.step(seat.keys)
+
+    def views(self, image_ids):
+        """
+        Captures what each seat sees
+        :param image_ids: dictionary of image -> integer image id
+        :return: list of State, one per seat
+        """
+        captured = [capture(game, slot_table, image_ids) for game, slot_table in zip(self.games, self.slot_tables)]
+        if self.mode == 'coop':
+            game = self.games[0]
+            players = tuple((snapshot.quantize(player.x, player.y), player.health, game.lives, game.level)
+                            for player in game.players)
+        else:
+            players = tuple((snapshot.quantize(game.player.x, game.player.y), game.player.health, game.lives,
+                             game.level) for game in self.games)
+        views = [snapshot.State(flags, players, entities) for flags, entities in captured]
+        return views * 2 if len(views) == 1 else views
+
+
+def capture(game, slot_table, image_ids):
+    """
+    Captures the effect flags of a game and every entity in it but the players' ships
+    :param game: Game to capture
+    :param slot_table: SlotTable of the game
+    :param image_ids: dictionary of image -> integer image id
+    :return: (integer flags, dictionary of slot -> (image id, position))
+    """
+    objects = []
+    images = []
+    for player in game.players:
+        for laser in player.lasers:
+            objects.append(laser)
+            images.append(laser.image)
+    for enemy in game.enemies:
+        objects.append(enemy)
+        images.append(enemy.ship_img)
+        for laser in enemy.lasers:
+            objects.append(laser)
+            images.append(laser.image)
+    for obj in game.upgrades:
+        objects.append(obj)
+        images.append(obj.image)
+    for obj in game.hazards:
+        objects.append(obj)
+        images.append(obj.image)
+    quantize = snapshot.quantize
+    entities = {slot: (image_ids[image], quantize(obj.x, obj.y))
+                for slot, obj, image in zip(slot_table.assign(objects), objects, images)}
+
+    flags = 0
+    if game.game_over:
+        flags |= snapshot.GAME_OVER
+    if game.hazard_effects['frozen']:
+        flags |= snapshot.FROZEN
+    if game.hazard_effects['bullet_storm_activated']:
+        flags |= snapshot.BULLET_STORM
+    if game.upgrade_effects['flame_thrower']:
+        flags |= snapshot.FLAME_THROWER
+    return flags, entities
+
+
+class Server:
+    """
+    Authoritative server: pairs up clients into sessions, steps every session once a tick, and
+    sends every client its snapshot
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, snapshot_every=1):
+        """
+        Opens the server's socket
+        :param host: string address to listen on
+        :param port: integer UDP port to listen on
+        :param snapshot_every: integer ticks between snapshots; the games still step every tick
+        """
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+        self.snapshot_every = snapshot_every
+        images = main.images()
+        self.image_ids = {images[name]: image_id for image_id, name in enumerate(IMAGE_NAMES)}
+        self.rng = random.Random()
+        self.seats = {}
+        self.sessions = {}
+        # mode -> session waiting for its second seat
+        self.waiting = {}
+        self.next_session = 1
+        self.tick = 0
+        self.tick_times = collections.deque(maxlen=10000)
+        self.overruns = 0
+        self.started_at = time.perf_counter()
+        self.sessions_played = 0
+        # Totals of the clients that have left, so the metrics cover the whole run
+        self.departed = {'clients': 0, 'bytes_in': 0, 'bytes_out': 0, 'snapshots': 0, 'full_snapshots': 0}
+        self.inputs = {}
+
+    def send(self, seat, data):
+        """
+        Sends a datagram to a seat, counting its bytes
+        :return: None
+        """
+        seat.bytes_out += len(data)
+        try:
+            self.socket.sendto(data, seat.address)
+        except (BlockingIOError, ConnectionRefusedError):
+            pass
+
+    def receive(self):
+        """
+        Handles every datagram waiting on the socket
+        :return: None
+        """
+        while True:
+            try:
+                data, address = self.socket.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, ConnectionResetError):
+                return
+            if data:
+                self.handle(data, address)
+
+    def handle(self, data, address):
+        """
+        Handles one datagram from a client
+        :param data: bytes received
+        :param address: (host, port) of the client
+        :return: None
+        """
+        kind = data[:1]
+        seat = self.seats.get(address)
+        if seat is not None:
+            seat.bytes_in += len(data)
+            seat.last_heard = time.perf_counter()
+        if kind == INPUT and seat is not None and len(data) == 1 + _INPUT.size:
+            mask, ack = _INPUT.unpack_from(data, 1)
+            keys = self.inputs.get(mask)
+            if keys is None:
+                keys = self.inputs[mask] = main.InputState(mask_keys(mask))
+            seat.keys = keys
+            if ack > seat.acked and ack in seat.history:
+                seat.round_trips.append(time.perf_counter() - seat.history[ack][1])
+                seat.acked = ack
+                for tick in [tick for tick in seat.history if tick < ack]:
+                    del seat.history[tick]
+        elif kind == JOIN and len(data) == 2:
+            if seat is None:
+                if data[1] >= len(MODES):
+                    return
+                seat = self.join(address, MODES[data[1]])
+            session = seat.session
+            self.send(seat, WELCOME + _WELCOME.pack(session.id, seat.index, MODES.index(session.mode),
+                                                    session.seed))
+        elif kind == LEAVE and seat is not None:
+            self.end(seat.session)
+
+    def join(self, address, mode):
+        """
+        Seats a client in the session waiting for a partner in a mode, or in a new one
+        :param address: (host, port) of the client
+        :param mode: string 'versus' or 'coop'
+        :return: Seat
+        """
+        session = self.waiting.pop(mode, None)
+        if session is None:
+            session = Session(self.next_session, mode, self.rng.randrange(2 ** 32))
+            self.next_session += 1
+            self.sessions[session.id] = session
+            self.waiting[mode] = session
+            index = 0
+        else:
+            index = 1
+        seat = self.seats[address] = Seat(address, session, index)
+        session.seats[index] = seat
+        if index == 1:
+            session.start()
+        return seat
+
+    def end(self, session):
+        """
+        Ends a session, telling every seat still in it
+        :param session: Session to end
+        :return: None
+        """
+        if self.sessions.pop(session.id, None) is None:
+            return
+        if self.waiting.get(session.mode) is session:
+            del self.waiting[session.mode]
+        if session.started:
+            self.sessions_played += 1
+        departed = self.departed
+        for seat in session.seats:
+            if seat is not None:
+                self.send(seat, END)
+                del self.seats[seat.address]
+                departed['clients'] += 1
+                for name in ('bytes_in', 'bytes_out', 'snapshots', 'full_snapshots'):
+                    departed[name] += getattr(seat, name)
+
+    def step(self):
+        """
+        Runs one tick: handles what the clients sent, steps every session, and sends snapshots
+        :return: None
+        """
+        self.receive()
+        self.tick += 1
+        tick = self.tick
+        now = time.perf_counter()
+        for session in list(self.sessions.values()):
+            if any(seat is not None and now - seat.last_heard > TIMEOUT for seat in session.seats):
+                self.end(session)
+                continue
+            if not session.started:
+                continue
+            session.step()
+            if tick % self.snapshot_every == 0 or session.over:
+                self.send_snapshots(session, tick, now)
+            if session.over:
+                self.end(session)
+
+    def send_snapshots(self, session, tick, now):
+        """
+        Sends every seat of a session its view, delta encoded against the last one it acknowledged
+        :param session: Session to send
+        :param tick: integer current tick
+        :param now: float seconds the snapshots count as sent at
+        :return: None
+        """
+        # Seats sharing a game that acknowledged the same tick get the same bytes
+        encoded = {}
+        for seat, state in zip(session.seats, session.views(self.image_ids)):
+            baseline = seat.history.get(seat.acked)
+            baseline_tick = 0 if baseline is None else seat.acked
+            key = (id(state), baseline_tick)
+            data = encoded.get(key)
+            if data is None:
+                if baseline is None:
+                    data = encoded[key] = SNAPSHOT + snapshot.encode(tick, state)
+                else:
+                    data = encoded[key] = SNAPSHOT + snapshot.encode(tick, state, baseline_tick, baseline[0])
+            if baseline is None:
+                seat.full_snapshots += 1
+            seat.history[tick] = (state, now)
+            # Ticks go in in order, so the oldest is first
+            while len(seat.history) > HISTORY:
+                del seat.history[next(iter(seat.history))]
+            seat.snapshots += 1
+            self.send(seat, data)
+
+    def serve(self, stop=None, seconds=None, report_every=None):
+        """
+        Runs ticks at FPS per second of real time until stopped
+        :param stop: multiprocessing.Event that stops the server when set, or None
+        :param seconds: float seconds to run for, or None to run until stopped
+        :param report_every: float seconds between printing the metrics, or None for never
+        :return: None
+        """
+        clock = time.perf_counter
+        interval = 1 / main.FPS
+        next_tick = clock()
+        started = next_tick
+        next_report = None if report_every is None else started + report_every
+        while not (stop is not None and stop.is_set()) and (seconds is None or clock() - started < seconds):
+            start = clock()
+            self.step()
+            end = clock()
+            self.tick_times.append(end - start)
+            next_tick += interval
+            if next_tick > end:
+                time.sleep(next_tick - end)
+            else:
+                self.overruns += 1
+                # Too far behind to catch up; start counting again from now
+                if end - next_tick > 0.25:
+                    next_tick = end
+            if next_report is not None and clock() >= next_report:
+                print(format_metrics(self.metrics()), flush=True)
+                next_report += report_every
+
+    def metrics(self):
+        """
+        Gets the server's metrics so far
+        :return: dictionary of totals, and tick time and round trip milliseconds at the 50th and
+        99th percentiles
+        """
+        elapsed = time.perf_counter() - self.started_at
+        seats = list(self.seats.values())
+        totals = dict(self.departed)
+        totals['clients'] += len(seats)
+        for name in ('bytes_in', 'bytes_out', 'snapshots', 'full_snapshots'):
+            totals[name] += sum(getattr(seat, name) for seat in seats)
+        round_trips = [trip for seat in seats for trip in seat.round_trips]
+        tick_times = list(self.tick_times)
+        clients = max(totals['clients'], 1)
+        return {
+            'seconds': elapsed,
+            'ticks': self.tick,
+            'sessions': len(self.sessions),
+            'sessions_played': self.sessions_played,
+            'clients': len(seats),
+            'overruns': self.overruns,
+            'tick_p50_ms': 1000 * percentile(tick_times, 0.5) if tick_times else 0.0,
+            'tick_p99_ms': 1000 * percentile(tick_times, 0.99) if tick_times else 0.0,
+            'round_trip_p50_ms': 1000 * percentile(round_trips, 0.5) if round_trips else 0.0,
+            'round_trip_p99_ms': 1000 * percentile(round_trips, 0.99) if round_trips else 0.0,
+            'out_bytes_per_client_s': totals['bytes_out'] / clients / elapsed if elapsed else 0.0,
+            'in_bytes_per_client_s': totals['bytes_in'] / clients / elapsed if elapsed else 0.0,
+            'bytes_per_snapshot': totals['bytes_out'] / totals['snapshots'] if totals['snapshots'] else 0.0,
+            'snapshots': totals['snapshots'],
+            'full_snapshots': totals['full_snapshots'],
+        }
+
+
+def format_metrics(metrics):
+    """
+    Formats metrics from Server.metrics or loadtest on one line each
+    :param metrics: dictionary of name -> number
+    :return: string
+    """
+    return '\n'.join(f'{name:>24}: {value:,.2f}' if isinstance(value, float) else f'{name:>24}: {value:,}'
+                     for name, value in metrics.items())
+
+
+def _serve_process(host, port, snapshot_every, ready, stop, results):
+    """
+    Runs a server in a process of its own until stopped, then hands back its metrics
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    server = Server(host, port, snapshot_every)
+    ready.set()
+    server.serve(stop)
+    results.put(server.metrics())
+
+
+class Connection:
+    """
+    Client end of a session: joins, sends key masks, and decodes the snapshots it receives
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, mode='versus'):
+        """
+        Opens a socket and starts joining a session
+        :param host: string address of the server
+        :param port: integer UDP port of the server
+        :param mode: string 'versus' or 'coop'
+        """
+        self.address = (host, port)
+        self.mode = mode
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.session = None
+        self.seat = None
+        self.seed = None
+        self.ended = False
+        self.tick = 0
+        self.state = None
+        # tick -> State, for the snapshots that may be sent as baselines
+        self.states = {}
+        self.last_join = None
+        self.snapshots = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.undecodable = 0
+        self.join()
+
+    def send(self, data):
+        self.bytes_out += len(data)
+        try:
+            self.socket.sendto(data, self.address)
+        except (BlockingIOError, ConnectionRefusedError):
+            pass
+
+    def join(self):
+        """
+        Asks to join a session, again if the last request went unanswered
+        :return: None
+        """
+        self.send(JOIN + bytes([MODES.index(self.mode)]))
+        self.last_join = time.perf_counter()
+
+    def poll(self):
+        """
+        Handles every datagram waiting from the server, and asks to join again if still unseated
+        :return: None
+        """
+        while True:
+            try:
+                data = self.socket.recv(MAX_DATAGRAM)
+            except (BlockingIOError, ConnectionRefusedError, ConnectionResetError):
+                break
+            self.bytes_in += len(data)
+            kind = data[:1]
+            if kind == SNAPSHOT:
+                self.receive_snapshot(data[1:])
+            elif kind == WELCOME and len(data) == 1 + _WELCOME.size:
+                self.session, self.seat, mode, self.seed = _WELCOME.unpack_from(data, 1)
+            elif kind == END:
+                self.ended = True
+        if self.session is None and time.perf_counter() - self.last_join > JOIN_RETRY:
+            self.join()
+
+    def receive_snapshot(self, data):
+        """
+        Decodes a snapshot against its baseline and keeps it as the latest state if it is newer. A
+        datagram that does not decode, cut short, corrupted, or not from the server, is counted as
+        undecodable and dropped, keeping the last good state; the server keeps sending against
+        the last snapshot acknowledged
+        :param data: bytes from snapshot.encode
+        :return: None
+        """
+        try:
+            tick, baseline_tick = snapshot.peek(data)
+        except struct.error:
+            self.undecodable += 1
+            return
+        baseline = self.states.get(baseline_tick) if baseline_tick else snapshot.EMPTY
+        if tick <= self.tick or baseline is None:
+            # Late, or against a baseline dropped already; the next one will do
+            self.undecodable += baseline is None
+            return
+        try:
+            tick, state = snapshot.decode(data, baseline)
+        except ValueError:
+            self.undecodable += 1
+            return
+        self.snapshots += 1
+        self.tick = tick
+        self.state = state
+        self.states[tick] = state
+        # Nothing older than the baseline the server just used can be used again
+        for old in [old for old in self.states if old < baseline_tick or old <= tick - HISTORY]:
+            del self.states[old]
+
+    def send_input(self, mask):
+        """
+        Sends the keys held, acknowledging the latest snapshot
+        :param mask: integer key mask from replay.key_mask
+        :return: None
+        """
+        if self.session is not None and not self.ended:
+            self.send(INPUT + _INPUT.pack(mask, self.tick))
+
+    def leave(self):
+        """
+        Leaves the session
+        :return: None
+        """
+        if self.session is not None and not self.ended:
+            self.send(LEAVE)
+        self.socket.close()
+
+
+def loadtest(sessions=100, seconds=20.0, mode='versus', host='127.0.0.1', port=DEFAULT_PORT, start_server=True,
+             snapshot_every=1):
+    """
+    Plays sessions with scripted bots, two per session, each rejoining when its session ends, and
+    measures what they receive
+    :param sessions: integer sessions to keep playing
+    :param seconds: float seconds to play for
+    :param mode: string 'versus' or 'coop'
+    :param host: string address of the server
+    :param port: integer UDP port of the server
+    :param start_server: boolean; if True a server is started in a process of its own
+    :param snapshot_every: integer ticks between snapshots of the server started
+    :return: (dictionary of client metrics, dictionary of server metrics or None)
+    """
+    server = None
+    if start_server:
+        context = multiprocessing.get_context('spawn')
+        ready, stop, results = context.Event(), context.Event(), context.Queue()
+        server = context.Process(target=_serve_process, args=(host, port, snapshot_every, ready, stop, results))
+        server.start()
+        ready.wait()
+
+    bots = [Connection(host, port, mode) for i in range(2 * sessions)]
+    masks = [key_mask(sweeping_fire(frame, None)) for frame in range(240)]
+    clock = time.perf_counter
+    interval = 1 / main.FPS
+    started = clock()
+    next_tick = started
+    frame = 0
+    rejoined = 0
+    late_ticks = 0
+    try:
+        while clock() - started < seconds:
+            mask = masks[frame % len(masks)]
+            for i, bot in enumerate(bots):
+                bot.poll()
+                if bot.ended:
+                    bot.socket.close()
+                    totals = (bot.snapshots, bot.bytes_in, bot.bytes_out, bot.undecodable)
+                    bot = bots[i] = Connection(host, port, mode)
+                    bot.snapshots, bot.bytes_in, bot.bytes_out, bot.undecodable = totals
+                    rejoined += 1
+                bot.send_input(mask)
+            frame += 1
+            next_tick += interval
+            delay = next_tick - clock()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                late_ticks += 1
+        elapsed = clock() - started
+    finally:
+        for bot in bots:
+            bot.leave()
+        server_metrics = None
+        if server is not None:
+            stop.set()
+            server_metrics = results.get()
+            server.join()
+
+    clients = len(bots)
+    client_metrics = {
+        'sessions': sessions,
+        'clients': clients,
+        'seconds': elapsed,
+        'rejoined': rejoined,
+        'client_late_ticks': late_ticks,
+        'snapshots_per_client_s': sum(bot.snapshots for bot in bots) / clients / elapsed,
+        'in_bytes_per_client_s': sum(bot.bytes_in for bot in bots) / clients / elapsed,
+        'out_bytes_per_client_s': sum(bot.bytes_out for bot in bots) / clients / elapsed,
+        'undecodable': sum(bot.undecodable for bot in bots),
+    }
+    return client_metrics, server_metrics
+
+
+def play(host='127.0.0.1', port=DEFAULT_PORT, mode='versus'):
+    """
+    Plays a session in a window, drawing whatever the server last sent
+    :param host: string address of the server
+    :param port: integer UDP port of the server
+    :param mode: string 'versus' or 'coop'
+    :return: None
+    """
+    from hud import TEXT_CACHE, Hud, get_font
+    from renderer import Renderer
+
+    screen = main.get_screen()
+    images = main.images()
+    image_list = [images[name] for name in IMAGE_NAMES]
+    ship = images['YELLOW_SPACESHIP']
+    renderer = Renderer(screen, images['BACKGROUND'])
+    hud = Hud(main.WIDTH, main.HEIGHT)
+    font = get_font('comicsans', 30)
+    clock = pygame.time.Clock()
+    connection = Connection(host, port, mode)
+    try:
+        while not connection.ended:
+            clock.tick(main.FPS)
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+            connection.poll()
+            connection.send_input(key_mask(pygame.key.get_pressed()))
+
+            state = connection.state
+            if state is None:
+                renderer.add_layer([hud.centered(TEXT_CACHE.render(font, 'Waiting for another player'))])
+                renderer.present()
+                continue
+            packed, health, lives, level = state.players[connection.seat]
+            renderer.add_layer(hud.sprites(level, lives))
+            renderer.add_layer([(image_list[image_id], snapshot.position(packed))
+                                for image_id, packed in state.entities.values()])
+            fills = []
+            ships = []
+            for seat, (packed, health, lives, level) in enumerate(state.players):
+                x, y = snapshot.position(packed)
+                ships.append((ship, (x, y)))
+                width = ship.get_width()
+                top = y + ship.get_height() + 10
+                fills.append(((255, 0, 0), (x, top, width, 10)))
+                fills.append(((0, 255, 0), (x, top, max(0, width * health / 100), 10)))
+                if mode == 'versus' and seat != connection.seat:
+                    text = TEXT_CACHE.render(font, f'Opponent: level {level}, lives {lives}')
+                    renderer.add_layer([(text, (main.WIDTH / 2 - text.get_width() / 2, 10))])
+            renderer.add_layer(ships, fills)
+            if state.flags & snapshot.GAME_OVER:
+                renderer.add_layer(hud.game_over_sprites())
+            renderer.present()
+    finally:
+        connection.leave()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='address of the server, or to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='UDP port of the server')
+    commands = parser.add_subparsers(dest='command', required=True)
+    server_parser = commands.add_parser('server', help='run an authoritative server')
+    server_parser.add_argument('--report-every', type=float, default=10.0, help='seconds between metrics reports')
+    server_parser.add_argument('--snapshot-every', type=int, default=1, help='ticks between snapshots')
+    client_parser = commands.add_parser('client', help='play a session in a window')
+    client_parser.add_argument('--mode', choices=MODES, default='versus')
+    load_parser = commands.add_parser('loadtest', help='play many sessions with bots')
+    load_parser.add_argument('--sessions', type=int, default=100, help='sessions to keep playing')
+    load_parser.add_argument('--seconds', type=float, default=20.0, help='seconds to play for')
+    load_parser.add_argument('--mode', choices=MODES, default='versus')
+    load_parser.add_argument('--connect', action='store_true',
+                             help='use a server already running rather than starting one')
+    load_parser.add_argument('--snapshot-every', type=int, default=1, help='ticks between snapshots of the server started')
+    args = parser.parse_args(sys.argv[1:])
+
+    if args.command == 'server':
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        server = Server(args.host, args.port, args.snapshot_every)
+        print(f'Listening on {args.host}:{args.port}', flush=True)
+        try:
+            server.serve(report_every=args.report_every)
+        except KeyboardInterrupt:
+            print(format_metrics(server.metrics()))
+    elif args.command == 'client':
+        play(args.host, args.port, args.mode)
+    else:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        client_metrics, server_metrics = loadtest(args.sessions, args.seconds, args.mode, args.host, args.port,
+                                                  not args.connect, args.snapshot_every)
+        print('Clients')
+        print(format_metrics(client_metrics))
+        if server_metrics is not None:
+            print('Server')
+            print(format_metrics(server_metrics))
@@ -0,0 +1,199 @@
+"""
+Observations of a game for training pipelines, with no copying and no allocation per step. The
+observer renders the game onto a surface made over a NumPy array it owns
+(pygame.image.frombuffer), so the rendered frame is always available as a view of that array.
+The downsampled grayscale frame and the state vector are written into buffers the caller
+allocates once. Requires NumPy
+
+    observer = Observer()
+    gray, state = observer.new_grayscale(), observer.new_state()
+    pixels = observer.frame()               # (height, width, 3) uint8 RGB view, kept up to date
+    while ...:
+        game.step(keys)
+        observer.render(game)
+        observer.grayscale(gray)
+        observer.state(game, state)
+
+The display's own surface is not used because a surfarray view of it (pixels3d) locks it, and
+nothing can be drawn onto it again until every view is gone
+"""
+import numpy as np
+import pygame
+
+import main
+from hud import Hud
+from renderer import Renderer
+
+# Enemies and lasers of each side given room in the state vector; any past these are left out
+MAX_ENEMIES = 64
+MAX_LASERS = 64
+
+# Fields at the start of the state vector, followed by (x, y) pairs for MAX_ENEMIES enemies,
+# MAX_LASERS enemy lasers, and MAX_LASERS player lasers, zero past the ones there are
+STATE_FIELDS = ('player_x', 'player_y', 'player_health', 'enemies', 'enemy_lasers', 'player_lasers')
+
+# Integer luma weights out of 256 (ITU-R BT.601)
+LUMA = (77, 150, 29)
+
+
+class Observer:
+    """
+    Renders a game into its own pixel buffer and reads observations out of it
+    """
+
+    def __init__(self, size=(main.WIDTH, main.HEIGHT), downsample=4, max_enemies=MAX_ENEMIES,
+                 max_lasers=MAX_LASERS):
+        """
+        Initializes an observer with a black frame. Open the screen first (main.get_screen(), with
+        SDL_VIDEODRIVER=dummy to stay headless) so the frame matches its pixel format
+        :param size: (width, height) of the frame
+        :param downsample: integer factor the grayscale frame is smaller than the frame by
+        :param max_enemies: integer enemies given room in the state vector
+        :param max_lasers: integer lasers of each side given room in the state vector
+        """
+        width, height = size
+        self.downsample = downsample
+        self.max_enemies = max_enemies
+        self.max_lasers = max_lasers
+        self.pixels = np.zeros((height, width, 4), dtype=np.uint8)
+        # Lay the pixels out as the display does, so drawing converts nothing
+        display = pygame.display.get_surface()
+        if display is not None and display.get_masks()[0] == 0xff0000:
+            self.surface = pygame.image.frombuffer(self.pixels, size, 'BGRA')
+            self.rgb = self.pixels[..., 2::-1]
+        else:
+            self.surface = pygame.image.frombuffer(self.pixels, size, 'RGBA')
+            self.rgb = self.pixels[..., :3]
+        self.grayscale_shape = (-(-height // downsample), -(-width // downsample))
+        self.state_size = len(STATE_FIELDS) + 2 * (max_enemies + 2 * max_lasers)
+        # Scratch space for the weighted sum of the grayscale frame
+        self.luma = np.empty(self.grayscale_shape, dtype=np.uint16)
+        self.channel = np.empty(self.grayscale_shape, dtype=np.uint16)
+        self.renderer = None
+        self.hud = None
+
+    def new_grayscale(self):
+        """
+        Allocates a buffer for grayscale
+        :return: (height, width) uint8 array
+        """
+        return np.zeros(self.grayscale_shape, dtype=np.uint8)
+
+    def new_state(self):
+        """
+        Allocates a buffer for state
+        :return: float32 array of state_size values
+        """
+        return np.zeros(self.state_size, dtype=np.float32)
+
+    def render(self, game):
+        """
+        Draws the whole of a game into the frame, as the game loop draws it on screen
+        :param game: Game to draw
+        :return: None
+        """
+        if self.renderer is None:
+            self.renderer = Renderer(self.surface, main.images()['BACKGROUND'], update_display=False)
+            self.hud = Hud(*self.surface.get_size())
+        main.add_game_layers(self.renderer, game, self.hud)
+        self.renderer.present()
+
+    def frame(self):
+        """
+        Gets the rendered frame, with no copy. The view stays valid and shows every later render
+        :return: (height, width, 3) uint8 array in RGB order
+        """
+        return self.rgb
+
+    def grayscale(self, out):
+        """
+        Writes the frame downsampled, by taking every downsample-th pixel, and in grayscale
+        :param out: (height, width) uint8 array from new_grayscale
+        :return: out
+        """
+        if out.shape != self.grayscale_shape or out.dtype != np.uint8:
+            raise ValueError(f'grayscale needs a {self.grayscale_shape} uint8 array')
+        step = self.downsample
+        sampled = self.rgb[::step, ::step]
+        luma = self.luma
+        channel = self.channel
+        np.multiply(sampled[..., 0], LUMA[0], out=luma, dtype=np.uint16)
+        for index in (1, 2):
+            np.multiply(sampled[..., index], LUMA[index], out=channel, dtype=np.uint16)
+            np.add(luma, channel, out=luma)
+        np.right_shift(luma, 8, out=out, casting='unsafe')
+        return out
+
+    def state(self, game, out):
+        """
+        Writes the state vector: STATE_FIELDS, then the positions of enemies, enemy lasers, and
+        player lasers, each in a block of fixed size padded with zeros
+        :param game: Game to observe
+        :param out: float32 array from new_state
+        :return: out
+        """
+        if out.shape != (self.state_size,):
+            raise ValueError(f'state needs an array of {self.state_size} values')
+        player = game.player
+        enemies_start = len(STATE_FIELDS)
+        enemy_lasers_start = enemies_start + 2 * self.max_enemies
+        player_lasers_start = enemy_lasers_start + 2 * self.max_lasers
+        end = player_lasers_start + 2 * self.max_lasers
+
+        enemies = _write_positions(out, enemies_start, enemy_lasers_start, game.enemies)
+        if game.laser_engine is None:
+            enemy_lasers = _write_positions(out, enemy_lasers_start, player_lasers_start,
+                                            (laser for enemy in game.enemies for laser in enemy.lasers))
+            player_lasers = _write_positions(out, player_lasers_start, end, player.lasers)
+        else:
+            enemy_lasers, player_lasers = _write_engine_positions(out, game.laser_engine, enemy_lasers_start,
+                                                                  player_lasers_start, end)
+        out[0] = player.x
+        out[1] = player.y
+        out[2] = player.health
+        out[3] = enemies
+        out[4] = enemy_lasers
+        out[5] = player_lasers
+        return out
+
+
+def _write_positions(out, start, end, objects):
+    """
+    Writes (x, y) pairs of objects from start, up to end, zeroing the rest
+    :return: integer number of objects written
+    """
+    index = start
+    for obj in objects:
+        if index >= end:
+            break
+        out[index] = obj.x
+        out[index + 1] = obj.y
+        index += 2
+    out[index:end] = 0
+    return (index - start) // 2
+
+
+def _write_engine_positions(out, engine, enemy_start, player_start, end):
+    """
+    Writes (x, y) pairs of the lasers in a LaserEngine, enemy lasers from enemy_start and player
+    lasers from player_start, zeroing the rest of both blocks
+    :return: (integer enemy lasers written, integer player lasers written)
+    """
+    from laser_engine import PLAYER_OWNER
+
+    enemy_index = enemy_start
+    player_index = player_start
+    x, y, owner = engine.x, engine.y, engine.owner
+    for i in range(engine.count):
+        if owner.item(i) == PLAYER_OWNER:
+            if player_index < end:
+                out[player_index] = x.item(i)
+                out[player_index + 1] = y.item(i)
+                player_index += 2
+        elif enemy_index < player_start:
+            out[enemy_index] = x.item(i)
+            out[enemy_index + 1] = y.item(i)
+            enemy_index += 2
+    out[enemy_index:player_start] = 0
+    out[player_index:end] = 0
+    return (enemy_index - enemy_start) // 2, (player_index - player_start) // 2
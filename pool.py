@@ -0,0 +1,65 @@
+"""
+Object pools for entities that are created and destroyed constantly (lasers, enemies, upgrades,
+and hazards). Released objects are kept and reset in place instead of being allocated
+again, which keeps the garbage collector quiet during bullet storm and late waves
+"""
+
+
+class Pool:
+    """
+    Free list of released instances of one class. A pooled class must have a reset method taking
+    the same arguments as __init__, which puts a released object back in the state __init__ leaves
+    a new one in while reusing the containers it already holds
+    """
+
+    def __init__(self, cls, reuse=True):
+        """
+        Initializes an empty pool
+        :param cls: class of the pooled objects
+        :param reuse: boolean; if False released objects are dropped, so every acquire allocates
+        as if there were no pool, for measuring what the pool saves
+        """
+        self.cls = cls
+        self.reuse = reuse
+        self.free = []
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, *args):
+        """
+        Gets an object initialized with the given arguments, reusing a released one if possible
+        :param args: arguments to the class's __init__ and reset
+        :return: initialized object
+        """
+        if self.free:
+            object = self.free.pop()
+            object.reset(*args)
+            self.reused += 1
+            return object
+        self.created += 1
+        return self.cls(*args)
+
+    def release(self, object):
+        """
+        Hands an object back to the pool. It must no longer be referenced by the game
+        :param object: object previously acquired from this pool
+        :return: None
+        """
+        if self.reuse:
+            self.free.append(object)
+
+    def release_all(self, objects):
+        """
+        Hands several objects back to the pool
+        :param objects: iterable of objects previously acquired from this pool
+        :return: None
+        """
+        if self.reuse:
+            self.free.extend(objects)
+
+    def stats(self):
+        """
+        Reports how the pool has been used
+        :return: dictionary of objects created, acquisitions served by reuse, and free objects
+        """
+        return {'created': self.created, 'reused': self.reused, 'free': len(self.free)}
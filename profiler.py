@@ -0,0 +1,289 @@
+"""
+Per phase frame profiler. Times each phase of every frame (input, lasers, enemies, upgrades,
+hazards, rendering, ...), counts live entities and collision tests, shows a summary overlay on
+screen, and exports to Chrome trace event JSON (chrome://tracing, Perfetto) and CSV. Games hold
+NULL_PROFILER until profiling is turned on, which keeps the cost of the instrumentation to a
+no-op call per phase
+
+Usage: python profiler.py [frames] [trace.json] [frames.csv]
+"""
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from collision import COUNTER
+from renderer import display_format
+
+
+class _NullPhase:
+    """
+    Context manager that does nothing, shared by every phase while profiling is off
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class NullProfiler:
+    """
+    Profiler that records nothing, used while profiling is turned off
+    """
+    enabled = False
+    show_overlay = False
+
+    def begin_frame(self, frame):
+        pass
+
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def count(self, name, value):
+        pass
+
+    def end_frame(self, game=None):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class _PhaseTimer:
+    """
+    Context manager timing one phase of the current frame
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.profiler.clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record_phase(self.name, self.start, self.profiler.clock())
+        return False
+
+
+class FrameProfiler:
+    """
+    Records, for every frame, the start and end time of each phase along with entity and
+    collision test counts, keeping the most recent max_frames frames
+    """
+    enabled = True
+
+    def __init__(self, max_frames=36000, clock=time.perf_counter):
+        """
+        Initializes an empty profiler
+        :param max_frames: integer number of most recent frames kept
+        :param clock: function returning the current time in seconds
+        """
+        self.clock = clock
+        self.frames = deque(maxlen=max_frames)
+        self.current = None
+        self.origin = clock()
+        self.show_overlay = False
+        self.overlay = []
+        self.overlay_frame = None
+
+    def begin_frame(self, frame):
+        """
+        Starts recording a frame
+        :param frame: integer frame number
+        :return: None
+        """
+        self.current = {'frame': frame, 'start': self.clock(), 'end': None, 'phases': [], 'counts': {},
+                        'pair_tests': COUNTER.pair_tests, 'mask_tests': COUNTER.mask_tests}
+
+    def phase(self, name):
+        """
+        Times a phase of the current frame, to be used as a with statement
+        :param name: string name of the phase
+        :return: context manager
+        """
+        return _PhaseTimer(self, name)
+
+    def count(self, name, value):
+        """
+        Records a count for the current frame, e.g. blits skipped while rendering
+        :param name: string name of the count
+        :param value: number
+        :return: None
+        """
+        if self.current is not None:
+            self.current['counts'][name] = value
+
+    def record_phase(self, name, start, end):
+        """
+        Adds a timed phase to the current frame
+        :param name: string name of the phase
+        :param start: float start time in seconds
+        :param end: float end time in seconds
+        :return: None
+        """
+        if self.current is not None:
+            self.current['phases'].append((name, start, end))
+
+    def end_frame(self, game=None):
+        """
+        Finishes recording the current frame
+        :param game: Game whose entities are counted, or None to skip counting
+        :return: None
+        """
+        current = self.current
+        if current is None:
+            return
+        current['end'] = self.clock()
+        counts = current['counts']
+        counts['pair_tests'] = COUNTER.pair_tests - current.pop('pair_tests')
+        counts['mask_tests'] = COUNTER.mask_tests - current.pop('mask_tests')
+        if game is not None:
+            counts.update(count_entities(game))
+        self.frames.append(current)
+        self.current = None
+
+    def phase_names(self):
+        """
+        Gets the name of every phase recorded, in the order first seen
+        :return: list of strings
+        """
+        names = {}
+        for frame in self.frames:
+            for name, start, end in frame['phases']:
+                names.setdefault(name, None)
+        return list(names)
+
+    def summary(self, last=60):
+        """
+        Averages the most recent frames
+        :param last: integer number of frames to average over
+        :return: dictionary of average milliseconds per phase ('<phase>_ms') and in total
+        ('frame_ms'), and average of every count
+        """
+        frames = list(self.frames)[-last:]
+        if not frames:
+            return {}
+        totals = {'frame_ms': 0.0}
+        for frame in frames:
+            totals['frame_ms'] += (frame['end'] - frame['start']) * 1000
+            for name, start, end in frame['phases']:
+                totals[f'{name}_ms'] = totals.get(f'{name}_ms', 0.0) + (end - start) * 1000
+            for name, value in frame['counts'].items():
+                totals[name] = totals.get(name, 0) + value
+        return {name: value / len(frames) for name, value in totals.items()}
+
+    def overlay_sprites(self, font, every=15):
+        """
+        Gets the overlay as sprites for a batched blit, rendering it again only every few frames
+        so the overlay itself stays cheap
+        :param font: pygame Font to render the overlay with
+        :param every: integer number of frames between re-renders
+        :return: list of (image, (x, y)) pairs
+        """
+        if not self.frames:
+            return []
+        frame = self.frames[-1]['frame']
+        if self.overlay_frame is None or frame - self.overlay_frame >= every or frame < self.overlay_frame:
+            self.overlay_frame = frame
+            lines = [f'{name}: {value:.2f}' for name, value in self.summary().items()]
+            self.overlay = []
+            y = 40
+            for line in lines:
+                surface = display_format(font.render(line, 1, (255, 255, 0)))
+                self.overlay.append((surface, (10, y)))
+                y += surface.get_height()
+        return self.overlay
+
+    def chrome_trace(self):
+        """
+        Builds the recorded frames as Chrome trace events: one complete event per frame and per
+        phase, plus counter events for the counts
+        :return: dictionary in the Chrome trace event format
+        """
+        events = []
+        origin = self.origin
+        for frame in self.frames:
+            start_us = (frame['start'] - origin) * 1e6
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': start_us,
+                           'dur': (frame['end'] - frame['start']) * 1e6, 'args': {'frame': frame['frame']}})
+            for name, start, end in frame['phases']:
+                events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': (start - origin) * 1e6,
+                               'dur': (end - start) * 1e6})
+            events.append({'name': 'counts', 'ph': 'C', 'pid': 1, 'tid': 1, 'ts': start_us,
+                           'args': frame['counts']})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path):
+        """
+        Writes the recorded frames to a Chrome trace event JSON file
+        :param path: string path of the file to write
+        :return: None
+        """
+        with open(path, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+    def export_csv(self, path):
+        """
+        Writes one row per recorded frame with the milliseconds spent in each phase and the counts
+        :param path: string path of the file to write
+        :return: None
+        """
+        phases = self.phase_names()
+        counts = []
+        for frame in self.frames:
+            for name in frame['counts']:
+                if name not in counts:
+                    counts.append(name)
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['frame', 'frame_ms'] + [f'{name}_ms' for name in phases] + counts)
+            for frame in self.frames:
+                durations = dict.fromkeys(phases, 0.0)
+                for name, start, end in frame['phases']:
+                    durations[name] += (end - start) * 1000
+                writer.writerow([frame['frame'], (frame['end'] - frame['start']) * 1000]
+                                + [durations[name] for name in phases]
+                                + [frame['counts'].get(name, 0) for name in counts])
+
+
+def count_entities(game):
+    """
+    Counts the live entities of a game
+    :param game: Game to count
+    :return: dictionary of enemies, player lasers, enemy lasers, upgrades, hazards, entities
+    waiting in the spawn queue, and the engine's lasers and particles if the game has them
+    """
+    counts = {'enemies': len(game.enemies), 'player_lasers': sum(len(player.lasers) for player in game.players),
+              'enemy_lasers': sum(len(enemy.lasers) for enemy in game.enemies),
+              'upgrades': len(game.upgrades), 'hazards': len(game.hazards), 'queued': len(game.spawn_queue)}
+    if game.laser_engine is not None:
+        counts['engine_lasers'] = len(game.laser_engine)
+    if game.particles is not None:
+        counts['particles'] = len(game.particles)
+    return counts
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import main
+
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    trace_path = sys.argv[2] if len(sys.argv) > 2 else 'profile_trace.json'
+    csv_path = sys.argv[3] if len(sys.argv) > 3 else 'profile_frames.csv'
+    game = main.Game()
+    game.profiler = FrameProfiler()
+    main.run_headless(frames, game=game)
+    for name, value in game.profiler.summary(last=frames).items():
+        print(f'{name:>18}: {value:.4f}')
+    game.profiler.export_chrome_trace(trace_path)
+    game.profiler.export_csv(csv_path)
+    print(f'Wrote {trace_path} and {csv_path}')
@@ -0,0 +1,128 @@
+"""
+Dirty rectangle renderer. Instead of redrawing the whole background and updating the whole
+display every frame, only the background under last frame's sprites is restored, each layer of
+sprites is drawn with one batched blits call, and only the rectangles that changed are passed
+to pygame.display.update. Sprites entirely outside the screen are dropped before blitting, and
+display_format converts surfaces to the display's pixel format once up front so blits never
+convert pixels
+"""
+import pygame
+
+# Above this fraction of the screen changed, one full update is cheaper than many small ones
+FULL_UPDATE_FRACTION = 0.5
+
+
+def display_format(surface):
+    """
+    Converts a surface to the display's pixel format, keeping per pixel alpha only if the surface
+    has a pixel that is not fully opaque. Without a display mode set the surface is returned as is
+    :param surface: pygame Surface
+    :return: pygame Surface in the display's format
+    """
+    if pygame.display.get_surface() is None:
+        return surface
+    if surface.get_flags() & pygame.SRCALPHA:
+        opaque = pygame.mask.from_surface(surface, 254).count()
+        if opaque < surface.get_width() * surface.get_height():
+            return surface.convert_alpha()
+    return surface.convert()
+
+
+def cull(sprites, width, height):
+    """
+    Drops sprites that lie entirely outside a screen
+    :param sprites: sequence of (image, (x, y)) pairs
+    :param width: integer width of the screen
+    :param height: integer height of the screen
+    :return: list of the (image, (x, y)) pairs at least partly on screen
+    """
+    visible = []
+    for sprite in sprites:
+        image, (x, y) = sprite
+        if x < width and y < height and x + image.get_width() > 0 and y + image.get_height() > 0:
+            visible.append(sprite)
+    return visible
+
+
+class Renderer:
+    """
+    Draws frames made of layers of sprites and filled rectangles onto a screen with a static
+    background, tracking which rectangles were drawn so the next frame can erase just those
+    """
+
+    def __init__(self, screen, background, update_display=True):
+        """
+        Initializes the renderer; the first frame is always drawn in full
+        :param screen: display surface to draw onto
+        :param background: surface the size of the screen shown behind every sprite
+        :param update_display: boolean; if False the changed rectangles are only worked out, for
+        screens that are not the display, e.g. an off screen surface
+        """
+        self.screen = screen
+        self.update_display = update_display
+        self.background = background
+        self.screen_rect = screen.get_rect()
+        self.layers = []
+        self.previous = []
+        self.full_redraw = True
+        # Sprites dropped for being off screen in the last frame presented
+        self.skipped_blits = 0
+
+    def invalidate(self):
+        """
+        Makes the next frame redraw and update the whole screen, for when something else has
+        drawn onto it
+        :return: None
+        """
+        self.full_redraw = True
+
+    def add_layer(self, sprites=(), fills=()):
+        """
+        Queues a layer for the next present. Layers are drawn in the order they are added
+        :param sprites: sequence of (image, (x, y)) pairs, drawn with a single blits call
+        :param fills: sequence of (color, (x, y, width, height)) rectangles drawn after the sprites
+        :return: None
+        """
+        self.layers.append((sprites, fills))
+
+    def present(self):
+        """
+        Erases last frame's sprites, draws every queued layer, and updates only the changed
+        parts of the display
+        :return: list of rectangles passed to pygame.display.update
+        """
+        screen = self.screen
+        background = self.background
+        if self.full_redraw:
+            screen.blit(background, (0, 0))
+        else:
+            # Restore the background under everything drawn last frame
+            screen.blits([(background, rect, rect) for rect in self.previous], doreturn=False)
+
+        drawn = []
+        skipped = 0
+        width, height = self.screen_rect.size
+        for sprites, fills in self.layers:
+            visible = cull(sprites, width, height)
+            skipped += len(sprites) - len(visible)
+            if visible:
+                drawn.extend(screen.blits(visible))
+            for color, rect in fills:
+                rect = screen.fill(color, rect)
+                if rect.width and rect.height:
+                    drawn.append(rect)
+        self.layers = []
+        self.skipped_blits = skipped
+
+        if self.full_redraw:
+            dirty = [self.screen_rect]
+            self.full_redraw = False
+        else:
+            dirty = self.previous + drawn
+            area = sum(rect.width * rect.height for rect in dirty)
+            if area > FULL_UPDATE_FRACTION * self.screen_rect.width * self.screen_rect.height:
+                dirty = [self.screen_rect]
+        if self.update_display:
+            pygame.display.update(dirty)
+        self.previous = drawn
+        return dirty
@@ -0,0 +1,188 @@
+"""
+Input recording and replay. A recording holds the game's seed and the state of the five keys
+the game reads on every frame, run length encoded, so a session can be played back exactly. A
+replay steps the game as fast as possible without rendering or a frame cap, optionally under
+the profiler, so a reported stutter can be run again and profiled
+
+Usage: python replay.py RECORDING [--trace trace.json] [--csv frames.csv]
+
+File layout (little endian):
+    magic b'SIRP', version u8, seed u64, frame count u32,
+    then (key mask u8, run length u16) pairs until every frame is covered
+"""
+import argparse
+import os
+import struct
+import sys
+
+import pygame
+
+MAGIC = b'SIRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBQI')
+RUN = struct.Struct('<BH')
+MAX_RUN = 0xFFFF
+
+# The keys the game reads, one bit each in a key mask
+KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN, pygame.K_SPACE)
+
+
+def key_mask(keys):
+    """
+    Packs the state of the game's keys into one byte
+    :param keys: pressed key state, either from pygame.key.get_pressed() or an InputState
+    :return: integer bit mask
+    """
+    mask = 0
+    for bit, key in enumerate(KEYS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+
+def mask_keys(mask):
+    """
+    Gets the keys held down in a key mask
+    :param mask: integer bit mask from key_mask
+    :return: list of pygame key constants
+    """
+    return [key for bit, key in enumerate(KEYS) if mask & (1 << bit)]
+
+
+class InputRecorder:
+    """
+    Records the key mask of every frame of a game as runs of repeated masks
+    """
+
+    def __init__(self, seed):
+        """
+        Initializes an empty recording
+        :param seed: integer seed of the game being recorded
+        """
+        self.seed = seed
+        self.runs = []
+        self.frames = 0
+
+    def record(self, keys):
+        """
+        Adds one frame's key state to the recording
+        :param keys: pressed key state, either from pygame.key.get_pressed() or an InputState
+        :return: None
+        """
+        mask = key_mask(keys)
+        runs = self.runs
+        if runs and runs[-1][0] == mask and runs[-1][1] < MAX_RUN:
+            runs[-1][1] += 1
+        else:
+            runs.append([mask, 1])
+        self.frames += 1
+
+    def to_bytes(self):
+        """
+        Encodes the recording
+        :return: bytes in the recording file layout
+        """
+        return HEADER.pack(MAGIC, VERSION, self.seed, self.frames) + b''.join(
+            RUN.pack(mask, length) for mask, length in self.runs)
+
+    def save(self, path):
+        """
+        Writes the recording to a file
+        :param path: string path of the file to write
+        :return: None
+        """
+        with open(path, 'wb') as file:
+            file.write(self.to_bytes())
+
+
+def numbered_path(path, number):
+    """
+    Numbers a recording path, so every game of a session gets a file of its own
+    :param path: string path given for the recordings, e.g. game.sirp
+    :param number: integer number of the game, from 1
+    :return: string path with the number before the extension, e.g. game-1.sirp
+    """
+    stem, ext = os.path.splitext(path)
+    return f'{stem}-{number}{ext}'
+
+
+class Recording:
+    """
+    Recording read back from bytes, which replays as an input source for run_headless
+    """
+
+    def __init__(self, data):
+        """
+        Decodes a recording, expanding it to one key mask per frame
+        :param data: bytes in the recording file layout
+        """
+        magic, version, self.seed, self.frames = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a version %d Space Invaders recording' % VERSION)
+        self.masks = bytearray()
+        for mask, length in RUN.iter_unpack(data[HEADER.size:]):
+            self.masks.extend(bytes([mask]) * length)
+        if len(self.masks) != self.frames:
+            raise ValueError('recording is truncated')
+        # One InputState per distinct mask, shared by every frame using it
+        self.inputs = {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a recording from a file
+        :param path: string path of the file to read
+        :return: Recording
+        """
+        with open(path, 'rb') as file:
+            return cls(file.read())
+
+    def __call__(self, frame, game):
+        """
+        Gets the recorded key state of a frame, as an input source for run_headless
+        :param frame: integer frame number
+        :param game: Game being replayed
+        :return: InputState for the frame
+        """
+        import main
+
+        mask = self.masks[frame]
+        keys = self.inputs.get(mask)
+        if keys is None:
+            keys = self.inputs[mask] = main.InputState(mask_keys(mask))
+        return keys
+
+
+def replay(recording, profiler=None):
+    """
+    Plays a recording back through the game loop with no rendering and no frame cap
+    :param recording: Recording to play
+    :param profiler: FrameProfiler to record the replay with, or None
+    :return: the Game after the last recorded frame
+    """
+    import main
+
+    game = main.Game(seed=recording.seed)
+    if profiler is not None:
+        game.profiler = profiler
+    return main.run_headless(recording.frames, recording, game)
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    from profiler import FrameProfiler
+
+    parser = argparse.ArgumentParser(description='Replay a recorded game at full speed')
+    parser.add_argument('recording')
+    parser.add_argument('--trace', help='write a Chrome trace of the replay to this path')
+    parser.add_argument('--csv', help='write per frame profile rows of the replay to this path')
+    args = parser.parse_args(sys.argv[1:])
+
+    recording = Recording.load(args.recording)
+    profiler = FrameProfiler(max_frames=recording.frames) if args.trace or args.csv else None
+    game = replay(recording, profiler)
+    print(f'Replayed {recording.frames} frames of seed {recording.seed}: level {game.level}, lives {game.lives}')
+    if args.trace:
+        profiler.export_chrome_trace(args.trace)
+    if args.csv:
+        profiler.export_csv(args.csv)
@@ -0,0 +1,232 @@
+"""
+Compact binary snapshots of a game for network play, delta encoded against a state the receiver
+has acknowledged. Positions are quantized to whole pixels and packed into 3 bytes, which bounds
+them to POSITION_RANGE; every entity holds a numbered slot, and which slots are taken and which
+changed are sent as bitsets, so an entity that did not change costs nothing but its bits. A changed
+entity usually moved only a few pixels since the baseline, and then costs 2 bytes (image id and a
+pair of 4 bit deltas) instead of 4
+
+Layout, little endian:
+    tick u32, baseline tick u32 (0 for none), slot count u16, flags u8, player count u8
+    per player: position (3 bytes), health i8, lives i8, level u16
+    taken bitset, then changed bitset, ceil(slot count / 8) bytes each
+    per changed slot, in slot order: image id u8, top bit set if a delta byte follows rather than
+    a 3 byte position
+"""
+import heapq
+import struct
+
+# Positions are whole pixels from -POSITION_OFFSET up to POSITION_RANGE - POSITION_OFFSET - 1
+POSITION_OFFSET = 2048
+POSITION_RANGE = 4096
+
+# Bits of State.flags
+GAME_OVER = 1
+FROZEN = 2
+FLAME_THROWER = 4
+BULLET_STORM = 8
+
+_HEADER = struct.Struct('<IIHBB')
+_PLAYER = struct.Struct('<bbH')
+_DELTA = 0x80
+
+
+def quantize(x, y):
+    """
+    Packs a position into 24 bits, 12 per coordinate, rounding to whole pixels and clamping to
+    the range that fits
+    :param x: x-coordinate
+    :param y: y-coordinate
+    :return: integer
+    """
+    # Offset first so that truncating rounds to nearest (halves up) for every position in range
+    qx = int(x + POSITION_OFFSET + 0.5)
+    qy = int(y + POSITION_OFFSET + 0.5)
+    if not 0 <= qx < POSITION_RANGE:
+        qx = 0 if qx < 0 else POSITION_RANGE - 1
+    if not 0 <= qy < POSITION_RANGE:
+        qy = 0 if qy < 0 else POSITION_RANGE - 1
+    return qx | qy << 12
+
+
+def position(packed):
+    """
+    Unpacks a position packed by quantize
+    :param packed: integer
+    :return: (x, y) tuple of integers
+    """
+    return (packed & 0xfff) - POSITION_OFFSET, (packed >> 12) - POSITION_OFFSET
+
+
+class State:
+    """
+    Everything a snapshot carries: effect flags, one (position, health, lives, level) tuple per
+    player, and a dictionary of slot -> (image id, position) for every other entity, positions
+    packed by quantize
+    """
+    __slots__ = ('flags', 'players', 'entities')
+
+    def __init__(self, flags=0, players=(), entities=None):
+        """
+        :param flags: integer of GAME_OVER, FROZEN, FLAME_THROWER, and BULLET_STORM bits
+        :param players: tuple of (position, health, lives, level) tuples
+        :param entities: dictionary of integer slot -> (integer image id, integer position)
+        """
+        self.flags = flags
+        self.players = players
+        self.entities = {} if entities is None else entities
+
+    def __eq__(self, other):
+        return (isinstance(other, State) and self.flags == other.flags and self.players == other.players
+                and self.entities == other.entities)
+
+
+# State every snapshot without a baseline is encoded against
+EMPTY = State()
+
+
+def encode(tick, state, baseline_tick=0, baseline=EMPTY):
+    """
+    Encodes a state as the changes from a baseline
+    :param tick: integer server tick of the state, from 1
+    :param state: State to send
+    :param baseline_tick: integer tick of the baseline, or 0 for none
+    :param baseline: State the receiver has for baseline_tick
+    :return: bytes
+    """
+    entities = state.entities
+    previous = baseline.entities
+    slots = max(entities) + 1 if entities else 0
+    taken = 0
+    changed = 0
+    body = bytearray()
+    for slot in sorted(entities):
+        entity = entities[slot]
+        taken |= 1 << slot
+        old = previous.get(slot)
+        if entity == old:
+            continue
+        changed |= 1 << slot
+        image_id, packed = entity
+        if old is not None and old[0] == image_id:
+            old_packed = old[1]
+            dx = (packed & 0xfff) - (old_packed & 0xfff)
+            dy = (packed >> 12) - (old_packed >> 12)
+            if -8 <= dx < 8 and -8 <= dy < 8:
+                body.append(image_id | _DELTA)
+                body.append((dx & 15) | (dy & 15) << 4)
+                continue
+        body.append(image_id)
+        body += packed.to_bytes(3, 'little')
+
+    size = (slots + 7) // 8
+    data = bytearray(_HEADER.pack(tick, baseline_tick, slots, state.flags, len(state.players)))
+    for packed, health, lives, level in state.players:
+        data += packed.to_bytes(3, 'little')
+        data += _PLAYER.pack(max(-128, min(health, 127)), max(-128, min(lives, 127)), level)
+    data += taken.to_bytes(size, 'little')
+    data += changed.to_bytes(size, 'little')
+    data += body
+    return bytes(data)
+
+
+def peek(data):
+    """
+    Reads the ticks of a snapshot without decoding it
+    :param data: bytes from encode
+    :return: (integer tick, integer baseline tick)
+    """
+    tick, baseline_tick, slots, flags, players = _HEADER.unpack_from(data)
+    return tick, baseline_tick
+
+
+def decode(data, baseline=EMPTY):
+    """
+    Decodes a snapshot against the baseline it was encoded against
+    :param data: bytes from encode
+    :param baseline: State for the snapshot's baseline tick (see peek), EMPTY if it has none
+    :return: (integer tick, State)
+    """
+    try:
+        tick, baseline_tick, slots, flags, player_count = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        players = []
+        for i in range(player_count):
+            packed = int.from_bytes(data[offset:offset + 3], 'little')
+            health, lives, level = _PLAYER.unpack_from(data, offset + 3)
+            players.append((packed, health, lives, level))
+            offset += 3 + _PLAYER.size
+        size = (slots + 7) // 8
+        taken = int.from_bytes(data[offset:offset + size], 'little')
+        changed = int.from_bytes(data[offset + size:offset + 2 * size], 'little')
+        offset += 2 * size
+
+        previous = baseline.entities
+        entities = {}
+        slot = 0
+        while taken:
+            if taken & 1:
+                if changed & 1:
+                    header = data[offset]
+                    image_id = header & ~_DELTA
+                    if header & _DELTA:
+                        old_packed = previous[slot][1]
+                        delta = data[offset + 1]
+                        dx = (delta & 15) - 16 * (delta >> 3 & 1)
+                        dy = (delta >> 4) - 16 * (delta >> 7)
+                        entities[slot] = (image_id, ((old_packed & 0xfff) + dx) | ((old_packed >> 12) + dy) << 12)
+                        offset += 2
+                    else:
+                        entities[slot] = (image_id, int.from_bytes(data[offset + 1:offset + 4], 'little'))
+                        offset += 4
+                else:
+                    entities[slot] = previous[slot]
+            taken >>= 1
+            changed >>= 1
+            slot += 1
+    except (IndexError, KeyError, struct.error) as error:
+        raise ValueError(f'snapshot does not decode against its baseline: {error!r}') from error
+    if offset != len(data):
+        raise ValueError(f'snapshot has {len(data) - offset} bytes left over')
+    return tick, State(flags, tuple(players), entities)
+
+
+class SlotTable:
+    """
+    Gives every live entity a small slot number that stays the same for as long as it lives.
+    Slots of entities that are gone are reused lowest first, so the bitsets stay short
+    """
+
+    def __init__(self):
+        # id of entity -> slot. Pools hand a recycled entity back out as the same object, so a laser
+        # or enemy released and acquired again between two ticks keeps its id and its slot, and
+        # reads as the old entity jumping to a new place. That is harmless: each slot is encoded
+        # against what the baseline holds for that slot, an image id and absolute position, never
+        # against the entity it belonged to
+        self.slots = {}
+        self.free = []
+        self.size = 0
+
+    def assign(self, entities):
+        """
+        Assigns slots to this tick's entities, freeing those of entities no longer among them
+        :param entities: list of live entities
+        :return: list of integer slots, one per entity
+        """
+        slots = self.slots
+        live = set(map(id, entities))
+        for key in [key for key in slots if key not in live]:
+            heapq.heappush(self.free, slots.pop(key))
+        assigned = []
+        for entity in entities:
+            key = id(entity)
+            slot = slots.get(key)
+            if slot is None:
+                if self.free:
+                    slot = heapq.heappop(self.free)
+                else:
+                    slot = self.size
+                    self.size += 1
+                slots[key] = slot
+            assigned.append(slot)
+        return assigned
@@ -0,0 +1,74 @@
+"""
+Queue of spawned entities that are not yet in view. A wave is spawned up to 1800 pixels above the
+screen, and an entity up there can neither be seen nor touch anything on screen, so rather than
+moving and testing it every frame it waits in a heap ordered by the frame it comes within a margin
+of the top of the screen. It is handed back then, placed where it would have moved to, and only
+from that frame on costs anything
+"""
+import heapq
+import math
+
+# Pixels above the top of the screen at which entities come into play
+ACTIVATION_MARGIN = 64
+
+
+class SpawnQueue:
+    """
+    Heap of (activation frame, spawn order, kind, entity, spawn frame, velocity) entries
+    """
+
+    def __init__(self, margin=ACTIVATION_MARGIN):
+        """
+        Initializes an empty queue
+        :param margin: integer pixels above the screen at which entities come into play
+        """
+        self.margin = margin
+        self.heap = []
+        self.spawned = 0
+        # kind -> number of entities of that kind waiting
+        self.counts = {}
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, kind, entity, frame, velocity, height):
+        """
+        Queues an entity moving straight down until it nears the screen
+        :param kind: string kind of entity, e.g. 'enemy'
+        :param entity: object with x and y, at its spawn position
+        :param frame: integer frame the entity is spawned on
+        :param velocity: integer pixels the entity moves down per frame
+        :param height: integer height of the entity's image
+        :return: None
+        """
+        distance = -self.margin - height - entity.y
+        if distance <= 0 or velocity <= 0:
+            activation = frame
+        else:
+            activation = frame + math.ceil(distance / velocity)
+        heapq.heappush(self.heap, (activation, self.spawned, kind, entity, frame, velocity))
+        self.spawned += 1
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def pop_due(self, frame):
+        """
+        Takes every entity due to come into play by a frame, moved to where it would be by then
+        :param frame: integer current frame
+        :return: list of (kind, entity) pairs in the order they come into play
+        """
+        due = []
+        heap = self.heap
+        while heap and heap[0][0] <= frame:
+            activation, order, kind, entity, spawn_frame, velocity = heapq.heappop(heap)
+            entity.y += velocity * (frame - spawn_frame)
+            self.counts[kind] -= 1
+            due.append((kind, entity))
+        return due
+
+    def pending(self, kind):
+        """
+        Counts the entities of a kind still waiting
+        :param kind: string kind of entity
+        :return: integer
+        """
+        return self.counts.get(kind, 0)
@@ -0,0 +1,155 @@
+"""
+Difficulty parameter sweep. Runs headless games driven by a scripted bot for every combination
+of the given difficulty parameters (and several seeds each), spread over a process pool, and
+streams one row per game to a CSV file, or to a Parquet file when the output ends in .parquet
+(needs pyarrow). Every game is independent, so the sweep scales with the number of cores
+
+Usage: python sweep.py [--output sweep.csv] [--frames N] [--seeds N] [--workers N]
+                       [--wave-increment 5 ...] [--enemy-velocity 1 ...] [--laser-velocity 4 ...]
+                       [--hazard-velocity 1 ...] [--fire-odds 180 ...]
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import main
+from headless import sweeping_fire
+
+# Game attribute set by each swept parameter, in output column order
+PARAMETERS = ('wave_increment', 'enemy_velocity', 'laser_velocity', 'hazard_velocity', 'enemy_fire_odds')
+COLUMNS = PARAMETERS + ('seed', 'level', 'lives', 'frames', 'seconds', 'sim_fps')
+
+
+def play(settings, seed, frames):
+    """
+    Plays one game with the bot until game over or the frame limit
+    :param settings: dictionary of Game attribute -> value, keys from PARAMETERS
+    :param seed: integer seed of the game
+    :param frames: integer maximum number of frames to play
+    :return: dictionary with one value per column of COLUMNS
+    """
+    game = main.Game(seed=seed)
+    for name, value in settings.items():
+        setattr(game, name, value)
+    clock = time.perf_counter
+    start = clock()
+    while not game.game_over and game.frame < frames:
+        game.step(sweeping_fire(game.frame, game))
+    seconds = clock() - start
+    return dict(settings, seed=seed, level=game.level, lives=max(game.lives, 0), frames=game.frame,
+                seconds=seconds, sim_fps=game.frame / seconds if seconds else float('inf'))
+
+
+def grid(values, seeds):
+    """
+    Lists every run of a sweep
+    :param values: dictionary of parameter name -> list of values to try
+    :param seeds: integer number of seeds to play each combination with
+    :return: list of (settings dictionary, seed) pairs
+    """
+    names = list(values)
+    return [(dict(zip(names, combination)), seed)
+            for combination in itertools.product(*(values[name] for name in names))
+            for seed in range(seeds)]
+
+
+class CsvSink:
+    """
+    Writes result rows to a CSV file as they arrive
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.DictWriter(self.file, COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetSink:
+    """
+    Writes result rows to a Parquet file, one row group per batch of rows
+    """
+
+    def __init__(self, path, batch=256):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([(name, pyarrow.float64() if name in ('seconds', 'sim_fps') else pyarrow.int64())
+                                      for name in COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.batch = batch
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pyarrow.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def sweep(values, seeds, frames, output, workers=None):
+    """
+    Plays every run of a sweep over a process pool, writing each row as soon as its game ends
+    :param values: dictionary of parameter name -> list of values to try
+    :param seeds: integer number of seeds to play each combination with
+    :param frames: integer maximum number of frames per game
+    :param output: string path of the .csv or .parquet file to write
+    :param workers: integer number of worker processes, or None for one per core
+    :return: (number of games played, total frames simulated, wall clock seconds)
+    """
+    runs = grid(values, seeds)
+    sink = ParquetSink(output) if output.endswith('.parquet') else CsvSink(output)
+    total_frames = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(play, settings, seed, frames) for settings, seed in runs]
+            for future in as_completed(futures):
+                row = future.result()
+                total_frames += row['frames']
+                sink.write(row)
+    finally:
+        sink.close()
+    return len(runs), total_frames, time.perf_counter() - start
+
+
+def parse_args(argv):
+    defaults = main.Game(seed=0)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='sweep.csv', help='.csv or .parquet file to write')
+    parser.add_argument('--frames', type=int, default=20000, help='maximum frames per game')
+    parser.add_argument('--seeds', type=int, default=4, help='games per parameter combination')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    for name, flag in zip(PARAMETERS, ('--wave-increment', '--enemy-velocity', '--laser-velocity',
+                                       '--hazard-velocity', '--fire-odds')):
+        parser.add_argument(flag, dest=name, type=int, nargs='+', default=[getattr(defaults, name)],
+                            help=f'values of Game.{name} to try (default: %(default)s)')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args(sys.argv[1:])
+    values = {name: getattr(args, name) for name in PARAMETERS}
+    games, frames, seconds = sweep(values, args.seeds, args.frames, args.output, args.workers)
+    print(f'{games} games, {frames} frames in {seconds:.1f} s ({frames / seconds:.0f} frames/s) -> {args.output}')
@@ -0,0 +1,106 @@
+"""
+Fixed timestep game loop support. The simulation always advances in ticks of 1 / FPS seconds of
+real time, however long rendering takes: every rendered frame runs as many ticks as the time
+since the last frame calls for, skipping the renders in between, up to a cap past which the lost
+time is dropped rather than letting the game spiral behind. Positions are drawn interpolated
+between the last two ticks, by the fraction of a tick left over, so motion stays smooth when the
+render rate and the tick rate differ
+"""
+import time
+
+# Most simulation ticks run for one rendered frame; 5 lets the game keep full speed down to 12
+# rendered frames per second
+MAX_FRAME_SKIP = 5
+
+
+class FixedTimestep:
+    """
+    Accumulates real time and turns it into a whole number of fixed length simulation ticks
+    """
+
+    def __init__(self, tick_rate, max_frame_skip=MAX_FRAME_SKIP, clock=time.perf_counter):
+        """
+        Initializes a timestep with no time accumulated
+        :param tick_rate: integer simulation ticks per second
+        :param max_frame_skip: integer most ticks run for one rendered frame
+        :param clock: function returning the current time in seconds
+        """
+        self.tick = 1 / tick_rate
+        self.max_frame_skip = max_frame_skip
+        self.clock = clock
+        self.last = None
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.skipped_frames = 0
+        self.dropped_ticks = 0
+
+    def reset(self):
+        """
+        Forgets time accumulated so far, e.g. after the loop has been paused
+        :return: None
+        """
+        self.last = None
+        self.accumulator = 0.0
+        self.alpha = 0.0
+
+    def advance(self):
+        """
+        Adds the real time since the last call and takes as many whole ticks out of it as fit,
+        up to max_frame_skip; alpha is left as the fraction of a tick remaining
+        :return: integer number of ticks to simulate before rendering the next frame
+        """
+        now = self.clock()
+        if self.last is not None:
+            self.accumulator += now - self.last
+        self.last = now
+        ticks = int(self.accumulator / self.tick)
+        if ticks > self.max_frame_skip:
+            self.dropped_ticks += ticks - self.max_frame_skip
+            ticks = self.max_frame_skip
+            self.accumulator = ticks * self.tick
+        self.accumulator -= ticks * self.tick
+        if ticks > 1:
+            self.skipped_frames += ticks - 1
+        self.alpha = min(self.accumulator / self.tick, 1.0)
+        return ticks
+
+
+class Interpolator:
+    """
+    Remembers where objects were before the latest tick and places them part of the way from
+    there to where they are now
+    """
+
+    def __init__(self, snap_distance=16):
+        """
+        Initializes an interpolator with no remembered positions
+        :param snap_distance: integer distance in pixels past which an object is drawn where it is
+        rather than interpolated, for objects that jumped, e.g. pooled ones reused elsewhere
+        """
+        self.snap_distance = snap_distance
+        self.previous = {}
+        self.alpha = 1.0
+
+    def capture(self, objects):
+        """
+        Remembers the positions of objects before a tick
+        :param objects: iterable of objects with x and y
+        :return: None
+        """
+        self.previous = {id(obj): (obj.x, obj.y) for obj in objects}
+
+    def position(self, obj):
+        """
+        Gets where to draw an object this frame
+        :param obj: object with x and y
+        :return: (x, y) tuple of integers
+        """
+        previous = self.previous.get(id(obj))
+        if previous is None:
+            return obj.x, obj.y
+        dx = obj.x - previous[0]
+        dy = obj.y - previous[1]
+        if abs(dx) > self.snap_distance or abs(dy) > self.snap_distance:
+            return obj.x, obj.y
+        alpha = self.alpha
+        return round(previous[0] + dx * alpha), round(previous[1] + dy * alpha)